@@ -1,5 +1,8 @@
 import os
 import json
+from dotenv import load_dotenv
+
+load_dotenv()
 
 def load_config():
     # Path to config.json inside the config folder
@@ -10,3 +13,67 @@ def load_config():
         return json.load(f)
 
 config = load_config()
+
+# --- MongoDB connection settings (overridable from .env) ---
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGODB_DB = os.getenv("MONGODB_DB", "ASD")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "60000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# Documents per getMore when routes stream a cursor
+MONGODB_CURSOR_BATCH_SIZE = int(os.getenv("MONGODB_CURSOR_BATCH_SIZE", "2000"))
+
+# --- Caching ---
+COLLECTION_CATALOG_TTL_SECONDS = float(os.getenv("COLLECTION_CATALOG_TTL_SECONDS", "60"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_LIVE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_LIVE_TTL_SECONDS", "20"))
+RAW_CACHE_MAX_MB = float(os.getenv("RAW_CACHE_MAX_MB", "8"))
+
+# --- Columnar snapshots of closed days ---
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "snapshots"))
+# Memory-mapped days kept open at once
+SNAPSHOT_OPEN_DAYS = int(os.getenv("SNAPSHOT_OPEN_DAYS", "32"))
+
+# --- /volume histograms ---
+# Grid the per-day dimension sketches count on; percentiles are exact to one step
+VOLUME_SKETCH_RESOLUTION_MM = float(os.getenv("VOLUME_SKETCH_RESOLUTION_MM", "1"))
+VOLUME_DEFAULT_BINS = int(os.getenv("VOLUME_DEFAULT_BINS", "50"))
+VOLUME_MAX_BINS = int(os.getenv("VOLUME_MAX_BINS", "200"))
+
+# --- Live KPI push (change streams need a replica set) ---
+# Changes arriving within this many seconds go out to a client as one update
+LIVE_PUSH_INTERVAL_SECONDS = float(os.getenv("LIVE_PUSH_INTERVAL_SECONDS", "1"))
+# Comment line sent on an idle stream so proxies keep it open
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+
+# --- Incremental KPIs of today ---
+# Without change streams, how long the pipelines answer before subscribing is tried again
+INCREMENTAL_RETRY_SECONDS = float(os.getenv("INCREMENTAL_RETRY_SECONDS", "300"))
+
+# --- Closing days (normalize / roll up / index the days the sorter wrote) ---
+# How long after its midnight a day is closed, for writes arriving late
+DAY_CLOSE_DELAY_SECONDS = float(os.getenv("DAY_CLOSE_DELAY_SECONDS", "3600"))
+DAY_CLOSE_INTERVAL_SECONDS = float(os.getenv("DAY_CLOSE_INTERVAL_SECONDS", "300"))
+# A process closing a day holds it this long before another may take over
+DAY_CLOSE_LEASE_SECONDS = float(os.getenv("DAY_CLOSE_LEASE_SECONDS", "3600"))
+
+# --- Concurrency limits for the async routes ---
+# Full-day KPI scans (/summary, /throughput, /volume) vs. point lookups (/parcel-journey)
+KPI_MAX_CONCURRENCY = int(os.getenv("KPI_MAX_CONCURRENCY", "4"))
+LOOKUP_MAX_CONCURRENCY = int(os.getenv("LOOKUP_MAX_CONCURRENCY", "32"))
+CONCURRENCY_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# --- Date range queries ---
+RANGE_MAX_DAYS = int(os.getenv("RANGE_MAX_DAYS", "92"))
+# Days computed at the same time within one range request
+RANGE_FANOUT_CONCURRENCY = int(os.getenv("RANGE_FANOUT_CONCURRENCY", "8"))
+
+# --- Parcel journey ---
+PARCEL_JOURNEY_PAGE_SIZE = int(os.getenv("PARCEL_JOURNEY_PAGE_SIZE", "500"))
+PARCEL_JOURNEY_MAX_PAGE_SIZE = int(os.getenv("PARCEL_JOURNEY_MAX_PAGE_SIZE", "5000"))
+# Shortest prefix/suffix a "ABC*" / "*123" barcode search accepts
+BARCODE_WILDCARD_MIN_CHARS = int(os.getenv("BARCODE_WILDCARD_MIN_CHARS", "3"))
@@ -0,0 +1,76 @@
+# app/database/catalog.py
+"""Process-wide cache of the collection names, so routes can reject unknown dates without a round trip."""
+import threading
+import time
+from typing import Callable, List, Optional, Set
+
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+
+from app import config as settings
+from app.database.db import is_date_collection
+
+
+class CollectionCatalog:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._names: Optional[Set[str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        # Date names seen by this process, and who to tell about new ones
+        self._seen_dates: Set[str] = set()
+        self._on_new_dates: Optional[Callable[[List[str]], object]] = None
+
+    def _fresh(self) -> bool:
+        return self._names is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def on_new_dates(self, callback: Optional[Callable[[List[str]], object]]):
+        """Call `callback` with the date collections each reload finds for the first time (must not block)."""
+        self._on_new_dates = callback
+
+    def _store(self, names: Set[str]) -> Set[str]:
+        with self._lock:
+            self._names = names
+            self._loaded_at = time.monotonic()
+            new_dates = sorted(name for name in names - self._seen_dates if is_date_collection(name))
+            self._seen_dates.update(new_dates)
+        if new_dates and self._on_new_dates is not None:
+            self._on_new_dates(new_dates)
+        return names
+
+    def names(self, db: Database, reload: bool = False) -> Set[str]:
+        """Cached collection names, reloaded from the server once the TTL has expired (or on `reload`)."""
+        with self._lock:
+            if self._fresh() and not reload:
+                return self._names
+        return self._store(set(db.list_collection_names()))
+
+    async def names_async(self, db: AsyncDatabase, reload: bool = False) -> Set[str]:
+        """`names` for the async routes; the listing is awaited outside the lock."""
+        with self._lock:
+            if self._fresh() and not reload:
+                return self._names
+        return self._store(set(await db.list_collection_names()))
+
+    def exists(self, db: Database, name: str) -> bool:
+        """Whether `name` exists; a name not cached is looked up again (the sorter may have just created it)."""
+        return name in self.names(db) or name in self.names(db, reload=True)
+
+    async def exists_async(self, db: AsyncDatabase, name: str) -> bool:
+        return name in await self.names_async(db) or name in await self.names_async(db, reload=True)
+
+    def date_names(self, db: Database) -> List[str]:
+        return sorted(name for name in self.names(db) if is_date_collection(name))
+
+    def add(self, name: str):
+        """Register a collection created by this process (e.g. a new day's first ingest)."""
+        with self._lock:
+            if self._names is not None:
+                self._names.add(name)
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+
+catalog = CollectionCatalog(settings.COLLECTION_CATALOG_TTL_SECONDS)
@@ -1,9 +1,160 @@
 # app/database/db.py
-from pymongo import MongoClient
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.database import Database
-from dotenv import load_dotenv
 
-load_dotenv()
+from app import config as settings
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so the health probe can report pool usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failed = 0
+        self.pools_cleared = 0
+
+    def _inc(self, name: str, delta: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_ready(self, event): pass
+
+    def pool_cleared(self, event):
+        self._inc("pools_cleared")
+
+    def connection_created(self, event):
+        self._inc("created")
+
+    def connection_closed(self, event):
+        self._inc("closed")
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failed")
+
+    def connection_checked_out(self, event):
+        self._inc("checked_out")
+
+    def connection_checked_in(self, event):
+        self._inc("checked_out", -1)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_connections": self.created - self.closed,
+                "in_use": self.checked_out,
+                "created_total": self.created,
+                "closed_total": self.closed,
+                "checkout_failed_total": self.checkout_failed,
+                "pools_cleared_total": self.pools_cleared,
+            }
+
+
+# Parcels are stored one collection per day, named "YYYY-MM-DD"
+DATE_COLLECTION_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncMongoClient] = None
+_pool_listener = PoolStatsListener()
+_client_lock = threading.Lock()
+
+
+def _client_options() -> Dict[str, Any]:
+    return {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [_pool_listener],
+    }
+
+
+def connect() -> MongoClient:
+    """Create the process-wide client (called once from the app lifespan)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(settings.MONGODB_URI, **_client_options())
+        return _client
+
+
+def connect_async() -> AsyncMongoClient:
+    """Create the async client used by the async routes (must run on the server's event loop)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(settings.MONGODB_URI, **_client_options())
+    return _async_client
+
+
+def close():
+    """Close the shared client and release every pooled connection."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def close_async():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def get_client() -> MongoClient:
+    return _client if _client is not None else connect()
+
+
 def get_db() -> Database:
-    client = MongoClient("MONGODB_URI")
-    return client["ASD"]
+    return get_client()[settings.MONGODB_DB]
+
+
+def get_async_db() -> AsyncDatabase:
+    client = _async_client if _async_client is not None else connect_async()
+    return client[settings.MONGODB_DB]
+
+
+def is_date_collection(name: str) -> bool:
+    return bool(DATE_COLLECTION_PATTERN.match(name))
+
+
+def date_collection_names(db: Database) -> List[str]:
+    """Sorted names of the per-day parcel collections."""
+    return sorted(name for name in db.list_collection_names() if is_date_collection(name))
+
+
+def health() -> Dict[str, Any]:
+    """Ping the server and report pool settings and live pool counters."""
+    status: Dict[str, Any] = {
+        "database": settings.MONGODB_DB,
+        "pool": {
+            "max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+            "min_pool_size": settings.MONGODB_MIN_POOL_SIZE,
+            **_pool_listener.snapshot(),
+        },
+    }
+    try:
+        started = time.perf_counter()
+        get_client().admin.command("ping")
+        status["status"] = "ok"
+        status["ping_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    except Exception as e:
+        status["status"] = "unavailable"
+        status["error"] = str(e)
+    return status
@@ -0,0 +1,119 @@
+# app/database/indexes.py
+"""Index management for the per-day parcel collections."""
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from app.database.db import date_collection_names
+
+logger = logging.getLogger(__name__)
+
+# Indexes every "YYYY-MM-DD" collection should carry
+DATE_COLLECTION_INDEXES = [
+    # Parcel journey lookups
+    IndexModel([("hostId", ASCENDING)], name="hostId_1"),
+    IndexModel([("alibi_id", ASCENDING)], name="alibi_id_1"),
+    IndexModel([("barcode_data.barcodes", ASCENDING)], name="barcode_data.barcodes_1"),
+    # KPI time windows (fields written by the ingest normalization)
+    IndexModel([("registerTS_ms", ASCENDING)], name="registerTS_ms_1"),
+    IndexModel([("events.msg_id", ASCENDING), ("events.ts_ms", ASCENDING)], name="events.msg_id_1_events.ts_ms_1"),
+]
+
+_status: Dict[str, Dict[str, Any]] = {}
+_status_lock = threading.Lock()
+
+
+def _set_status(name: str, **fields):
+    with _status_lock:
+        _status[name] = fields
+
+
+def index_spec(models: List[IndexModel]) -> str:
+    """Short hash of `models`, so a collection built with an older list of indexes is built again."""
+    documents = json.dumps([model.document for model in models], sort_keys=True, default=str)
+    return hashlib.sha1(documents.encode()).hexdigest()[:12]
+
+
+def ensure_indexes(collection: Collection, models: List[IndexModel] = DATE_COLLECTION_INDEXES) -> List[str]:
+    """Create any missing index on a date collection, or `models` on another one (no-op for existing ones)."""
+    spec = index_spec(models)
+    with _status_lock:
+        status = _status.get(collection.name, {})
+        if status.get("spec") == spec and status["state"] in ("building", "ready"):
+            return []
+        _status[collection.name] = {"state": "building", "spec": spec}
+    try:
+        created = collection.create_indexes(models)
+    except Exception as e:
+        _set_status(collection.name, state="failed", spec=spec, error=str(e))
+        raise
+    _set_status(collection.name, state="ready", spec=spec)
+    return created
+
+
+def ensure_all_indexes(db: Database, names: Iterable[str] = None):
+    """Ensure indexes on the date collections `names` (default: all); failures are recorded (see index_report) and logged, not raised."""
+    for name in date_collection_names(db) if names is None else names:
+        try:
+            ensure_indexes(db[name])
+        except Exception:
+            logger.exception("Index build failed for %s", name)
+
+
+def ensure_all_indexes_in_background(db: Database, names: Iterable[str] = None) -> threading.Thread:
+    """Startup hook: build indexes without holding up the first requests.
+
+    Also the catalog's hook for new date collections (the sorter creates a
+    day's collection with its first parcel, after the process started).
+    """
+    thread = threading.Thread(target=ensure_all_indexes, args=(db, names), name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def _in_progress_builds(db: Database) -> Dict[str, List[Dict[str, Any]]]:
+    builds: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        ops = db.client.admin.command("currentOp", {"command.createIndexes": {"$exists": True}})
+    except Exception:
+        return builds  # currentOp needs extra privileges; report what we know locally
+    for op in ops.get("inprog", []):
+        command = op.get("command", {})
+        builds.setdefault(command.get("createIndexes"), []).append({
+            "indexes": [index.get("name") for index in command.get("indexes", [])],
+            "progress": op.get("progress"),
+            "msg": op.get("msg"),
+        })
+    return builds
+
+
+def index_report(db: Database, date: str) -> Dict[str, Any]:
+    """Defined indexes, build state and $indexStats usage for one date collection."""
+    collection = db[date]
+    defined = collection.index_information()
+    usage = {
+        stat["name"]: {
+            "ops": stat["accesses"]["ops"],
+            "since": stat["accesses"]["since"],
+        }
+        for stat in collection.aggregate([{"$indexStats": {}}])
+    }
+    with _status_lock:
+        status = dict(_status.get(date, {"state": "unknown"}))
+
+    return {
+        "collection": date,
+        "status": status,
+        "in_progress": _in_progress_builds(db).get(date, []),
+        "indexes": [
+            {"name": name, "key": info["key"], "usage": usage.get(name)}
+            for name, info in defined.items()
+        ],
+        "missing": sorted({model.document["name"] for model in DATE_COLLECTION_INDEXES} - set(defined)),
+    }
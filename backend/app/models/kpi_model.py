@@ -6,3 +6,14 @@ class DateRequest(BaseModel):
     bin_size: Optional[int] = None  # in minutes: 10, 15, 30, 45, or 60
     start_time: Optional[str] = None    # "HH:MM" format
     end_time: Optional[str] = None # "HH:MM" format
+    bin_width_mm: Optional[float] = None  # /volume histogram bin width
+    bin_count: Optional[int] = None  # /volume histogram bins when no bin width is given
+
+class DateRangeRequest(BaseModel):
+    start_date: str  # format: "YYYY-MM-DD"
+    end_date: str  # format: "YYYY-MM-DD", inclusive
+    bin_size: Optional[int] = None  # in minutes: 1, 10, 20, 30 or 60
+    start_time: Optional[str] = None    # "HH:MM" format, applied to every day
+    end_time: Optional[str] = None # "HH:MM" format, applied to every day
+    bin_width_mm: Optional[float] = None  # /volume histogram bin width
+    bin_count: Optional[int] = None  # /volume histogram bins when no bin width is given
@@ -1,8 +1,11 @@
 # app/models/parcel_journey_model.py
 
 from pydantic import BaseModel
+from typing import Optional
 
 class ParcelJourneyRequest(BaseModel):
-    date: str
+    date: Optional[str] = None  # None searches every day through the cross-day lookup
     search_by: str  # must be one of: 'host_id', 'barcode', 'alibi_id'
     search_value: str
+    limit: Optional[int] = None  # rows per page of /parcel-journey/stream
+    cursor: Optional[str] = None  # continuation token from the previous page
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pymongo.database import Database
+from typing import Dict, List, Optional
+
+from app.database.db import get_db
+from app.database.catalog import catalog
+from app.database.indexes import ensure_indexes, index_report
+from app.services.result_cache import raw_cache, result_cache
+from app.utils.concurrency import kpi_limiter, lookup_limiter
+
+router = APIRouter(prefix="/admin")
+
+@router.get("/indexes")
+def get_indexes(date: Optional[str] = None, db: Database = Depends(get_db)) -> List[Dict]:
+    """Index definitions, build status and $indexStats usage per date collection."""
+    dates = catalog.date_names(db)
+    if date is not None:
+        if date not in dates:
+            raise HTTPException(status_code=404, detail=f"No collection found for date {date}")
+        dates = [date]
+
+    try:
+        return [index_report(db, d) for d in dates]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+@router.post("/indexes/{date}")
+def build_indexes(date: str, db: Database = Depends(get_db)) -> Dict:
+    """Create any missing index on one date collection."""
+    if date not in catalog.date_names(db):
+        raise HTTPException(status_code=404, detail=f"No collection found for date {date}")
+
+    try:
+        created = ensure_indexes(db[date])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index build failed: {str(e)}")
+    return {"collection": date, "created": created, "report": index_report(db, date)}
+
+@router.get("/cache")
+def get_cache_stats() -> Dict:
+    """Hit/miss counters and memory use of the KPI result cache (and the RAW log cache)."""
+    return {**result_cache.stats(), "raw_cache": raw_cache.stats()}
+
+@router.delete("/cache")
+def clear_cache() -> Dict:
+    result_cache.clear()
+    raw_cache.clear()
+    return {**result_cache.stats(), "raw_cache": raw_cache.stats()}
+
+@router.get("/concurrency")
+def get_concurrency() -> Dict:
+    """Slots in use, queued requests and rejections per endpoint class."""
+    return {"kpi": kpi_limiter.stats(), "lookup": lookup_limiter.stats()}
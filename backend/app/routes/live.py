@@ -0,0 +1,150 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import PyMongoError
+
+from app import config as settings
+from app.config import config
+from app.database.db import get_async_db
+from app.models.kpi_model import DateRequest
+from app.routes.summary import _summary_response
+from app.routes.throughput import _throughput_response, _validate_bin_size
+from app.routes.volume import _validate_bins, _volume_partial, _volume_response
+from app.services.live import LiveDay, live_feed
+from app.utils.time_utils import MS_PER_MINUTE, hhmm_to_ms, is_closed_day, parse_time_window, window_slots
+
+router = APIRouter()
+
+LIVE_SECTIONS = ["summary", "throughput", "volume"]
+
+# Ends the stream for good; not "error", which EventSource also fires on a
+# dropped connection, and answers by reconnecting
+FAILURE_EVENT = "failure"
+
+
+@router.get("/live")
+async def stream_live_kpis(
+    date: str,
+    start_time: str = "00:00",
+    end_time: str = "23:59",
+    bin_size: Optional[int] = None,
+    bin_width_mm: Optional[float] = None,
+    bin_count: Optional[int] = None,
+    kpis: str = ",".join(LIVE_SECTIONS),
+    db: AsyncDatabase = Depends(get_async_db),
+) -> StreamingResponse:
+    """
+    Server-Sent Events with the /summary, /throughput and /volume results of a
+    day still being written, for one time window. A "snapshot" event carries
+    every section asked for in `kpis`; each "delta" event then carries the
+    sections that changed, throughput with only its changed bins. The KPIs
+    are kept up to date from a change stream, so following the floor costs
+    the new parcels rather than a rescan of the day. If that stream fails,
+    a "failure" event with its "detail" ends the response.
+    """
+    # EventSource can only GET, so the DateRequest fields come as query parameters
+    payload = DateRequest(
+        date=date, start_time=start_time, end_time=end_time,
+        bin_size=bin_size, bin_width_mm=bin_width_mm, bin_count=bin_count,
+    )
+    sections = [section for section in kpis.split(",") if section]
+    if not sections or set(sections) - set(LIVE_SECTIONS):
+        raise HTTPException(status_code=400, detail=f"kpis must be a comma-separated subset of {LIVE_SECTIONS}")
+    if is_closed_day(payload.date):
+        raise HTTPException(status_code=400, detail="Live updates are only available for today")
+    if "throughput" in sections:
+        _validate_bin_size(payload.bin_size)
+    if "volume" in sections:
+        _validate_bins(payload)
+    window = parse_time_window(payload.start_time, payload.end_time)
+
+    try:
+        await live_feed.check(db)
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Live updates need MongoDB change streams (a replica set): {str(e)}",
+        )
+
+    return StreamingResponse(
+        _live_events(db, payload, window, sections),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _event(name: str, data: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _live_events(db: AsyncDatabase, payload: DateRequest, window, sections: List[str]):
+    # Subscribed once the body is read, so a client gone before that leaves no subscriber
+    try:
+        subscriber = await live_feed.subscribe(db, payload.date, config.get("overflow_locations", []))
+    except PyMongoError as e:
+        yield _event(FAILURE_EVENT, {"detail": str(e)})
+        return
+
+    try:
+        yield _event("snapshot", _live_sections(subscriber.day, payload, window, sections))
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.changed.wait(), timeout=settings.LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            # Let a burst of writes settle into one update
+            await asyncio.sleep(settings.LIVE_PUSH_INTERVAL_SECONDS)
+            if subscriber.error is not None:
+                yield _event(FAILURE_EVENT, {"detail": subscriber.error})
+                return
+            reg_slots, ev_slots = subscriber.take()
+            delta = _live_sections(subscriber.day, payload, window, sections, reg_slots, ev_slots)
+            if delta:
+                yield _event("delta", delta)
+    finally:
+        live_feed.unsubscribe(subscriber)
+
+
+def _live_sections(day: LiveDay, payload: DateRequest, window, sections: List[str],
+                   reg_slots: Optional[Set[int]] = None,
+                   ev_slots: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """The asked-for sections touched by the changed slots (all of them when None)."""
+    start_time, end_time = window
+    start_ms, end_ms = hhmm_to_ms(start_time), hhmm_to_ms(end_time)
+    start_minute = start_ms // MS_PER_MINUTE
+    # /volume includes the end minute
+    volume_end_ms = end_ms + MS_PER_MINUTE - 1
+
+    def touched(slots: Optional[Set[int]], last_ms: int) -> bool:
+        return slots is None or any(slot in window_slots(start_ms, last_ms) for slot in slots)
+
+    result: Dict[str, Any] = {}
+    if "summary" in sections and touched(reg_slots, end_ms):
+        result["summary"] = _summary_response(payload, day.summary_row(start_ms, end_ms))
+
+    if "throughput" in sections and touched(ev_slots, end_ms):
+        response = _throughput_response(
+            payload, start_time, end_time, day.throughput_bins(start_ms, end_ms, payload.bin_size)
+        )
+        if ev_slots is not None:
+            # Only the bins holding a changed slot; one at end_ms itself may be past the last bin
+            labels = list(response["parcels_in_time"])
+            indexes = {
+                (slot // 2 - start_minute) // payload.bin_size
+                for slot in ev_slots if slot in window_slots(start_ms, end_ms)
+            }
+            changed = {labels[index] for index in indexes if index < len(labels)}
+            for series in ("parcels_in_time", "parcels_out_time"):
+                response[series] = {label: count for label, count in response[series].items() if label in changed}
+        result["throughput"] = response
+
+    if "volume" in sections and touched(reg_slots, volume_end_ms):
+        partial = _volume_partial(day.registered_dimensions(start_ms, volume_end_ms))
+        result["volume"] = _volume_response(partial, payload)
+    return result
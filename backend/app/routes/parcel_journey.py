@@ -1,63 +1,257 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pymongo.database import Database
-from typing import List, Dict
+from fastapi.responses import StreamingResponse
+from bson import json_util
+from pymongo.asynchronous.database import AsyncDatabase
+from typing import Any, AsyncIterator, List, Dict, Optional
+import base64
 import json
 
-from app.database.db import get_db
+from app import config as settings
+from app.database.db import get_async_db
+from app.database.catalog import catalog
 from app.models.parcel_journey_model import ParcelJourneyRequest
+from app.services import parcel_lookup
+from app.services.result_cache import raw_cache
+from app.utils.concurrency import lookup_limiter
 
 router = APIRouter()
 
-@router.post("/parcel-journey")
-def get_parcel_journey(payload: ParcelJourneyRequest, db: Database = Depends(get_db)) -> List[Dict]:
+# The only parcel fields the journey rows read; RAW logs come from /parcel-journey/raw
+JOURNEY_FIELDS = {
+    "_id": 1,
+    "hostId": 1,
+    "status": 1,
+    "barcode_data.barcodes": 1,
+    "alibi_id": 1,
+    "registerTS": 1,
+    "Registered_location": 1,
+    "identificationTS": 1,
+    "identification_location": 1,
+    "exitTS": 1,
+    "exit_location": 1,
+    "actual_destination": 1,
+    "volume_data": 1,
+}
+
+def _build_query(payload: ParcelJourneyRequest) -> Dict:
+    if payload.search_by not in ("host_id", "barcode", "alibi_id"):
+        raise HTTPException(status_code=400, detail="Invalid search_by value")
+    # Barcode wildcards are anchored regexes on the day's barcode_data.barcodes index
+    return parcel_lookup.day_query(payload.search_by, payload.search_value)
+
+
+def _journey_row(doc: Dict) -> Dict:
+    volume_data = doc.get("volume_data", {})
+    volume_str = (
+        f"L:{volume_data.get('length', '')}, "
+        f"H:{volume_data.get('height', '')}, "
+        f"W:{volume_data.get('width', '')}, "
+        f"BoxVol:{volume_data.get('box_volume', '')}, "
+        f"RealVol:{volume_data.get('real_volume', '')}"
+    )
+
+    # Rows of a cross-day search also say which day the parcel is in
+    day = {"date": doc["date"]} if "date" in doc else {}
+    return {
+        **day,
+        "parcel_id": _encode_id(doc["_id"]),  # key for /parcel-journey/raw
+        "host_id": doc.get("hostId"),
+        "status": doc.get("status"),
+        "barcode": doc.get("barcode_data", {}).get("barcodes", []),  # Return full list of barcodes
+        "alibi_id": doc.get("alibi_id"),
+        "register_on_and_at": f'{doc.get("registerTS", "")} {doc.get("Registered_location", "")}',
+        "identification_on_and_at": f'{doc.get("identificationTS", "")} {doc.get("identification_location", "")}',
+        "exit_on_and_at": f'{doc.get("exitTS", "")} {doc.get("exit_location", "")}',
+        "destination": doc.get("actual_destination"),
+        "volume": volume_str,
+    }
+
+
+@router.post("/parcel-journey", dependencies=[Depends(lookup_limiter)])
+async def get_parcel_journey(payload: ParcelJourneyRequest, db: AsyncDatabase = Depends(get_async_db)) -> List[Dict]:
     collection_name = payload.date
 
-    if collection_name not in db.list_collection_names():
+    if collection_name is not None and not await catalog.exists_async(db, collection_name):
         raise HTTPException(status_code=404, detail="Collection not found")
 
+    if _uses_lookup(payload):
+        return await _search_lookup(payload, db)
+
     # Build MongoDB query
-    if payload.search_by == "host_id":
-        query = {"hostId": payload.search_value}
-    elif payload.search_by == "barcode":
-        query = {"barcode_data.barcodes": {"$in": [payload.search_value]}}  # Nested field
-    elif payload.search_by == "alibi_id":
-        query = {"alibi_id": payload.search_value}
-    else:
-        raise HTTPException(status_code=400, detail="Invalid search_by value")
+    query = _build_query(payload)
 
     try:
         results = []
-        for doc in db[collection_name].find(query):
-            # Safely convert event["raw"] to stringified JSON for frontend compatibility
-            raw_data = {
-                str(i): event.get("raw")
-                for i, event in enumerate(doc.get("events", []))
-                if event.get("raw") is not None
-            }
-
-            volume_data = doc.get("volume_data", {})
-            volume_str = (
-            f"L:{volume_data.get('length', '')}, "
-            f"H:{volume_data.get('height', '')}, "
-            f"W:{volume_data.get('width', '')}, "
-            f"BoxVol:{volume_data.get('box_volume', '')}, "
-            f"RealVol:{volume_data.get('real_volume', '')}"
+        async for doc in db[collection_name].find(query, JOURNEY_FIELDS, batch_size=settings.MONGODB_CURSOR_BATCH_SIZE):
+            results.append(_journey_row(doc))
+
+        return results
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+def _uses_lookup(payload: ParcelJourneyRequest) -> bool:
+    """Whether the search goes through the cross-day lookup (no date); validates barcode wildcards."""
+    if payload.search_by not in ("host_id", "barcode", "alibi_id"):
+        raise HTTPException(status_code=400, detail="Invalid search_by value")
+    if payload.search_by != "barcode":
+        return payload.date is None
+
+    try:
+        pattern = parcel_lookup.wildcard(payload.search_value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if pattern is not None and len(pattern[1]) < settings.BARCODE_WILDCARD_MIN_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Wildcard searches need at least {settings.BARCODE_WILDCARD_MIN_CHARS} barcode characters",
         )
+    return payload.date is None
 
-            results.append({
-                "host_id": doc.get("hostId"),
-                "status": doc.get("status"),
-                "barcode": doc.get("barcode_data", {}).get("barcodes", []),  # Return full list of barcodes
-                "alibi_id": doc.get("alibi_id"),
-                "register_on_and_at": f'{doc.get("registerTS", "")} {doc.get("Registered_location", "")}',
-                "identification_on_and_at": f'{doc.get("identificationTS", "")} {doc.get("identification_location", "")}',
-                "exit_on_and_at": f'{doc.get("exitTS", "")} {doc.get("exit_location", "")}',
-                "destination": doc.get("actual_destination"),
-                "volume":volume_str,
-                "RAW": json.dumps(raw_data, indent=2)  # Convert to formatted string
-            })
 
-        return results
+async def _search_lookup(payload: ParcelJourneyRequest, db: AsyncDatabase) -> List[Dict]:
+    """Lookup matches, capped at PARCEL_JOURNEY_MAX_PAGE_SIZE rows."""
+    try:
+        matches = await parcel_lookup.find_entries(
+            db, payload.search_by, payload.search_value, settings.PARCEL_JOURNEY_MAX_PAGE_SIZE,
+            date=payload.date,
+        )
+        docs = await parcel_lookup.resolve(db, matches, JOURNEY_FIELDS)
+        return [_journey_row(doc) for doc in docs]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+def _encode_id(value: Any) -> str:
+    """URL-safe token for a document _id (of any BSON type)."""
+    return base64.urlsafe_b64encode(json_util.dumps({"_id": value}).encode()).decode()
+
+
+def _decode_id(token: str, what: str) -> Any:
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(token.encode()))["_id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid {what}")
+
+
+@router.post("/parcel-journey/stream")
+async def stream_parcel_journey(payload: ParcelJourneyRequest, db: AsyncDatabase = Depends(get_async_db)) -> StreamingResponse:
+    """
+    Newline-delimited JSON: one journey row per line, written as the cursor
+    advances, then a final {"next_cursor": ..., "count": ...} line. Pass
+    next_cursor back as `cursor` to get the next `limit` rows.
+
+    Without a date the rows come from every day, newest day first, and
+    barcode wildcards ("ABC*", "*123") are ordered by the matched barcode.
+    """
+    limit = min(payload.limit or settings.PARCEL_JOURNEY_PAGE_SIZE, settings.PARCEL_JOURNEY_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    after = _decode_id(payload.cursor, "cursor") if payload.cursor else None
+
+    collection_name = payload.date
+
+    if collection_name is not None and not await catalog.exists_async(db, collection_name):
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    if _uses_lookup(payload):
+        return StreamingResponse(_lookup_rows(payload, db, limit, after), media_type="application/x-ndjson")
+
+    query = _build_query(payload)
+    if after is not None:
+        query = {"$and": [query, {"_id": {"$gt": after}}]}
+
+    async def rows() -> AsyncIterator[str]:
+        # Held for the whole stream, and only once it is read: a response that
+        # is never sent takes no slot
+        try:
+            await lookup_limiter.acquire()
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail, "count": 0}) + "\n"
+            return
+
+        cursor = (
+            db[collection_name]
+            .find(query, JOURNEY_FIELDS, batch_size=min(limit + 1, settings.MONGODB_CURSOR_BATCH_SIZE))
+            .sort("_id", 1)
+            .limit(limit + 1)  # one extra row tells whether there is a next page
+        )
+        count, last_id, more = 0, None, False
+        try:
+            async for doc in cursor:
+                if count == limit:
+                    more = True
+                    break
+                yield json.dumps(_journey_row(doc), default=str) + "\n"
+                count += 1
+                last_id = doc["_id"]
+            next_cursor = _encode_id(last_id) if more else None
+            yield json.dumps({"next_cursor": next_cursor, "count": count}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"Server error: {str(e)}", "count": count}) + "\n"
+        finally:
+            await cursor.close()
+            lookup_limiter.release()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+async def _lookup_rows(payload: ParcelJourneyRequest, db: AsyncDatabase, limit: int,
+                       after: Optional[Dict]) -> AsyncIterator[str]:
+    """NDJSON page of a lookup search; the cursor is the last lookup match."""
+    try:
+        await lookup_limiter.acquire()
+    except HTTPException as e:
+        yield json.dumps({"error": e.detail, "count": 0}) + "\n"
+        return
+
+    count = 0
+    try:
+        matches = await parcel_lookup.find_entries(
+            db, payload.search_by, payload.search_value, limit + 1, after, payload.date
+        )
+        more = len(matches) > limit
+        matches = matches[:limit]
+        for doc in await parcel_lookup.resolve(db, matches, JOURNEY_FIELDS):
+            yield json.dumps(_journey_row(doc), default=str) + "\n"
+            count += 1
+        next_cursor = _encode_id(matches[-1]) if more else None
+        yield json.dumps({"next_cursor": next_cursor, "count": count}) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Server error: {str(e)}", "count": count}) + "\n"
+    finally:
+        lookup_limiter.release()
+
+
+@router.get("/parcel-journey/raw", dependencies=[Depends(lookup_limiter)])
+async def get_parcel_raw(date: str, parcel_id: Optional[str] = None, host_id: Optional[str] = None,
+                         db: AsyncDatabase = Depends(get_async_db)) -> Dict:
+    """RAW event logs of one parcel, by the row's parcel_id (or its hostId)."""
+    if not await catalog.exists_async(db, date):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if parcel_id is not None:
+        query = {"_id": _decode_id(parcel_id, "parcel_id")}
+    elif host_id is not None:
+        query = {"hostId": host_id}
+    else:
+        raise HTTPException(status_code=400, detail="Give parcel_id or host_id")
+
+    key = ("raw", date, parcel_id, host_id, None)
+    result = raw_cache.get(key)
+    if result is None:
+        doc = await db[date].find_one(query, {"hostId": 1, "events.raw": 1})
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Parcel not found")
+        result = {
+            "parcel_id": _encode_id(doc["_id"]),
+            "host_id": doc.get("hostId"),
+            "RAW": {
+                str(i): event.get("raw")
+                for i, event in enumerate(doc.get("events", []))
+                if event.get("raw") is not None
+            },
+        }
+        raw_cache.put(key, result)
+    return result
@@ -1,154 +1,106 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pymongo.database import Database
-from app.database.db import get_db
-from app.models.kpi_model import DateRequest
-from datetime import datetime
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from app.database.db import get_async_db
+from app.database.catalog import catalog
+from app.models.kpi_model import DateRangeRequest, DateRequest
 from app.config import config
+from app.services.result_cache import cache_key, result_cache
+from app.services import date_range, day_close, incremental, rollups, snapshots
+from app.services.summary_pipeline import merge_summary_rows, shape_summary, summary_row
+from app.utils.concurrency import kpi_limiter
+from app.utils.time_utils import hhmm_to_ms, is_closed_day, parse_time_window
 
 router = APIRouter()
 
-@router.post("/summary")
-def get_summary(payload: DateRequest, db: Database = Depends(get_db)):
+@router.post("/summary", dependencies=[Depends(kpi_limiter)])
+async def get_summary(payload: DateRequest, db: AsyncDatabase = Depends(get_async_db)):
     try:
-        if payload.date not in db.list_collection_names():
+        if not await catalog.exists_async(db, payload.date):
             raise HTTPException(status_code=404, detail=f"No collection found for date {payload.date}")
 
-        collection = db[payload.date]
-        parcels = list(collection.find({}))
-        if not parcels:
-            return {"message": "No data found for this date"}
-
-        # Parse start and end times
-        try:
-            start_time = datetime.strptime(payload.start_time, "%H:%M")
-            end_time = datetime.strptime(payload.end_time, "%H:%M")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Time format must be HH:MM")
-        if end_time <= start_time:
-            raise HTTPException(status_code=400, detail="End time must be after start time")
-
-        # --- Helper to parse DB times like throughput ---
-        def safe_parse_time(ts_str, start_time):
-                formats = ["%H:%M:%S,%f", "%H:%M:%S"]  # support both with and without milliseconds
-                for fmt in formats:
-                    try:
-                        ts = datetime.strptime(ts_str.strip(), fmt).replace(
-                            year=start_time.year, month=start_time.month, day=start_time.day
-                        )
-                        return ts
-                    except ValueError:
-                        continue
-                return None
-
-        # --- Filter parcels by time range ---
-        filtered_parcels = []
-        for p in parcels:
-            ts_str = p.get("registerTS")
-            if not ts_str:
-                continue
-            ts = safe_parse_time(ts_str, start_time)
-            if ts and start_time <= ts <= end_time:
-                filtered_parcels.append(p)
-        
-        # 1. Total parcels
-        unique_hosts = {p.get("hostId") for p in filtered_parcels if p.get("hostId")}
-        total_parcels = len(unique_hosts)
+        key = cache_key("summary", payload)
+        result = result_cache.get(key)
+        if result is None:
+            result = await _compute_summary(payload, db[payload.date])
+            result_cache.put(key, result)
+        return result
 
-        if total_parcels == 0:
-            return {
-                "message": "No parcels found in the given time range",
-                "start_time": payload.start_time,
-                "end_time": payload.end_time
-            }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 2. Sorted Parcels
-        sorted_parcels = sum(
-            1 for p in filtered_parcels
-            if p.get("status") == "sorted" and p.get("sort_strategy") == "1"
-        )
 
-        # 3. Total parcels in the system
-        parcels_in_system = []
-        for p in filtered_parcels:
-            msg_ids = {event.get("msg_id") for event in p.get("events", [])}
-            if "2" in msg_ids and not msg_ids.intersection({"6", "7"}):
-                parcels_in_system.append(p)
-        total_in_system = len(parcels_in_system)
-
-        # 4. Overflow
-        overflow_locations = config.get("overflow_locations", [])
-        def calculate_overflow(parcels, overflow_locations):
-            overflow_count = 0
-            for parcel in parcels:
-                events = parcel.get("events", [])
-
-                has_verified_sort_999 = any(
-                    e.get("msg_id") == "6" and
-                    len(e.get("raw", "").split("|")) > 10 and
-                    e.get("raw", "").split("|")[10] == "999"
-                    for e in events
-                )
-                if has_verified_sort_999:
-                    if any(ev.get("msg_id") == "2" for ev in events):
-                        overflow_count += 1
-                        continue
-
-                has_msg_id_7_in_overflow_location = any(
-                    e.get("msg_id") == "7" and
-                    len(e.get("raw", "").split("|")) > 11 and
-                    e.get("raw", "").split("|")[11] in overflow_locations
-                    for e in events
-                )
-                if has_msg_id_7_in_overflow_location:
-                    overflow_count += 1
-            return overflow_count
-
-        overflow = calculate_overflow(filtered_parcels, overflow_locations)
-
-        # 5. Barcode Read Ratio
-        barcode_read = sum(1 for p in filtered_parcels if p.get("barcode_error") is False)
-        barcode_read_ratio = round((barcode_read / total_parcels) * 100, 2) if total_parcels else 0.0
-
-        # 6. Volume Rate
-        volume_valid = sum(
-            1 for p in filtered_parcels
-            if isinstance(p.get("volume_data", {}).get("real_volume"), (int, float))
-            and p["volume_data"]["real_volume"] > 0
+async def _compute_summary(payload: DateRequest, collection: AsyncCollection):
+    if await collection.find_one({}, {"_id": 1}) is None:
+        return {"message": "No data found for this date"}
+
+    # Parse start and end times
+    start_time, end_time = parse_time_window(payload.start_time, payload.end_time)
+
+    row = await _summary_row(collection, payload.date, hhmm_to_ms(start_time), hhmm_to_ms(end_time))
+    return _summary_response(payload, row)
+
+
+def _summary_response(payload: DateRequest, row):
+    if not row.get("total_parcels"):
+        return {
+            "message": "No parcels found in the given time range",
+            "start_time": payload.start_time,
+            "end_time": payload.end_time
+        }
+
+    return {"date": payload.date, **shape_summary(row)}
+
+
+async def _summary_row(collection: AsyncCollection, date: str, start_ms: int, end_ms: int):
+    """Raw KPI counters of one day, from its snapshot or rollup when there is one."""
+    overflow_locations = config.get("overflow_locations", [])
+    snapshot = snapshots.load(date, overflow_locations)
+    if snapshot is not None:
+        # Closed day: scan its memory-mapped columns
+        return snapshots.summary_row(snapshot, start_ms, end_ms)
+    if not is_closed_day(date):
+        # Still being written: per-minute partials following the change stream,
+        # when the deployment has one
+        day = await incremental.day_partials(collection.database, date, overflow_locations)
+        if day is not None:
+            return day.summary_row(start_ms, end_ms)
+    elif await rollups.available_async(collection.database, date, overflow_locations):
+        # Sum the per-minute rollup rows of the window
+        return await rollups.summary_row(collection.database, date, start_ms, end_ms)
+    # All eight KPIs are computed server side; only one result row comes back
+    normalized = await day_close.has_step_async(collection.database, date, day_close.NORMALIZE_STEP)
+    return await summary_row(collection, start_ms, end_ms, overflow_locations, normalized)
+
+
+@router.post("/summary/range", dependencies=[Depends(kpi_limiter)])
+async def get_summary_range(payload: DateRangeRequest, db: AsyncDatabase = Depends(get_async_db)):
+    try:
+        start_time, end_time = parse_time_window(payload.start_time, payload.end_time)
+        start_ms, end_ms = hhmm_to_ms(start_time), hhmm_to_ms(end_time)
+
+        # Days are merged from their raw counters, so ratios are recomputed
+        # over the whole range rather than averaged
+        rows = await date_range.fan_out(
+            db, payload, "summary-row",
+            lambda date: _summary_row(db[date], date, start_ms, end_ms),
         )
-        volume_rate = round((volume_valid / total_parcels) * 100, 2) if total_parcels else 0.0
-
-        # 7. Throughput
-        in_timestamps = []
-        for p in filtered_parcels:
-            for event in p.get("events", []):
-                if event.get("msg_id") == "2":
-                    ts = safe_parse_time(event.get("ts", ""), start_time)
-                    if ts:
-                        in_timestamps.append(ts)
-                        break
-        throughput_per_hour = 0.0
-        if in_timestamps:
-            duration_hours = (max(in_timestamps) - min(in_timestamps)).total_seconds() / 3600
-            throughput_per_hour = round(len(in_timestamps) / duration_hours, 2) if duration_hours > 0 else 0.0
-
-        # 8. Tracking Performance
-        def has_required_msg_ids(events):
-            msg_ids = {e.get("msg_id") for e in events}
-            return {"2", "3", "6"}.issubset(msg_ids)
-
-        tracking_ok = sum(1 for p in filtered_parcels if has_required_msg_ids(p.get("events", [])))
-        tracking_performance = round((tracking_ok / total_parcels) * 100, 2) if total_parcels else 0.0
+        merged = merge_summary_rows(rows.values())
+        if not merged["total_parcels"]:
+            return {
+                "message": "No parcels found in the given date and time range",
+                "start_date": payload.start_date,
+                "end_date": payload.end_date,
+            }
 
         return {
-            "date": payload.date,
-            "total_parcels": total_parcels,
-            "total_in_system": total_in_system,
-            "sorted_parcels": sorted_parcels,
-            "overflow": overflow,
-            "barcode_read_ratio_percent": barcode_read_ratio,
-            "volume_rate_percent": volume_rate,
-            "throughput_avg_per_hour": throughput_per_hour,
-            "tracking_performance_percent": tracking_performance,
+            "start_date": payload.start_date,
+            "end_date": payload.end_date,
+            "days": len(rows),
+            **shape_summary(merged),
+            "per_day": {date: shape_summary(row) for date, row in rows.items() if row.get("total_parcels")},
         }
 
     except HTTPException as e:
@@ -1,178 +1,166 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pymongo.database import Database
-from app.database.db import get_db
-from app.models.kpi_model import DateRequest
-from datetime import datetime, timedelta
-from collections import defaultdict, OrderedDict
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from app.database.db import get_async_db
+from app.database.catalog import catalog
+from app.models.kpi_model import DateRangeRequest, DateRequest
+from datetime import timedelta
+from collections import OrderedDict
 from app.config import config
+from app.services.result_cache import cache_key, result_cache
+from app.services import date_range, day_close, incremental, rollups, snapshots
+from app.services.throughput_pipeline import compute_throughput
+from app.utils.concurrency import kpi_limiter
+from app.utils.time_utils import hhmm_to_ms, is_closed_day, parse_time_window
 
 router = APIRouter()
 
-@router.post("/throughput")
-def get_throughput(payload: DateRequest, db: Database = Depends(get_db)):
+VALID_BINS = [1, 10, 20, 30, 60]
+
+
+def _validate_bin_size(bin_size):
+    if bin_size not in VALID_BINS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid bin size. Choose from {VALID_BINS}"
+        )
+
+
+def _bin_labels(start_time, end_time, bin_size):
+    labels = []
+    current_time = start_time
+    while current_time < end_time:
+        labels.append(current_time.strftime("%H:%M"))
+        current_time += timedelta(minutes=bin_size)
+    return labels
+
+@router.post("/throughput", dependencies=[Depends(kpi_limiter)])
+async def get_throughput(payload: DateRequest, db: AsyncDatabase = Depends(get_async_db)):
     try:
         print(f"Fetching data from collection: {payload.date}")
 
         # Validate bin_size
-        valid_bins = [1, 10, 20, 30, 60]
-        bin_size = payload.bin_size
-        if bin_size not in valid_bins:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid bin size. Choose from {valid_bins}"
-            )
+        _validate_bin_size(payload.bin_size)
 
-        if payload.date not in db.list_collection_names():
+        if not await catalog.exists_async(db, payload.date):
             raise HTTPException(status_code=404, detail=f"No collection found for date {payload.date}")
 
-        collection = db[payload.date]
-        parcels = list(collection.find({}))
-        if not parcels:
-            return {"message": "No data found for this date"}
-
-        # Parse start and end times
-        try:
-            start_time = datetime.strptime(payload.start_time, "%H:%M")
-            end_time = datetime.strptime(payload.end_time, "%H:%M")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Time format must be HH:MM")
-        if end_time <= start_time:
-            raise HTTPException(status_code=400, detail="End time must be after start time")
-
-        # Configurable locations for overflow detection
-        overflow_locations = config.get("overflow_locations", [])
-
-        time_bins = OrderedDict()
-        current_time = start_time
-        while current_time < end_time:
-            label = current_time.strftime("%H:%M")
-            time_bins[label] = 0
-            current_time += timedelta(minutes=bin_size)
-
-        parcels_in_time = time_bins.copy()
-        parcels_out_time = time_bins.copy()
-
-        total_in = 0
-        total_out = 0
-        overflow_count = 0
-
-        for parcel in parcels:
-            events = parcel.get("events", [])
-            ts_in = None
-            ts_out = None
-
-            # IN event
-            for event in events:
-                if event.get("msg_id") == "2":
-                    ts_str = event.get("ts")
-                    try:
-                        ts = datetime.strptime(ts_str, "%H:%M:%S,%f").replace(
-                            year=start_time.year, month=start_time.month, day=start_time.day
-                        )
-                    except:
-                        continue
-
-                    if start_time <= ts <= end_time:
-                        total_in += 1
-                        # Floor the timestamp to the nearest bin
-                        minutes_since_start = int((ts - start_time).total_seconds() // 60)
-                        floored_minutes = (minutes_since_start // bin_size) * bin_size
-                        bin_time = start_time + timedelta(minutes=floored_minutes)
-                        bin_label = bin_time.strftime("%H:%M")
-
-                        if bin_label in parcels_in_time:
-                            parcels_in_time[bin_label] += 1
-
-
-            # OUT event
-            for event in events:
-                if event.get("msg_id") == "6":
-                    ts_str = event.get("ts")
-                    try:
-                        ts = datetime.strptime(ts_str, "%H:%M:%S,%f").replace(
-                            year=start_time.year, month=start_time.month, day=start_time.day
-                        )
-                    except:
-                        continue
-
-                    if start_time <= ts <= end_time:
-                        sort_code = event.get("sort_code")
-                        sort_status = event.get("raw", "")
-                        raw_parts = sort_status.split("|")  # ✅ fixed
-
-                        if len(raw_parts) > 10:
-                            sort_status = raw_parts[10]
-                            # Compute floored bin label
-                            minutes_since_start = int((ts - start_time).total_seconds() // 60)
-                            floored_minutes = (minutes_since_start // bin_size) * bin_size
-                            bin_time = start_time + timedelta(minutes=floored_minutes)
-                            bin_label = bin_time.strftime("%H:%M")
-
-                            if sort_code == "1":
-                                total_out += 1
-                                if bin_label in parcels_out_time:
-                                    parcels_out_time[bin_label] += 1
-                                break
-
-                            elif sort_status == "999":
-                                for ev in events:
-                                    if ev.get("msg_id") == "7":
-                                        raw_dereg = ev.get("raw", "")
-                                        parts = raw_dereg.split("|")
-                                        if len(parts) > 9 and parts[9] == "2":
-                                            total_out += 1
-                                            if bin_label in parcels_out_time:
-                                                parcels_out_time[bin_label] += 1
-                                            break
-                                break
-
-
-            def safe_parse_time(ts_str, start_time):
-                formats = ["%H:%M:%S,%f", "%H:%M:%S"]  # support both with and without milliseconds
-                for fmt in formats:
-                    try:
-                        ts = datetime.strptime(ts_str.strip(), fmt).replace(
-                            year=start_time.year, month=start_time.month, day=start_time.day
-                        )
-                        return ts
-                    except ValueError:
-                        continue
-                return None
-
-            # Overflow Case 1
-            for event in events:
-                if event.get("msg_id") == "6":
-                    ts_str = event.get("ts")
-                    ts = safe_parse_time(ts_str, start_time)
-                    if not ts or not (start_time <= ts <= end_time):
-                        continue
-
-                    raw = event.get("raw", "")
-                    parts = raw.split("|")
-                    if len(parts) > 10 and parts[10] == "999":
-                        for ev in events:
-                            if ev.get("msg_id") == "2":
-                                overflow_count += 1
-                                break
-
-            # Overflow Case 2
-            for event in events:
-                if event.get("msg_id") == "7":
-                    ts_str = event.get("ts")
-                    ts = safe_parse_time(ts_str, start_time)
-                    if not ts or not (start_time <= ts <= end_time):
-                        continue
-
-                    raw = event.get("raw", "")
-                    parts = raw.split("|")
-                    if len(parts) > 11 and parts[11] in overflow_locations:
-                        overflow_count += 1
+        key = cache_key("throughput", payload)
+        result = result_cache.get(key)
+        if result is None:
+            result = await _compute_throughput(payload, db[payload.date])
+            result_cache.put(key, result)
+        return result
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _compute_throughput(payload: DateRequest, collection: AsyncCollection):
+    bin_size = payload.bin_size
+
+    if await collection.find_one({}, {"_id": 1}) is None:
+        return {"message": "No data found for this date"}
+
+    # Parse start and end times
+    start_time, end_time = parse_time_window(payload.start_time, payload.end_time)
+
+    result = await _throughput_bins(
+        collection, payload.date, hhmm_to_ms(start_time), hhmm_to_ms(end_time), bin_size
+    )
+    return _throughput_response(payload, start_time, end_time, result)
+
+
+def _throughput_response(payload: DateRequest, start_time, end_time, result):
+    """The /throughput fields from one day's totals and per-bin counts."""
+    bin_size = payload.bin_size
+    time_bins = OrderedDict((label, 0) for label in _bin_labels(start_time, end_time, bin_size))
+    parcels_in_time = time_bins.copy()
+    parcels_out_time = time_bins.copy()
+    for index, label in enumerate(time_bins):
+        parcels_in_time[label] = result["bins"]["in"].get(index, 0)
+        parcels_out_time[label] = result["bins"]["out"].get(index, 0)
+
+    total_in = result["totals"]["in"]
+    total_out = result["totals"]["out"]
+    overflow_count = result["totals"]["overflow"]
+
+    avg_in = round(total_in / len(parcels_in_time), 2) if parcels_in_time else 0
+    avg_out = round(total_out / len(parcels_out_time), 2) if parcels_out_time else 0
+
+    return {
+        "bin_size_minutes": bin_size,
+        "start_time": payload.start_time,
+        "end_time": payload.end_time,
+        "total_in": total_in,
+        "total_out": total_out,
+        "avg_in": avg_in,
+        "avg_out": avg_out,
+        "overflow": overflow_count,
+        "parcels_in_time": parcels_in_time,
+        "parcels_out_time": parcels_out_time
+    }
+
+
+async def _throughput_bins(collection: AsyncCollection, date: str, start_ms: int, end_ms: int, bin_size: int):
+    """Totals and per-bin IN/OUT counts of one day, from its snapshot or rollup when there is one."""
+    # Configurable locations for overflow detection
+    overflow_locations = config.get("overflow_locations", [])
+    snapshot = snapshots.load(date, overflow_locations)
+    if snapshot is not None:
+        # Closed day: bin its memory-mapped columns
+        return snapshots.throughput_bins(snapshot, start_ms, end_ms, bin_size)
+    if not is_closed_day(date):
+        # Still being written: per-minute partials following the change stream,
+        # when the deployment has one
+        day = await incremental.day_partials(collection.database, date, overflow_locations)
+        if day is not None:
+            return day.throughput_bins(start_ms, end_ms, bin_size)
+    elif await rollups.available_async(collection.database, date, overflow_locations):
+        # Per-minute rollup rows folded into bins
+        return await rollups.throughput_bins(collection.database, date, start_ms, end_ms, bin_size)
+    # Events are bucketed server side; Python only lays out the (possibly empty) bins
+    normalized = await day_close.has_step_async(collection.database, date, day_close.NORMALIZE_STEP)
+    return await compute_throughput(collection, start_ms, end_ms, bin_size, overflow_locations, normalized)
+
+
+@router.post("/throughput/range", dependencies=[Depends(kpi_limiter)])
+async def get_throughput_range(payload: DateRangeRequest, db: AsyncDatabase = Depends(get_async_db)):
+    try:
+        bin_size = payload.bin_size
+        _validate_bin_size(bin_size)
+        start_time, end_time = parse_time_window(payload.start_time, payload.end_time)
+        start_ms, end_ms = hhmm_to_ms(start_time), hhmm_to_ms(end_time)
+
+        partials = await date_range.fan_out(
+            db, payload, "throughput-bins",
+            lambda date: _throughput_bins(db[date], date, start_ms, end_ms, bin_size),
+        )
+
+        # One series over the whole range, labelled "YYYY-MM-DD HH:MM"
+        labels = _bin_labels(start_time, end_time, bin_size)
+        parcels_in_time = OrderedDict()
+        parcels_out_time = OrderedDict()
+        per_day = {}
+        for date, result in partials.items():
+            for index, label in enumerate(labels):
+                parcels_in_time[f"{date} {label}"] = result["bins"]["in"].get(index, 0)
+                parcels_out_time[f"{date} {label}"] = result["bins"]["out"].get(index, 0)
+            per_day[date] = dict(result["totals"])
+
+        total_in = sum(day["in"] for day in per_day.values())
+        total_out = sum(day["out"] for day in per_day.values())
+        overflow_count = sum(day["overflow"] for day in per_day.values())
 
         avg_in = round(total_in / len(parcels_in_time), 2) if parcels_in_time else 0
         avg_out = round(total_out / len(parcels_out_time), 2) if parcels_out_time else 0
 
         return {
             "bin_size_minutes": bin_size,
+            "start_date": payload.start_date,
+            "end_date": payload.end_date,
             "start_time": payload.start_time,
             "end_time": payload.end_time,
             "total_in": total_in,
@@ -181,8 +169,11 @@ def get_throughput(payload: DateRequest, db: Database = Depends(get_db)):
             "avg_out": avg_out,
             "overflow": overflow_count,
             "parcels_in_time": parcels_in_time,
-            "parcels_out_time": parcels_out_time
+            "parcels_out_time": parcels_out_time,
+            "per_day": per_day,
         }
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,94 +1,201 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from pymongo.database import Database
-from app.database.db import get_db
-from app.models.kpi_model import DateRequest
-from collections import defaultdict
-from typing import Dict, Any, List
+from fastapi.concurrency import run_in_threadpool
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from app import config as settings
+from app.config import config
+from app.database.db import get_async_db
+from app.database.catalog import catalog
+from app.models.kpi_model import DateRangeRequest, DateRequest
+from app.services import date_range, day_close, incremental, snapshots, volume_stats
+from app.services.snapshots import VOLUME_DIMENSIONS
+from app.services.result_cache import cache_key, result_cache
+from app.utils.concurrency import kpi_limiter
+from app.utils.time_utils import MS_PER_MINUTE, hhmm_to_ms, is_closed_day, parse_time_window, parse_ts_ms
+from typing import Any, Dict, List
 import numpy as np
 
 router = APIRouter()
 
-@router.post("/volume")
-def get_volume(payload: DateRequest, db: Database = Depends(get_db)) -> Dict[str, Any]:
+# The only parcel fields /volume reads
+VOLUME_FIELDS = {
+    "_id": 0,
+    "volume_data.height": 1,
+    "volume_data.width": 1,
+    "volume_data.length": 1,
+}
+
+# Length bands behind the dashboard's "short" and "long" parcel KPIs
+SHORT_LENGTH_MM = 400
+LONG_LENGTH_MM = 600
+
+@router.post("/volume", dependencies=[Depends(kpi_limiter)])
+async def get_volume(payload: DateRequest, db: AsyncDatabase = Depends(get_async_db)) -> Dict[str, Any]:
     """
-    Retrieves height, width, and length distributions + normal distribution
-    parameters for parcels within a given date and time range.
+    Retrieves height, width, and length histograms, stats (min/max/mean/std,
+    p5/p50/p95) and normal distribution parameters for parcels within a
+    given date and time range. Histograms use `bin_width_mm`, else
+    `bin_count` fixed-width bins.
     """
 
     date = payload.date
-    start_time = payload.start_time
-    end_time = payload.end_time
 
     # Ensure collection exists
-    if date not in db.list_collection_names():
+    if not await catalog.exists_async(db, date):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No collection found for date {date}"
         )
 
-    collection = db[date]
-    parcels: List[Dict[str, Any]] = list(collection.find({}))
+    _validate_bins(payload)
+
+    # The cached partial does not depend on the binning asked for
+    key = cache_key("volume", payload)
+    partial = result_cache.get(key)
+    if partial is None:
+        partial = await _compute_volume(payload, db[date])
+        result_cache.put(key, partial)
+    return _volume_response(partial, payload)
+
+
+async def _compute_volume(payload: DateRequest, collection: AsyncCollection) -> Dict[str, Any]:
+    start_time, end_time = parse_time_window(payload.start_time, payload.end_time)
+    # The end minute itself is included ("23:59" keeps 23:59:59,999)
+    start_ms, end_ms = hhmm_to_ms(start_time), hhmm_to_ms(end_time) + MS_PER_MINUTE - 1
 
-    if not parcels:
+    # Sketching is CPU-bound, so it runs in the threadpool and leaves the event loop to I/O
+    overflow_locations = config.get("overflow_locations", [])
+    snapshot = snapshots.load(collection.name, overflow_locations)
+    if snapshot is not None:
+        return await run_in_threadpool(_volume_from_snapshot, snapshot, start_ms, end_ms)
+
+    if await collection.find_one({}, {"_id": 1}) is None:
         return {"message": "No data found for this date"}
 
-    def extract_hhmm(ts_str: str) -> str:
-        """
-        Extract HH:MM from HH:MM:SS,milliseconds.
-        If format invalid, returns '00:00'.
-        """
-        try:
-            # Example: "09:15:26,625" -> "09:15"
-            return ts_str.split(",")[0][:5]
-        except Exception:
-            return "00:00"
-
-    def is_in_time_range(ts_str: str) -> bool:
-        """Check if timestamp is within the given HH:MM range."""
-        hhmm = extract_hhmm(ts_str)
-        return start_time <= hhmm <= end_time
-
-    # Filter parcels by time range
-    filtered_parcels = [
-        p for p in parcels
-        if is_in_time_range(p.get("registerTS", "00:00"))
-    ]
-
-    height_count = defaultdict(int)
-    width_count = defaultdict(int)
-    length_count = defaultdict(int)
-
-    heights, widths, lengths = [], [], []
-
-    for parcel in filtered_parcels:
+    if not is_closed_day(collection.name):
+        # Still being written: per-minute partials following the change stream,
+        # when the deployment has one
+        day = await incremental.day_partials(collection.database, collection.name, overflow_locations)
+        if day is not None:
+            return await run_in_threadpool(_volume_partial, day.registered_dimensions(start_ms, end_ms))
+
+    # Only parcels registered in the window leave the database (registerTS_ms
+    # index), and those the sorter wrote without registerTS_ms, whose registerTS
+    # is parsed with the rest; parcels without a registerTS are never in any window
+    window = {"$gte": start_ms, "$lte": end_ms}
+    query = {"$or": [{"registerTS_ms": window}, {"registerTS_ms": {"$exists": False}}]}
+    if await day_close.has_step_async(collection.database, collection.name, day_close.NORMALIZE_STEP):
+        query = {"registerTS_ms": window}
+    batch_size = settings.MONGODB_CURSOR_BATCH_SIZE
+    parcels = collection.find(query, {**VOLUME_FIELDS, "registerTS_ms": 1, "registerTS": 1}, batch_size=batch_size)
+    # One batch in memory at a time: each is sketched as it arrives and the sketches merged
+    partials, batch = [], []
+    async for parcel in parcels:
+        batch.append(parcel)
+        if len(batch) == batch_size:
+            partials.append(await run_in_threadpool(_volume_from_parcels, batch, start_ms, end_ms))
+            batch = []
+    if batch or not partials:
+        partials.append(await run_in_threadpool(_volume_from_parcels, batch, start_ms, end_ms))
+    return await run_in_threadpool(_merge_partials, partials)
+
+
+def _volume_from_parcels(parcels: List[Dict[str, Any]], start_ms: int, end_ms: int) -> Dict[str, Any]:
+    values = {name: [] for name in VOLUME_DIMENSIONS}
+    for parcel in parcels:
+        if "registerTS_ms" not in parcel:
+            register_ms = parse_ts_ms(parcel.get("registerTS"))
+            if register_ms is None or not start_ms <= register_ms <= end_ms:
+                continue
         volume = parcel.get("volume_data", {})
-        if (h := volume.get("height")) is not None:
-            height_count[h] += 1
-            heights.append(h)
-        if (w := volume.get("width")) is not None:
-            width_count[w] += 1
-            widths.append(w)
-        if (l := volume.get("length")) is not None:
-            length_count[l] += 1
-            lengths.append(l)
-
-    def normal_stats(values: List[float]) -> Dict[str, float]:
-        """Return mean and std deviation for normal distribution."""
-        if not values:
-            return {"mean": 0, "std_dev": 0}
-        arr = np.array(values)
-        return {
-            "mean": round(float(np.mean(arr)), 2),
-            "std_dev": round(float(np.std(arr)), 2)
-        }
+        for name in VOLUME_DIMENSIONS:
+            if (value := volume_stats.as_number(volume.get(name))) is not None:
+                values[name].append(value)
+
+    return _volume_partial({name: np.array(dimension, dtype=float) for name, dimension in values.items()})
+
+
+def _volume_partial(dimensions: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """One day's mergeable result: a sketch per dimension plus the length band counts."""
+    lengths = dimensions["length"]
+    return {
+        **{name: volume_stats.sketch(dimensions[name]) for name in VOLUME_DIMENSIONS},
+        "length_bands": {
+            f"up_to_{SHORT_LENGTH_MM}_mm": int(np.count_nonzero((lengths > 0) & (lengths <= SHORT_LENGTH_MM))),
+            f"from_{LONG_LENGTH_MM}_mm": int(np.count_nonzero(lengths >= LONG_LENGTH_MM)),
+        },
+    }
+
+
+def _merge_partials(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Partials of batches or days as one: the sketches merged and the band counts summed."""
+    merged = {name: volume_stats.merge(part[name] for part in partials) for name in VOLUME_DIMENSIONS}
+    merged["length_bands"] = {
+        band: sum(part["length_bands"][band] for part in partials)
+        for band in (f"up_to_{SHORT_LENGTH_MM}_mm", f"from_{LONG_LENGTH_MM}_mm")
+    }
+    return merged
 
+
+def _volume_from_snapshot(snapshot: snapshots.DaySnapshot, start_ms: int, end_ms: int) -> Dict[str, Any]:
+    """The same partial as the MongoDB scan, from a closed day's columnar snapshot."""
+    if snapshot.parcels.num_rows == 0:
+        return {"message": "No data found for this date"}
+    return _volume_partial(snapshots.registered_dimensions(snapshot, start_ms, end_ms))
+
+
+def _validate_bins(payload):
+    if payload.bin_width_mm is not None and payload.bin_width_mm <= 0:
+        raise HTTPException(status_code=400, detail="bin_width_mm must be positive")
+    if payload.bin_count is not None and payload.bin_count < 1:
+        raise HTTPException(status_code=400, detail="bin_count must be positive")
+
+
+def _volume_response(partial: Dict[str, Any], payload) -> Dict[str, Any]:
+    """Histograms and stats of a (merged) partial, binned as the request asks."""
+    if "message" in partial:
+        return partial
+
+    stats = {name: volume_stats.stats(partial[name]) for name in VOLUME_DIMENSIONS}
     return {
-        "height_distribution": dict(height_count),
-        "width_distribution": dict(width_count),
-        "length_distribution": dict(length_count),
+        "histograms": {
+            name: volume_stats.histogram(partial[name], payload.bin_width_mm, payload.bin_count)
+            for name in VOLUME_DIMENSIONS
+        },
+        "stats": stats,
         "normal_distribution": {
-            "height": normal_stats(heights),
-            "width": normal_stats(widths),
-            "length": normal_stats(lengths)
+            name: {"mean": stats[name]["mean"], "std_dev": stats[name]["std_dev"]}
+            for name in VOLUME_DIMENSIONS
+        },
+        "length_kpis": {"total": stats["length"]["count"], **partial["length_bands"]},
+    }
+
+
+@router.post("/volume/range", dependencies=[Depends(kpi_limiter)])
+async def get_volume_range(payload: DateRangeRequest, db: AsyncDatabase = Depends(get_async_db)) -> Dict[str, Any]:
+    """
+    Height, width and length histograms and stats over a range of days; the
+    daily sketches are merged, so the stats are those of the whole range.
+    """
+    try:
+        _validate_bins(payload)
+
+        # Same cache entries as the single-day endpoint
+        days = await date_range.fan_out(
+            db, payload, "volume",
+            lambda date: _compute_volume(payload, db[date]),
+        )
+
+        merged = _merge_partials([result for result in days.values() if "message" not in result])
+
+        return {
+            "start_date": payload.start_date,
+            "end_date": payload.end_date,
+            "days": len(days),
+            **_volume_response(merged, payload),
         }
-    }
\ No newline at end of file
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
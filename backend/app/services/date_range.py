@@ -0,0 +1,63 @@
+# app/services/date_range.py
+"""Fan-out of a date-range KPI request over the per-day collections.
+
+Each day is computed (or served from the result cache) on its own, in
+parallel, and the routes merge the per-day partial results.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi import HTTPException
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app import config as settings
+from app.database.catalog import catalog
+from app.services.result_cache import cache_key, result_cache
+
+
+def expand_dates(start_date: str, end_date: str) -> List[str]:
+    """Every "YYYY-MM-DD" day from start_date to end_date, inclusive."""
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Date format must be YYYY-MM-DD")
+    if end < start:
+        raise HTTPException(status_code=400, detail="End date must not be before start date")
+
+    days = (end - start).days + 1
+    if days > settings.RANGE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {settings.RANGE_MAX_DAYS} days")
+    return [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+async def fan_out(db: AsyncDatabase, payload, endpoint: str,
+                  compute: Callable[[str], Awaitable[Any]]) -> Dict[str, Any]:
+    """Per-day partial results of `endpoint` for every existing day of the range.
+
+    Partials are cached under (endpoint, day, window, bin size), so closed days
+    are computed once and then reused by every range that covers them.
+    """
+    dates = expand_dates(payload.start_date, payload.end_date)
+    names = await catalog.names_async(db)
+    dates = [date for date in dates if date in names]
+    if not dates:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No collection found between {payload.start_date} and {payload.end_date}",
+        )
+
+    limit = asyncio.Semaphore(settings.RANGE_FANOUT_CONCURRENCY)
+
+    async def one_day(date: str) -> Any:
+        key = cache_key(endpoint, payload, date)
+        partial = result_cache.get(key)
+        if partial is None:
+            async with limit:
+                partial = await compute(date)
+            result_cache.put(key, partial)
+        return partial
+
+    partials = await asyncio.gather(*(one_day(date) for date in dates))
+    return dict(zip(dates, partials))
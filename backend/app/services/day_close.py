@@ -0,0 +1,152 @@
+# app/services/day_close.py
+"""Maintenance of the days that have closed.
+
+The sorter writes the day collections directly, so nothing runs the ingest
+stage (``app.services.ingest``) on the parcels of a normal day. Once a day
+has closed - DAY_CLOSE_DELAY_SECONDS after its midnight, for writes arriving
+late - its parcels no longer change, and the work ingest would have done is
+done once, by each of STEPS in turn:
+
+- ``normalize``: `ingest.backfill_collection`, so KPI paths read the
+  normalized fields instead of deriving them from the raw ones
+- ``rollup``: `rollups.rebuild`, so /summary and /throughput windows of the
+  day add up per-slot counters instead of aggregating the parcels
+- ``lookup``: `parcel_lookup.rebuild`, so parcel journey searches without
+  a date find the day's parcels in the cross-day lookup
+
+A background thread of every API process (`start_in_background`) looks for
+such days every DAY_CLOSE_INTERVAL_SECONDS; ``python manage.py close-days``
+does the same once. The ``closed_days`` collection records the steps done
+for each day; a step name carries the version of what it writes, so bumping
+it (e.g. NORMALIZATION_VERSION) runs the step again on every closed day. A
+day being closed is leased to one process for DAY_CLOSE_LEASE_SECONDS.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Set, Tuple
+
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from app import config as settings
+from app.database.catalog import catalog
+from app.database.db import date_collection_names
+from app.services import ingest, parcel_lookup, rollups
+from app.services.normalization import NORMALIZATION_VERSION
+
+logger = logging.getLogger(__name__)
+
+CLOSED_DAYS_COLLECTION = "closed_days"
+
+NORMALIZE_STEP = f"normalize-{NORMALIZATION_VERSION}"
+ROLLUP_STEP = f"rollup-{rollups.ROLLUP_VERSION}"
+LOOKUP_STEP = f"lookup-{parcel_lookup.LOOKUP_VERSION}"
+
+# (step name, what it runs on the day)
+STEPS: List[Tuple[str, Callable[[Database, str], object]]] = [
+    (NORMALIZE_STEP, lambda db, date: ingest.backfill_collection(db[date])),
+    (ROLLUP_STEP, lambda db, date: rollups.rebuild(db, date, settings.config.get("overflow_locations", []))),
+    (LOOKUP_STEP, lambda db, date: parcel_lookup.rebuild(db, date)),
+]
+
+# Days known to have a step done, so requests ask the database once per day
+_done: Set[Tuple[str, str]] = set()
+_done_lock = threading.Lock()
+
+
+def is_due(date: str, now: Optional[datetime] = None) -> bool:
+    """Whether `date` ended more than DAY_CLOSE_DELAY_SECONDS ago (local time, like is_closed_day)."""
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return False
+    closes_at = day + timedelta(days=1, seconds=settings.DAY_CLOSE_DELAY_SECONDS)
+    return (now or datetime.now()) >= closes_at
+
+
+def pending_days(db: Database) -> List[str]:
+    """Closed days with a step not done yet, oldest first."""
+    steps = [name for name, _ in STEPS]
+    done = {doc["_id"] for doc in db[CLOSED_DAYS_COLLECTION].find({"steps": {"$all": steps}}, {"_id": 1})}
+    return [date for date in date_collection_names(db) if is_due(date) and date not in done]
+
+
+def _claim(db: Database, date: str) -> Optional[List[str]]:
+    """Lease `date` to this process; returns the steps already done, or None if another process holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        doc = db[CLOSED_DAYS_COLLECTION].find_one_and_update(
+            {"_id": date, "$or": [{"leased_until": None}, {"leased_until": {"$lt": now}}]},
+            {"$set": {"leased_until": now + timedelta(seconds=settings.DAY_CLOSE_LEASE_SECONDS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return None
+    return (doc or {}).get("steps", [])
+
+
+def close_day(db: Database, date: str) -> List[str]:
+    """Run the steps `date` has not had yet; returns the ones run (none if another process holds the day)."""
+    done = _claim(db, date)
+    if done is None:
+        return []
+    collection = db[CLOSED_DAYS_COLLECTION]
+    ran = []
+    try:
+        for name, step in STEPS:
+            if name in done:
+                continue
+            step(db, date)
+            collection.update_one({"_id": date}, {"$addToSet": {"steps": name}})
+            ran.append(name)
+    finally:
+        collection.update_one(
+            {"_id": date},
+            {"$set": {"closed_at": datetime.now(timezone.utc)}, "$unset": {"leased_until": ""}},
+        )
+    return ran
+
+
+def close_pending(db: Database) -> List[str]:
+    """Close every pending day; a failing day is logged and retried on the next pass."""
+    closed = []
+    for date in pending_days(db):
+        try:
+            if close_day(db, date):
+                closed.append(date)
+                logger.info("Closed %s", date)
+        except Exception:
+            logger.exception("Closing %s failed", date)
+    return closed
+
+
+def start_in_background(db: Database) -> threading.Event:
+    """Startup hook: close pending days now and then every DAY_CLOSE_INTERVAL_SECONDS; set the event to stop."""
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                catalog.names(db)  # finds the day the sorter has started since, for its indexes
+                close_pending(db)
+            except Exception:
+                logger.exception("Looking for days to close failed")
+            if stop.wait(settings.DAY_CLOSE_INTERVAL_SECONDS):
+                return
+
+    threading.Thread(target=run, name="close-days", daemon=True).start()
+    return stop
+
+
+async def has_step_async(db: AsyncDatabase, date: str, step: str) -> bool:
+    """Whether `step` has been done for `date` (cached once true: a closed day stays closed)."""
+    with _done_lock:
+        if (date, step) in _done:
+            return True
+    if await db[CLOSED_DAYS_COLLECTION].find_one({"_id": date, "steps": step}, {"_id": 1}) is None:
+        return False
+    with _done_lock:
+        _done.add((date, step))
+    return True
@@ -0,0 +1,49 @@
+# app/services/expressions.py
+"""Reusable MongoDB aggregation expressions for parsing the raw parcel fields server side."""
+from typing import Any, Dict
+
+# "HH:MM:SS" optionally followed by ",fff" - same formats as time_utils.parse_ts_ms
+TS_REGEX = r"^\d{1,2}:\d{1,2}:\d{1,2}(,\d{1,6})?$"
+
+
+def ts_to_ms(field: Any) -> Dict[str, Any]:
+    """Expression turning an "HH:MM:SS,fff" string into milliseconds since midnight (null if unparseable)."""
+    return {
+        "$let": {
+            "vars": {"t": {"$trim": {"input": {"$ifNull": [field, ""]}}}},
+            "in": {
+                "$cond": [
+                    {"$regexMatch": {"input": "$$t", "regex": TS_REGEX}},
+                    {
+                        "$let": {
+                            "vars": {
+                                "main": {"$split": [{"$arrayElemAt": [{"$split": ["$$t", ","]}, 0]}, ":"]},
+                                "frac": {"$arrayElemAt": [{"$split": ["$$t", ","]}, 1]},
+                            },
+                            "in": {
+                                "$add": [
+                                    {"$multiply": [{"$toInt": {"$arrayElemAt": ["$$main", 0]}}, 3600000]},
+                                    {"$multiply": [{"$toInt": {"$arrayElemAt": ["$$main", 1]}}, 60000]},
+                                    {"$multiply": [{"$toInt": {"$arrayElemAt": ["$$main", 2]}}, 1000]},
+                                    {
+                                        "$cond": [
+                                            {"$eq": [{"$type": "$$frac"}, "string"]},
+                                            {"$toInt": {"$substrCP": [{"$concat": ["$$frac", "00"]}, 0, 3]}},
+                                            0,
+                                        ]
+                                    },
+                                ]
+                            },
+                        }
+                    },
+                    None,
+                ]
+            },
+        }
+    }
+
+
+def raw_part(parts: Any, index: int) -> Dict[str, Any]:
+    """Expression reading field `index` of a split raw log, null when the log is too short."""
+    return {"$cond": [{"$gt": [{"$size": parts}, index]}, {"$arrayElemAt": [parts, index]}, None]}
+
@@ -0,0 +1,83 @@
+# app/services/incremental.py
+"""Incremental KPIs of the days still being written.
+
+/summary, /throughput and /volume on today's collection used to recompute
+the day on every call. Instead, each process follows today like a /live
+client does: a subscriber of the process-wide change stream
+(``app.services.live``), whose `LiveDay` - per-minute partials, exact for
+any HH:MM window - is read once and then kept up to date by every write,
+whoever makes it (the sorter, ingest, an event appended in place, a
+deleted parcel). A query is answered from it as of the last change the
+stream delivered.
+
+The subscription lasts while the day is open; it is taken again after the
+stream fails. Without change streams (no replica set) `day_partials`
+returns None, and the aggregation pipelines answer; subscribing is tried
+again INCREMENTAL_RETRY_SECONDS later rather than on every request.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import PyMongoError
+
+from app import config as settings
+from app.services.live import LiveDay, Subscriber, live_feed
+from app.utils.time_utils import is_closed_day
+
+logger = logging.getLogger(__name__)
+
+
+class _DayPartials:
+    def __init__(self):
+        self.subscriber: Optional[Subscriber] = None
+        # No change streams: not tried again before then (time.monotonic)
+        self.retry_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+_days: Dict[str, _DayPartials] = {}
+
+
+def _following(date: str, subscriber: Optional[Subscriber]) -> bool:
+    """Whether `subscriber` still gets the day's changes (not after the stream failed or closed)."""
+    return subscriber is not None and subscriber.error is None and live_feed.days.get(date) is subscriber.day
+
+
+async def _subscribe(db: AsyncDatabase, date: str, overflow_locations: List[str],
+                     partials: _DayPartials) -> Optional[Subscriber]:
+    if time.monotonic() < partials.retry_at:
+        return None
+    try:
+        await live_feed.check(db)
+        return await live_feed.subscribe(db, date, overflow_locations)
+    except PyMongoError as e:
+        logger.info("No incremental KPIs for %s (%s); the aggregation pipelines answer", date, e)
+        partials.retry_at = time.monotonic() + settings.INCREMENTAL_RETRY_SECONDS
+        return None
+
+
+async def day_partials(db: AsyncDatabase, date: str, overflow_locations: List[str]) -> Optional[LiveDay]:
+    """The per-minute partials of a day still being written, following its collection.
+
+    None when the deployment has no change streams; the caller computes the
+    KPIs from the collection instead.
+    """
+    for closed in [d for d in _days if is_closed_day(d)]:
+        subscriber = _days.pop(closed).subscriber
+        if subscriber is not None:
+            live_feed.unsubscribe(subscriber)
+    partials = _days.setdefault(date, _DayPartials())
+
+    async with partials.lock:
+        if not _following(date, partials.subscriber):
+            if partials.subscriber is not None:
+                live_feed.unsubscribe(partials.subscriber)
+            partials.subscriber = await _subscribe(db, date, overflow_locations, partials)
+            if partials.subscriber is None:
+                return None
+        # Nobody waits on its notifications: keep the changed slots from piling up
+        partials.subscriber.take()
+        return partials.subscriber.day
@@ -0,0 +1,68 @@
+# app/services/ingest.py
+"""Ingest/normalization stage for parcel documents.
+
+Parcels stored through `ingest_parcels` get the normalized fields of
+``app.services.normalization`` (or later by `manage.py backfill`).
+
+The per-minute rollups (see ``app.services.rollups``) and the cross-day
+lookup index (``app.services.parcel_lookup``) are updated in the same step.
+
+The sorter writes the day collections directly, not through this stage:
+the days it writes are normalized once closed, by ``app.services.day_close``.
+"""
+from typing import Any, Dict, Iterable
+
+from pymongo import InsertOne, ReplaceOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from app.config import config
+from app.database.catalog import catalog
+from app.database.indexes import ensure_indexes
+from app.services import parcel_lookup, rollups, snapshots
+from app.services.normalization import NORMALIZATION_VERSION, normalization_update, normalize_parcels
+from app.services.result_cache import raw_cache, result_cache
+
+
+def ingest_parcels(db: Database, date: str, docs: Iterable[Dict[str, Any]]) -> int:
+    """Normalize and store parcels in the collection for `date`; returns the number written."""
+    normalized_docs = normalize_parcels(docs)
+    operations = []
+    for normalized in normalized_docs:
+        if "_id" in normalized:
+            operations.append(ReplaceOne({"_id": normalized["_id"]}, normalized, upsert=True))
+        else:
+            operations.append(InsertOne(normalized))
+
+    if not operations:
+        return 0
+    collection = db[date]
+    ensure_indexes(collection)  # first write of a new day creates its indexes
+
+    # Keep the rollup in step when there is one, or start it with a brand new day;
+    # a day that predates rollups needs `manage.py rebuild-rollups` first
+    overflow_locations = config.get("overflow_locations", [])
+    maintain_rollup = (
+        rollups.available(db, date, overflow_locations)
+        or collection.find_one({}, {"_id": 1}) is None
+    )
+    previous = rollups.previous_versions(db, date, normalized_docs) if maintain_rollup else {}
+
+    collection.bulk_write(operations, ordered=False)
+    if maintain_rollup:
+        rollups.apply_writes(db, date, previous, normalized_docs, overflow_locations)
+    parcel_lookup.apply_writes(db, date, normalized_docs)  # bulk_write has set every _id
+    catalog.add(date)
+    snapshots.invalidate(date)  # a snapshot is only valid for a day that no longer changes
+    result_cache.bump_watermark(date)  # cached KPIs for this day are now stale
+    raw_cache.bump_watermark(date)
+    return len(operations)
+
+
+def backfill_collection(collection: Collection) -> int:
+    """Normalize every document of an existing date collection server side."""
+    result = collection.update_many(
+        {"normalized": {"$ne": NORMALIZATION_VERSION}},
+        normalization_update(),
+    )
+    return result.modified_count
@@ -0,0 +1,98 @@
+# app/services/kpi_engine.py
+"""Per-parcel KPI facts shared by /summary and /throughput.
+
+`KpiEngine.facts` walks a parcel's normalized events once and returns every
+fact the two pages reduce over. The aggregation pipelines in
+``summary_pipeline`` / ``throughput_pipeline`` follow the same definitions:
+
+- IN: every msg_id 2 event
+- OUT: the parcel's first verified sort report (msg_id 6) that is a regular
+  sort (sort_code "1") or a failed sort (status "999"); it counts as OUT when
+  it is a regular sort or the parcel was deregistered with reason "2"
+- overflow: the parcel's first failed sort (999) when it was inducted
+  (case 1), or deregistration at a configured overflow location (case 2);
+  a parcel overflows at most once, on both pages
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.services.normalization import as_normalized
+
+OVERFLOW_FAILED_SORT = 1
+OVERFLOW_EXIT_LOCATION = 2
+
+
+class ParcelFacts:
+    __slots__ = (
+        "register_ms", "host_id", "has_host", "sorted", "in_system", "barcode_read",
+        "volume_valid", "tracking_ok", "in_ms", "first_in_ms", "out_ms",
+        "overflow_case", "overflow_ms",
+    )
+
+    def __init__(self):
+        self.register_ms: Optional[int] = None
+        # The hostId when there is one (not missing or empty); /summary counts distinct ones
+        self.host_id: Any = None
+        self.has_host = False
+        self.sorted = False
+        self.in_system = False
+        self.barcode_read = False
+        self.volume_valid = False
+        self.tracking_ok = False
+        self.in_ms: List[int] = []
+        self.first_in_ms: Optional[int] = None
+        self.out_ms: Optional[int] = None
+        self.overflow_case: Optional[int] = None
+        self.overflow_ms: Optional[int] = None
+
+
+class KpiEngine:
+    def __init__(self, overflow_locations: Iterable[str]):
+        self.overflow_locations = frozenset(overflow_locations)
+
+    def facts(self, doc: Dict[str, Any]) -> ParcelFacts:
+        """Facts of one parcel; the normalized fields it lacks are derived from its raw ones."""
+        doc = as_normalized(doc)
+        facts = ParcelFacts()
+        events = doc.get("events") or []
+        msg_ids = set(doc.get("msg_ids") or (e.get("msg_id") for e in events))
+        has_msg_2 = "2" in msg_ids
+
+        out_event = None
+        deregistered = False
+        for event in events:
+            msg_id = event.get("msg_id")
+            if msg_id == "2":
+                ts_ms = event.get("ts_ms")
+                if ts_ms is not None:
+                    facts.in_ms.append(ts_ms)
+            elif msg_id == "6":
+                status = event.get("verified_sort_status")
+                if out_event is None and status is not None and (event.get("sort_code") == "1" or status == "999"):
+                    out_event = event
+                if facts.overflow_case is None and status == "999" and has_msg_2:
+                    facts.overflow_case = OVERFLOW_FAILED_SORT
+                    facts.overflow_ms = event.get("ts_ms")
+            elif msg_id == "7":
+                if event.get("dereg_reason") == "2":
+                    deregistered = True
+                if facts.overflow_case is None and event.get("exit_location") in self.overflow_locations:
+                    facts.overflow_case = OVERFLOW_EXIT_LOCATION
+                    facts.overflow_ms = event.get("ts_ms")
+
+        if out_event is not None and (out_event.get("sort_code") == "1" or deregistered):
+            facts.out_ms = out_event.get("ts_ms")
+        if facts.in_ms:
+            facts.first_in_ms = facts.in_ms[0]
+
+        real_volume = (doc.get("volume_data") or {}).get("real_volume")
+        facts.register_ms = doc.get("registerTS_ms")
+        host_id = doc.get("hostId")
+        if host_id not in (None, ""):
+            facts.host_id = host_id
+            facts.has_host = True
+        facts.sorted = doc.get("status") == "sorted" and doc.get("sort_strategy") == "1"
+        facts.in_system = has_msg_2 and not msg_ids & {"6", "7"}
+        facts.barcode_read = doc.get("barcode_error") is False
+        facts.volume_valid = isinstance(real_volume, (int, float)) and not isinstance(real_volume, bool) and real_volume > 0
+        facts.tracking_ok = {"2", "3", "6"} <= msg_ids
+        return facts
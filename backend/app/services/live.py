@@ -0,0 +1,328 @@
+# app/services/live.py
+"""Live KPIs of the days still being written, kept in memory from a change stream.
+
+A client following a day (``GET /live``, and the incremental KPIs of
+``app.services.incremental``) gets a `LiveDay`: the day's parcels
+are read once into per-slot state - the rollup counters of
+`rollups.parcel_increments`, the hosts, first IN times and volume dimensions
+per registration slot (``time_utils.ms_slot``) - and from then on one change stream per process,
+on every date collection, folds each written parcel in as it arrives. What a
+parcel added is remembered by _id, so a rewritten or deleted parcel is
+retracted exactly. Serving a window is then a pass over at most 2,880
+slots and never touches MongoDB again.
+
+Days nobody follows are dropped, and the stream stops with the last one.
+Change streams need a replica set (a single-node one will do).
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+from app import config as settings
+from app.database.db import DATE_COLLECTION_PATTERN
+from app.services.kpi_engine import KpiEngine
+from app.services.normalization import RAW_PROJECTION, normalized_parcels_async
+from app.services.rollups import REGISTERED_COUNTERS, THROUGHPUT_COUNTERS, parcel_increments
+from app.services.snapshots import SNAPSHOT_PROJECTION, VOLUME_DIMENSIONS
+from app.services.summary_pipeline import SUMMARY_COUNTERS
+from app.services.volume_stats import as_number
+from app.utils.time_utils import MS_PER_MINUTE, ms_slot, window_slots
+
+logger = logging.getLogger(__name__)
+
+# Everything a LiveDay reads of a parcel: the rollup fields and the dimensions
+LIVE_PROJECTION = SNAPSHOT_PROJECTION
+
+# Stands for "the collection was dropped" among the changes buffered during a load
+_DROPPED = object()
+
+
+def _change_pipeline() -> List[Dict[str, Any]]:
+    return [
+        {"$match": {
+            "ns.coll": {"$regex": DATE_COLLECTION_PATTERN.pattern},
+            "operationType": {"$in": ["insert", "replace", "update", "delete", "drop"]},
+        }},
+        {"$project": {
+            "operationType": 1,
+            "ns": 1,
+            "documentKey": 1,
+            # A parcel the sorter wrote itself is normalized from its raw fields
+            **{f"fullDocument.{field}": 1 for field in {**LIVE_PROJECTION, **RAW_PROJECTION}},
+        }},
+    ]
+
+
+class Subscriber:
+    """One live client of a day: the slots changed since it was last served."""
+
+    def __init__(self, day: "LiveDay"):
+        self.day = day
+        self.reg_slots: Set[int] = set()
+        self.ev_slots: Set[int] = set()
+        self.changed = asyncio.Event()
+        self.error: Optional[str] = None
+
+    def notify(self, reg_slots: Set[int], ev_slots: Set[int]):
+        self.reg_slots |= reg_slots
+        self.ev_slots |= ev_slots
+        self.changed.set()
+
+    def fail(self, error: str):
+        self.error = error
+        self.changed.set()
+
+    def take(self) -> Tuple[Set[int], Set[int]]:
+        """The changed registration and event slots, forgetting them."""
+        reg_slots, ev_slots = self.reg_slots, self.ev_slots
+        self.reg_slots, self.ev_slots = set(), set()
+        self.changed.clear()
+        return reg_slots, ev_slots
+
+
+class LiveDay:
+    """Per-slot KPI state of one day, updated parcel by parcel."""
+
+    def __init__(self, date: str, overflow_locations: List[str]):
+        self.date = date
+        self.engine = KpiEngine(overflow_locations)
+        self.counters: Dict[int, Counter] = defaultdict(Counter)
+        # Registration slot -> multiset of the hostIds / the first IN times / the dimensions
+        self.hosts: Dict[int, Counter] = defaultdict(Counter)
+        self.first_in: Dict[int, Counter] = defaultdict(Counter)
+        self.dimensions: Dict[int, Dict[str, List[float]]] = {}
+        self.subscribers: Set[Subscriber] = set()
+        self.loading: Optional[asyncio.Task] = None
+        self._parcels: Dict[Any, tuple] = {}
+        # Changes that arrive while the day is being read, replayed after it
+        self._buffer: Optional[List[tuple]] = []
+
+    def change(self, parcel_id: Any, doc: Optional[Dict[str, Any]]) -> Tuple[Set[int], Set[int]]:
+        """Apply a written (doc) or deleted (None) parcel; returns the slots it touched."""
+        if self._buffer is not None:
+            self._buffer.append((parcel_id, doc))
+            return set(), set()
+        return self._apply(parcel_id, doc)
+
+    def drop(self) -> Tuple[Set[int], Set[int]]:
+        if self._buffer is not None:
+            self._buffer.append((_DROPPED, None))
+            return set(), set()
+        return self._clear()
+
+    @property
+    def parcel_count(self) -> int:
+        return len(self._parcels)
+
+    async def load(self, db: AsyncDatabase):
+        """Read the day's parcels, then replay what changed meanwhile."""
+        parcels = normalized_parcels_async(db[self.date], {}, LIVE_PROJECTION, settings.MONGODB_CURSOR_BATCH_SIZE)
+        async for doc in parcels:
+            self._apply(doc["_id"], doc)
+        # In stream order, so the last change of each parcel - its current version - wins
+        for parcel_id, doc in self._buffer:
+            if parcel_id is _DROPPED:
+                self._clear()
+            else:
+                self._apply(parcel_id, doc)
+        self._buffer = None
+
+    def _apply(self, parcel_id: Any, doc: Optional[Dict[str, Any]]) -> Tuple[Set[int], Set[int]]:
+        reg_slots: Set[int] = set()
+        ev_slots: Set[int] = set()
+        self._retract(parcel_id, reg_slots, ev_slots)
+        if doc is None:
+            return reg_slots, ev_slots
+
+        facts = self.engine.facts(doc)
+        increments = tuple(parcel_increments(facts))
+        for slot, name in increments:
+            self.counters[slot][name] += 1
+            (reg_slots if name.startswith("reg.") else ev_slots).add(slot)
+
+        slot = host_id = first_in_ms = None
+        dimensions: Tuple[Tuple[str, float], ...] = ()
+        if facts.register_ms is not None:
+            slot = ms_slot(facts.register_ms)
+            reg_slots.add(slot)
+            host_id = facts.host_id
+            if host_id is not None:
+                self.hosts[slot][host_id] += 1
+            first_in_ms = facts.first_in_ms
+            if first_in_ms is not None:
+                self.first_in[slot][first_in_ms] += 1
+            volume = doc.get("volume_data") or {}
+            dimensions = tuple(
+                (name, value) for name in VOLUME_DIMENSIONS
+                if (value := as_number(volume.get(name))) is not None
+            )
+            values = self.dimensions.setdefault(slot, {name: [] for name in VOLUME_DIMENSIONS})
+            for name, value in dimensions:
+                values[name].append(value)
+
+        self._parcels[parcel_id] = (increments, slot, host_id, first_in_ms, dimensions)
+        return reg_slots, ev_slots
+
+    def _retract(self, parcel_id: Any, reg_slots: Set[int], ev_slots: Set[int]):
+        added = self._parcels.pop(parcel_id, None)
+        if added is None:
+            return
+        increments, slot, host_id, first_in_ms, dimensions = added
+        for counter_slot, name in increments:
+            self.counters[counter_slot][name] -= 1
+            (reg_slots if name.startswith("reg.") else ev_slots).add(counter_slot)
+        if slot is None:
+            return
+        reg_slots.add(slot)
+        for multiset, value in ((self.hosts[slot], host_id), (self.first_in[slot], first_in_ms)):
+            if value is not None:
+                multiset[value] -= 1
+                if not multiset[value]:
+                    del multiset[value]
+        for name, value in dimensions:
+            self.dimensions[slot][name].remove(value)
+
+    def _clear(self) -> Tuple[Set[int], Set[int]]:
+        reg_slots: Set[int] = set()
+        ev_slots: Set[int] = set()
+        for parcel_id in list(self._parcels):
+            self._retract(parcel_id, reg_slots, ev_slots)
+        return reg_slots, ev_slots
+
+    def summary_row(self, start_ms: int, end_ms: int) -> Dict[str, Any]:
+        """Summary counters of the parcels registered in [start_ms, end_ms], like rollups.summary_row."""
+        row: Dict[str, Any] = {name: 0 for name in SUMMARY_COUNTERS}
+        hosts = set()
+        first_in: List[int] = []
+        for slot in window_slots(start_ms, end_ms):
+            counters = self.counters.get(slot)
+            if counters:
+                for name in REGISTERED_COUNTERS:
+                    row[name] += counters[f"reg.{name}"]
+            if self.hosts.get(slot):
+                hosts.update(self.hosts[slot])
+            if self.first_in.get(slot):
+                first_in.extend(self.first_in[slot])
+        row["total_parcels"] = len(hosts)
+        row["in_min_ms"] = min(first_in) if first_in else None
+        row["in_max_ms"] = max(first_in) if first_in else None
+        return row
+
+    def throughput_bins(self, start_ms: int, end_ms: int, bin_size: int) -> Dict[str, Any]:
+        """Totals and per-bin IN/OUT counts for [start_ms, end_ms], like rollups.throughput_bins."""
+        totals = {name: 0 for name in THROUGHPUT_COUNTERS}
+        bins: Dict[str, Dict[int, int]] = {"in": {}, "out": {}}
+        start_minute = start_ms // MS_PER_MINUTE
+        for slot in window_slots(start_ms, end_ms):
+            counters = self.counters.get(slot)
+            if not counters:
+                continue
+            index = (slot // 2 - start_minute) // bin_size
+            for name in THROUGHPUT_COUNTERS:
+                totals[name] += counters[f"ev.{name}"]
+            for name in bins:
+                if counters[f"ev.{name}"]:
+                    bins[name][index] = bins[name].get(index, 0) + counters[f"ev.{name}"]
+        return {"totals": totals, "bins": bins}
+
+    def registered_dimensions(self, start_ms: int, end_ms: int) -> Dict[str, np.ndarray]:
+        """Height/width/length of the parcels registered in [start_ms, end_ms], like snapshots.registered_dimensions."""
+        values: Dict[str, List[float]] = {name: [] for name in VOLUME_DIMENSIONS}
+        for slot in window_slots(start_ms, end_ms):
+            for name, slot_values in self.dimensions.get(slot, {}).items():
+                values[name].extend(slot_values)
+        return {name: np.array(dimension, dtype=float) for name, dimension in values.items()}
+
+
+class LiveFeed:
+    """The process-wide change stream and the LiveDay of every followed day."""
+
+    def __init__(self):
+        self.days: Dict[str, LiveDay] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Held while the stream is opened, so concurrent first subscribers open one
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    async def check(db: AsyncDatabase):
+        """Raise a PyMongoError unless the deployment has change streams (replica set or mongos)."""
+        hello = await db.client.admin.command("hello")
+        if "setName" not in hello and hello.get("msg") != "isdbgrid":
+            raise OperationFailure("not a replica set or a sharded cluster")
+
+    async def subscribe(self, db: AsyncDatabase, date: str, overflow_locations: List[str]) -> Subscriber:
+        """Follow `date`; raises the PyMongoError of a deployment without change streams."""
+        async with self._lock:
+            if self._task is None or self._task.done():
+                # Opened before any day is read, so no write can fall between the two
+                stream = await db.watch(_change_pipeline(), full_document="updateLookup")
+                self.days.clear()
+                self._task = asyncio.create_task(self._watch(stream))
+
+            day = self.days.get(date)
+            if day is None:
+                day = self.days[date] = LiveDay(date, overflow_locations)
+                day.loading = asyncio.create_task(day.load(db))
+            subscriber = Subscriber(day)
+            day.subscribers.add(subscriber)
+        try:
+            await asyncio.shield(day.loading)
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        day = subscriber.day
+        day.subscribers.discard(subscriber)
+        if day.subscribers or self.days.get(day.date) is not day:
+            return
+        del self.days[day.date]
+        if not self.days and self._task is not None:
+            # Nobody is following a day any more: stop tailing
+            self._task.cancel()
+            self._task = None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.days.clear()
+
+    async def _watch(self, stream):
+        try:
+            async with stream:
+                async for change in stream:
+                    self._apply(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Live change stream stopped")
+            # The days are stale from here on; their clients reconnect and reload
+            for day in self.days.values():
+                for subscriber in day.subscribers:
+                    subscriber.fail(str(e))
+            self.days.clear()
+
+    def _apply(self, change: Dict[str, Any]):
+        day = self.days.get(change["ns"]["coll"])
+        if day is None:
+            return
+        operation = change["operationType"]
+        if operation == "drop":
+            reg_slots, ev_slots = day.drop()
+        else:
+            # An update whose parcel was deleted before the lookup has no fullDocument
+            doc = None if operation == "delete" else change.get("fullDocument")
+            reg_slots, ev_slots = day.change(change["documentKey"]["_id"], doc)
+        if reg_slots or ev_slots:
+            for subscriber in day.subscribers:
+                subscriber.notify(reg_slots, ev_slots)
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,206 @@
+# app/services/normalization.py
+"""Normalized parcel fields, and reading parcels that do not carry them yet.
+
+Everything the routes used to re-derive on every request is written onto
+each parcel once, by `ingest.ingest_parcels` or `manage.py backfill`:
+
+- ``registerTS_ms`` / ``events[].ts_ms``: milliseconds since midnight
+- ``events[].verified_sort_status``: raw[10] of a verified sort report (msg_id 6)
+- ``events[].dereg_reason`` / ``events[].exit_location``: raw[9] / raw[11] of a deregistration (msg_id 7)
+- ``msg_ids``: the set of msg_ids seen for the parcel
+
+The sorter writes the day collections directly, though, so a parcel - or an
+event appended to it in place - may not carry them. A parcel is taken as
+normalized when it has ``registerTS_ms`` and every event has ``ts_ms``;
+every KPI path derives the fields of any other parcel from its raw ones:
+`as_normalized` / `normalized_parcels` in Python and `normalize_missing`
+inside an aggregation pipeline.
+"""
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.collection import Collection
+
+from app.services.expressions import raw_part, ts_to_ms
+from app.utils.time_utils import parse_ts_ms, parse_ts_ms_array
+
+# Bump when the normalized fields change so `manage.py backfill` rewrites old documents
+NORMALIZATION_VERSION = 1
+
+# What normalizing a parcel reads, on top of the fields a KPI path projects
+RAW_PROJECTION = {"registerTS": 1, "events.ts": 1, "events.raw": 1}
+
+
+def _raw_field(parts: List[str], index: int) -> Optional[str]:
+    return parts[index] if len(parts) > index else None
+
+
+def normalize_event(event: Dict[str, Any],
+                    parse: Callable[[Optional[str]], Optional[int]] = parse_ts_ms) -> Dict[str, Any]:
+    normalized = dict(event)
+    normalized["ts_ms"] = parse(event.get("ts"))
+
+    parts = (event.get("raw") or "").split("|")
+    if event.get("msg_id") == "6":
+        normalized["verified_sort_status"] = _raw_field(parts, 10)
+    elif event.get("msg_id") == "7":
+        normalized["dereg_reason"] = _raw_field(parts, 9)
+        normalized["exit_location"] = _raw_field(parts, 11)
+    return normalized
+
+
+def normalize_parcel(doc: Dict[str, Any], timestamps: Optional[Iterator[Optional[int]]] = None) -> Dict[str, Any]:
+    """Return a copy of `doc` with the precomputed fields set.
+
+    `timestamps`, if given, yields the already parsed registerTS and then each
+    event's ts (see normalize_parcels).
+    """
+    parse = parse_ts_ms if timestamps is None else (lambda _: next(timestamps))
+    normalized = dict(doc)
+    normalized["registerTS_ms"] = parse(doc.get("registerTS"))
+    events = [normalize_event(e, parse) for e in doc.get("events") or []]
+    normalized["events"] = events
+    normalized["msg_ids"] = sorted({e["msg_id"] for e in events if e.get("msg_id") is not None})
+    normalized["normalized"] = NORMALIZATION_VERSION
+    return normalized
+
+
+def normalize_parcels(docs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """normalize_parcel for a batch, parsing all of its timestamps in one vectorized pass."""
+    docs = list(docs)
+    stamps = []
+    for doc in docs:
+        stamps.append(doc.get("registerTS"))
+        stamps.extend(event.get("ts") for event in doc.get("events") or [])
+    timestamps = iter([ms if ms >= 0 else None for ms in parse_ts_ms_array(stamps).tolist()])
+    return [normalize_parcel(doc, timestamps) for doc in docs]
+
+
+def is_normalized(doc: Dict[str, Any]) -> bool:
+    return "registerTS_ms" in doc and all("ts_ms" in event for event in doc.get("events") or [])
+
+
+def as_normalized(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """`doc` when it carries the normalized fields, else a copy with the missing ones derived.
+
+    Like `normalize_missing`, a registerTS_ms or event already normalized is
+    kept; the others are derived from the raw fields (see RAW_PROJECTION).
+    """
+    if is_normalized(doc):
+        return doc
+    normalized = dict(doc)
+    if "registerTS_ms" not in doc:
+        normalized["registerTS_ms"] = parse_ts_ms(doc.get("registerTS"))
+    events = [e if "ts_ms" in e else normalize_event(e) for e in doc.get("events") or []]
+    normalized["events"] = events
+    normalized["msg_ids"] = sorted({e["msg_id"] for e in events if e.get("msg_id") is not None})
+    return normalized
+
+
+def _with_raw(projection: Dict[str, Any]) -> Dict[str, Any]:
+    return {**projection, **RAW_PROJECTION}
+
+
+def normalized_parcels(collection: Collection, query: Dict[str, Any], projection: Dict[str, Any],
+                       batch_size: int = 5000) -> Iterator[Dict[str, Any]]:
+    """The parcels matching `query`, normalized.
+
+    They are read with `projection`; the few that are not normalized yet are
+    read again with their raw fields, so the raw logs of the others never
+    leave the database.
+    """
+    batch: List[Dict[str, Any]] = []
+    for doc in collection.find(query, projection, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield from _normalize_batch(collection, batch, projection)
+            batch = []
+    yield from _normalize_batch(collection, batch, projection)
+
+
+def _normalize_batch(collection: Collection, batch: List[Dict[str, Any]],
+                     projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    missing = [doc["_id"] for doc in batch if not is_normalized(doc)]
+    if not missing:
+        return batch
+    raw = {doc["_id"]: doc for doc in collection.find({"_id": {"$in": missing}}, _with_raw(projection))}
+    # A parcel deleted in between is skipped
+    return [doc if is_normalized(doc) else as_normalized(raw[doc["_id"]]) for doc in batch
+            if is_normalized(doc) or doc["_id"] in raw]
+
+
+async def normalized_parcels_async(collection: AsyncCollection, query: Dict[str, Any],
+                                   projection: Dict[str, Any], batch_size: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+    """normalized_parcels on an async collection."""
+    batch: List[Dict[str, Any]] = []
+    async for doc in collection.find(query, projection, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            for normalized in await _normalize_batch_async(collection, batch, projection):
+                yield normalized
+            batch = []
+    for normalized in await _normalize_batch_async(collection, batch, projection):
+        yield normalized
+
+
+async def _normalize_batch_async(collection: AsyncCollection, batch: List[Dict[str, Any]],
+                                 projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    missing = [doc["_id"] for doc in batch if not is_normalized(doc)]
+    if not missing:
+        return batch
+    raw = {doc["_id"]: doc async for doc in collection.find({"_id": {"$in": missing}}, _with_raw(projection))}
+    return [doc if is_normalized(doc) else as_normalized(raw[doc["_id"]]) for doc in batch
+            if is_normalized(doc) or doc["_id"] in raw]
+
+
+def _normalized_event(event: str) -> Dict[str, Any]:
+    return {"$let": {
+        "vars": {"parts": {"$split": [{"$ifNull": [f"{event}.raw", ""]}, "|"]}},
+        "in": {"$mergeObjects": [event, {
+            "ts_ms": ts_to_ms(f"{event}.ts"),
+            "verified_sort_status": {"$cond": [
+                {"$eq": [f"{event}.msg_id", "6"]}, raw_part("$$parts", 10), "$$REMOVE",
+            ]},
+            "dereg_reason": {"$cond": [
+                {"$eq": [f"{event}.msg_id", "7"]}, raw_part("$$parts", 9), "$$REMOVE",
+            ]},
+            "exit_location": {"$cond": [
+                {"$eq": [f"{event}.msg_id", "7"]}, raw_part("$$parts", 11), "$$REMOVE",
+            ]},
+        }]},
+    }}
+
+
+def _missing(field: str) -> Dict[str, Any]:
+    return {"$eq": [{"$type": field}, "missing"]}
+
+
+def normalized_fields(only_missing: bool = False) -> Dict[str, Any]:
+    """$set fields computing the normalized fields inside MongoDB, like normalize_parcel.
+
+    With `only_missing`, a parcel's registerTS_ms and each event that already
+    carry them are kept, so only what the sorter wrote since is derived.
+    """
+    register_ms = ts_to_ms("$registerTS")
+    event = _normalized_event("$$e")
+    if only_missing:
+        register_ms = {"$cond": [_missing("$registerTS_ms"), register_ms, "$registerTS_ms"]}
+        event = {"$cond": [_missing("$$e.ts_ms"), event, "$$e"]}
+    return {
+        "registerTS_ms": register_ms,
+        "events": {"$map": {"input": {"$ifNull": ["$events", []]}, "as": "e", "in": event}},
+        "msg_ids": {"$setUnion": [{"$ifNull": ["$events.msg_id", []]}]},
+    }
+
+
+def normalize_missing() -> Dict[str, Any]:
+    """Pipeline stage deriving the normalized fields of the parcels (and events) that lack them."""
+    return {"$set": normalized_fields(only_missing=True)}
+
+
+def normalization_update() -> List[Dict[str, Any]]:
+    """Update pipeline computing the same fields as normalize_parcel inside MongoDB."""
+    return [{"$set": {
+        **normalized_fields(),
+        "normalized": NORMALIZATION_VERSION,
+    }}]
@@ -0,0 +1,284 @@
+# app/services/parcel_lookup.py
+"""Cross-day parcel lookup index.
+
+The ``parcel_lookup`` collection holds one document per (search key, value,
+day, parcel)::
+
+    {"k": "barcode", "v": "BC000123", "date": "2025-01-01", "pid": <parcel _id>}
+
+``k`` being a ``ParcelJourneyRequest.search_by`` value. A parcel journey
+search without a date resolves here with one indexed query instead of
+visiting every daily collection.
+
+Barcode entries also store the reversed barcode as ``r``, so prefix
+(``"ABC*"``) and suffix (``"*123"``) searches are both index range scans
+on ``v`` and ``r`` respectively.
+
+The sorter writes its days directly, so a day's entries are built once it
+has closed (``app.services.day_close``), or by ``python manage.py
+rebuild-lookup``; ``parcel_lookup_days`` lists the days whose entries are
+complete. The other days - today at least - are searched in their own
+collection (`day_query`) and merged into the same order.
+"""
+import asyncio
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+
+from app.database.catalog import catalog
+from app.database.db import is_date_collection
+from app.database.indexes import ensure_indexes
+
+LOOKUP_COLLECTION = "parcel_lookup"
+# One {"_id": date} document per day whose entries are complete
+LOOKUP_DAYS_COLLECTION = "parcel_lookup_days"
+# Bump when the entries change, so closed days are rebuilt (see day_close)
+LOOKUP_VERSION = 1
+
+LOOKUP_INDEXES = [
+    # Newest day first, then parcel _id: the order pages are served in
+    IndexModel([("k", ASCENDING), ("v", ASCENDING), ("date", DESCENDING), ("pid", ASCENDING)],
+               name="k_1_v_1_date_-1_pid_1", unique=True),
+    # Suffix searches on the reversed barcode
+    IndexModel([("k", ASCENDING), ("r", ASCENDING), ("date", DESCENDING), ("pid", ASCENDING)],
+               name="k_1_r_1_date_-1_pid_1"),
+    # Replacing the entries of one day or one parcel
+    IndexModel([("date", ASCENDING), ("pid", ASCENDING)], name="date_1_pid_1"),
+]
+
+# Only the parcel fields the entries are built from
+LOOKUP_PROJECTION = {"hostId": 1, "alibi_id": 1, "barcode_data.barcodes": 1}
+
+
+def entries(date: str, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lookup entries of one stored parcel (which must have its _id)."""
+    keys = [("host_id", doc.get("hostId")), ("alibi_id", doc.get("alibi_id"))]
+    keys += [("barcode", barcode) for barcode in (doc.get("barcode_data") or {}).get("barcodes") or []]
+
+    result, seen = [], set()
+    for key, value in keys:
+        if value is None or (key, value) in seen:
+            continue
+        seen.add((key, value))
+        entry = {"k": key, "v": value, "date": date, "pid": doc["_id"]}
+        if key == "barcode" and isinstance(value, str):
+            entry["r"] = value[::-1]
+        result.append(entry)
+    return result
+
+
+def wildcard(value: str) -> Optional[Tuple[str, str]]:
+    """("v", prefix) for "ABC*", ("r", reversed suffix) for "*123", None for an exact value.
+
+    Raises ValueError for any other use of "*".
+    """
+    if "*" not in value:
+        return None
+    if value.endswith("*") and "*" not in value[:-1]:
+        return "v", value[:-1]
+    if value.startswith("*") and "*" not in value[1:]:
+        return "r", value[1:][::-1]
+    raise ValueError("Only prefix (ABC*) or suffix (*123) wildcards are supported")
+
+
+def day_query(search_by: str, value: str) -> Dict[str, Any]:
+    """The query of a search on one day's collection, barcode wildcards as anchored regexes."""
+    if search_by == "host_id":
+        return {"hostId": value}
+    if search_by == "alibi_id":
+        return {"alibi_id": value}
+    pattern = wildcard(value)
+    if pattern is None:
+        return {"barcode_data.barcodes": value}
+    field, text = pattern
+    if field == "v":
+        return {"barcode_data.barcodes": {"$regex": "^" + re.escape(text)}}
+    return {"barcode_data.barcodes": {"$regex": re.escape(text[::-1]) + "$"}}
+
+
+def _starts_with(prefix: str) -> Dict[str, str]:
+    # A range rather than an anchored regex: index bounds without regex escaping
+    return {"$gte": prefix, "$lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)}
+
+
+def _following(after: Dict[str, Any], field: Optional[str]) -> List[Dict[str, Any]]:
+    """$or clauses for the matches sorted after `after`."""
+    clauses = [
+        {"date": {"$lt": after["date"]}},
+        {"date": after["date"], "pid": {"$gt": after["pid"]}},
+    ]
+    if field is None:
+        return clauses
+    return [{field: {"$gt": after[field]}}] + [{field: after[field], **clause} for clause in clauses]
+
+
+def _is_following(match: Dict[str, Any], after: Dict[str, Any], field: Optional[str]) -> bool:
+    """`_following` for a match built in Python."""
+    if field is not None and match[field] != after[field]:
+        return match[field] > after[field]
+    if match["date"] != after["date"]:
+        return match["date"] < after["date"]
+    return match["pid"] > after["pid"]
+
+
+def _in_order(matches: List[Dict[str, Any]], field: Optional[str]) -> List[Dict[str, Any]]:
+    """Matches sorted like the lookup index: `field`, then newest day first, then pid."""
+    matches = sorted(matches, key=lambda match: match["pid"])
+    matches.sort(key=lambda match: match["date"], reverse=True)
+    if field is not None:
+        matches.sort(key=lambda match: match[field])
+    return matches
+
+
+def ensure_lookup_indexes(db: Database) -> List[str]:
+    return ensure_indexes(db[LOOKUP_COLLECTION], LOOKUP_INDEXES)
+
+
+def apply_writes(db: Database, date: str, docs: Iterable[Dict[str, Any]]):
+    """Replace the entries of parcels just written to `date` (their keys may have changed)."""
+    docs = list(docs)
+    if not docs:
+        return
+    collection = db[LOOKUP_COLLECTION]
+    ensure_lookup_indexes(db)
+    collection.delete_many({"date": date, "pid": {"$in": [doc["_id"] for doc in docs]}})
+    # Upserts, so two ingests of the same parcel cannot collide on the unique index
+    operations = [ReplaceOne(entry, entry, upsert=True) for doc in docs for entry in entries(date, doc)]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def rebuild(db: Database, date: str, batch_size: int = 5000) -> int:
+    """Recompute the entries of one day from its parcels; returns the number of parcels read."""
+    collection = db[LOOKUP_COLLECTION]
+    ensure_lookup_indexes(db)
+    # Searched in its own collection until the entries are back
+    db[LOOKUP_DAYS_COLLECTION].delete_one({"_id": date})
+    collection.delete_many({"date": date})
+
+    batch: List[Dict[str, Any]] = []
+    count = 0
+    for doc in db[date].find({}, LOOKUP_PROJECTION, batch_size=batch_size):
+        batch.extend(entries(date, doc))
+        count += 1
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    db[LOOKUP_DAYS_COLLECTION].insert_one({"_id": date, "built_at": datetime.now(timezone.utc)})
+    return count
+
+
+async def _uncovered_days(db: AsyncDatabase, date: Optional[str]) -> List[str]:
+    """The days searched in their own collection: those without complete lookup entries."""
+    covered = set(await db[LOOKUP_DAYS_COLLECTION].distinct("_id"))
+    names = [date] if date is not None else await catalog.names_async(db)
+    return sorted(name for name in names if is_date_collection(name) and name not in covered)
+
+
+async def _scan_day(db: AsyncDatabase, day: str, search_by: str, value: str, limit: int,
+                    after: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The first `limit` matches of one day following `after`, from the day collection itself."""
+    pattern = wildcard(value) if search_by == "barcode" else None
+    field = pattern[0] if pattern else None
+    query = day_query(search_by, value)
+
+    if pattern is None:
+        # Exact values: the day's parcels in pid order, as in the lookup index
+        if after is not None:
+            if day > after["date"]:
+                return []
+            if day == after["date"]:
+                query = {"$and": [query, {"_id": {"$gt": after["pid"]}}]}
+        cursor = db[day].find(query, {"_id": 1}).sort("_id", ASCENDING).limit(limit)
+        return [{"date": day, "pid": doc["_id"]} async for doc in cursor]
+
+    # Wildcards are ordered by the matched barcode: keep the first `limit` of all matches
+    matches: List[Dict[str, Any]] = []
+    async for doc in db[day].find(query, LOOKUP_PROJECTION):
+        for entry in entries(day, doc):
+            if entry["k"] != search_by or not isinstance(entry.get(field), str) \
+                    or not entry[field].startswith(pattern[1]):
+                continue
+            match = {"date": day, "pid": entry["pid"], field: entry[field]}
+            if after is None or _is_following(match, after, field):
+                matches.append(match)
+        if len(matches) > 2 * limit:
+            matches = _in_order(matches, field)[:limit]
+    return _in_order(matches, field)[:limit]
+
+
+async def find_entries(db: AsyncDatabase, search_by: str, value: str, limit: int,
+                       after: Optional[Dict[str, Any]] = None,
+                       date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Up to `limit` {"date", "pid"} matches following `after` if given, optionally of one day.
+
+    Exact values come newest day first; barcode wildcards in index order
+    (matched value, then newest day first). Days without complete entries
+    are searched in their own collection.
+    """
+    pattern = wildcard(value) if search_by == "barcode" else None
+    field = pattern[0] if pattern else None
+
+    query: Dict[str, Any] = {"k": search_by}
+    if pattern:
+        query[field] = _starts_with(pattern[1])
+    else:
+        query["v"] = value
+    uncovered = await _uncovered_days(db, date)
+    if date is not None:
+        query["date"] = date
+    elif uncovered:
+        query["date"] = {"$nin": uncovered}
+    if after is not None:
+        query["$or"] = _following(after, field)
+
+    sort = [("date", DESCENDING), ("pid", ASCENDING)]
+    projection = {"_id": 0, "date": 1, "pid": 1}
+    if field:
+        sort.insert(0, (field, ASCENDING))
+        projection[field] = 1
+    matches = []
+    if date is None or not uncovered:
+        cursor = db[LOOKUP_COLLECTION].find(query, projection).sort(sort).limit(limit)
+        matches = await cursor.to_list(limit)
+
+    if not uncovered:
+        return matches
+    days = await asyncio.gather(*(_scan_day(db, day, search_by, value, limit, after) for day in uncovered))
+    for day in days:
+        matches.extend(day)
+    return _in_order(matches, field)[:limit]
+
+
+async def resolve(db: AsyncDatabase, matches: List[Dict[str, Any]],
+                  projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The parcels behind lookup matches, in match order, each tagged with its "date".
+
+    Matches whose parcel no longer exists are skipped, and a parcel matched
+    by several of its barcodes is returned once.
+    """
+    by_date: Dict[str, List[Any]] = defaultdict(list)
+    for match in matches:
+        by_date[match["date"]].append(match["pid"])
+
+    async def one_day(date: str, pids: List[Any]) -> List[Dict[str, Any]]:
+        return await db[date].find({"_id": {"$in": pids}}, projection).to_list(None)
+
+    found = {}
+    days = await asyncio.gather(*(one_day(date, pids) for date, pids in by_date.items()))
+    for date, docs in zip(by_date, days):
+        for doc in docs:
+            found[(date, doc["_id"])] = {**doc, "date": date}
+    docs = []
+    for match in matches:
+        doc = found.pop((match["date"], match["pid"]), None)
+        if doc is not None:
+            docs.append(doc)
+    return docs
@@ -0,0 +1,115 @@
+# app/services/result_cache.py
+"""In-process LRU caches for the KPI endpoint results and the parcel RAW logs.
+
+Closed (past) days never change, so their results are kept until evicted.
+Results for today (or any day still being written) expire after a short TTL
+and are dropped as soon as this process ingests new parcels for that day.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app import config as settings
+from app.utils.time_utils import is_closed_day
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "watermark")
+
+    def __init__(self, value: Any, size: int, expires_at: Optional[float], watermark: int):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.watermark = watermark
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, live_ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.live_ttl_seconds = live_ttl_seconds
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._watermarks: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Cached value for `key` (whose second item is the date), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expired = entry.expires_at is not None and time.monotonic() >= entry.expires_at
+                if expired or entry.watermark != self._watermarks.get(key[1], 0):
+                    self._drop(key)
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Tuple, value: Any):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        date = key[1]
+        expires_at = None if is_closed_day(date) else time.monotonic() + self.live_ttl_seconds
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, size, expires_at, self._watermarks.get(date, 0))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def bump_watermark(self, date: str):
+        """Mark every cached result for `date` as stale (called after writes to that day)."""
+        with self._lock:
+            self._watermarks[date] = self._watermarks.get(date, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "live_ttl_seconds": self.live_ttl_seconds,
+            }
+
+
+def cache_key(endpoint: str, payload, date: Optional[str] = None) -> Tuple:
+    """Key of one day's result; `date` overrides payload.date for the per-day parts of a range."""
+    return (endpoint, date or payload.date, payload.start_time, payload.end_time, payload.bin_size)
+
+
+result_cache = ResultCache(
+    max_bytes=int(settings.RESULT_CACHE_MAX_MB * 1024 * 1024),
+    live_ttl_seconds=settings.RESULT_CACHE_LIVE_TTL_SECONDS,
+)
+
+# Per-parcel RAW logs fetched when a journey row is expanded
+raw_cache = ResultCache(
+    max_bytes=int(settings.RAW_CACHE_MAX_MB * 1024 * 1024),
+    live_ttl_seconds=settings.RESULT_CACHE_LIVE_TTL_SECONDS,
+)
@@ -0,0 +1,310 @@
+# app/services/rollups.py
+"""Per-slot rollups of the /summary and /throughput counters.
+
+Each day gets a ``rollup_<date>`` collection with at most 2,880 documents,
+``_id`` being the half-minute slot of the day (``time_utils.ms_slot``), so
+that a window ending exactly on HH:MM:00,000 - included by the pipelines -
+adds up exactly:
+
+- ``reg.*``: facts of the parcels *registered* in that slot (summary KPIs);
+  ``reg.hosts`` holds their distinct hostIds, as total_parcels counts unique
+  hosts over the whole window
+- ``ev.*``: IN/OUT/overflow *events* that happened in that slot (throughput)
+
+Both are reductions of the `KpiEngine` per-parcel facts.
+
+The ingest path keeps them up to date incrementally, each closed day the
+sorter wrote is rolled up once (``app.services.day_close``) and
+``python manage.py rebuild-rollups`` recomputes them from the parcels.
+A ``{"_id": "meta"}`` document records the layout version and the overflow
+locations the rollup was built with; any other rollup is ignored until rebuilt.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+
+from app.database.catalog import catalog
+from app.services.kpi_engine import KpiEngine, ParcelFacts
+from app.services.normalization import normalized_parcels
+from app.services.summary_pipeline import SUMMARY_COUNTERS
+from app.utils.time_utils import MS_PER_MINUTE, ms_slot, window_slots
+
+ROLLUP_PREFIX = "rollup_"
+# Bump when the rollup documents change, so `manage.py rebuild-rollups` is needed
+ROLLUP_VERSION = 2
+
+# Only the fields the rollup reads (a parcel not normalized yet is read
+# again with its raw fields, see normalization.normalized_parcels)
+PARCEL_PROJECTION = {
+    "hostId": 1,
+    "registerTS_ms": 1,
+    "status": 1,
+    "sort_strategy": 1,
+    "barcode_error": 1,
+    "volume_data.real_volume": 1,
+    "msg_ids": 1,
+    "events.msg_id": 1,
+    "events.ts_ms": 1,
+    "events.sort_code": 1,
+    "events.verified_sort_status": 1,
+    "events.dereg_reason": 1,
+    "events.exit_location": 1,
+}
+
+THROUGHPUT_COUNTERS = ["in", "out", "overflow"]
+
+# Summary counters that are sums over parcels; total_parcels counts distinct hostIds
+REGISTERED_COUNTERS = [name for name in SUMMARY_COUNTERS if name != "total_parcels"]
+
+
+def rollup_name(date: str) -> str:
+    return f"{ROLLUP_PREFIX}{date}"
+
+
+def parcel_increments(facts: ParcelFacts) -> List[Tuple[int, str]]:
+    """The (slot, "reg.*" / "ev.*" counter) pairs one parcel adds 1 to."""
+    increments = [(ms_slot(ts_ms), "ev.in") for ts_ms in facts.in_ms]
+    if facts.out_ms is not None:
+        increments.append((ms_slot(facts.out_ms), "ev.out"))
+    if facts.overflow_ms is not None:
+        increments.append((ms_slot(facts.overflow_ms), "ev.overflow"))
+
+    if facts.register_ms is None:
+        return increments
+    slot = ms_slot(facts.register_ms)
+    for name, flag in (
+        ("reg.sorted", facts.sorted),
+        ("reg.in_system", facts.in_system),
+        ("reg.overflow", facts.overflow_case is not None),
+        ("reg.barcode_read", facts.barcode_read),
+        ("reg.volume_valid", facts.volume_valid),
+        ("reg.tracking_ok", facts.tracking_ok),
+        ("reg.in_count", facts.first_in_ms is not None),
+    ):
+        if flag:
+            increments.append((slot, name))
+    return increments
+
+
+class SlotRollup:
+    """Accumulates per-slot counter deltas for a batch of parcels."""
+
+    def __init__(self, overflow_locations: List[str]):
+        self.engine = KpiEngine(overflow_locations)
+        self.inc: Dict[int, Counter] = defaultdict(Counter)
+        self.hosts: Dict[int, set] = defaultdict(set)
+        self.min: Dict[int, int] = {}
+        self.max: Dict[int, int] = {}
+        # Registration slots a parcel was retracted from
+        self.retracted: Set[int] = set()
+
+    def add_parcel(self, doc: Dict[str, Any], sign: int = 1):
+        """Add (sign=1) or retract (sign=-1) one parcel's contribution."""
+        self.add_facts(self.engine.facts(doc), sign)
+
+    def add_facts(self, facts: ParcelFacts, sign: int = 1):
+        for slot, name in parcel_increments(facts):
+            self.inc[slot][name] += sign
+        if facts.register_ms is None:
+            return
+
+        slot = ms_slot(facts.register_ms)
+        if sign < 0:
+            # Whether its host and first IN time are still in the slot depends on
+            # the slot's other parcels: apply_writes recounts the slot instead
+            self.retracted.add(slot)
+            return
+        if facts.host_id is not None:
+            self.hosts[slot].add(facts.host_id)
+        if facts.first_in_ms is not None:
+            self.min[slot] = min(facts.first_in_ms, self.min.get(slot, facts.first_in_ms))
+            self.max[slot] = max(facts.first_in_ms, self.max.get(slot, facts.first_in_ms))
+
+    def _slots(self) -> List[int]:
+        return sorted(set(self.inc) | set(self.hosts) | set(self.min))
+
+    def registered(self, slot: int) -> Dict[str, Any]:
+        """The "reg" document of a slot, for parcels only ever added."""
+        reg: Dict[str, Any] = {
+            key.split(".")[1]: value for key, value in self.inc.get(slot, {}).items() if key.startswith("reg.")
+        }
+        reg["hosts"] = sorted(self.hosts.get(slot, ()), key=str)
+        if slot in self.min:
+            reg["in_min_ms"] = self.min[slot]
+            reg["in_max_ms"] = self.max[slot]
+        return reg
+
+    def updates(self) -> List[UpdateOne]:
+        """Updates folding the batch in; "reg" of the retracted slots is left to a recount."""
+        operations = []
+        for slot in self._slots():
+            update: Dict[str, Any] = {}
+            increments = {
+                k: v for k, v in self.inc.get(slot, {}).items()
+                if v and not (slot in self.retracted and k.startswith("reg."))
+            }
+            if increments:
+                update["$inc"] = increments
+            if slot not in self.retracted:
+                if self.hosts.get(slot):
+                    update["$addToSet"] = {"reg.hosts": {"$each": sorted(self.hosts[slot], key=str)}}
+                if slot in self.min:
+                    update["$min"] = {"reg.in_min_ms": self.min[slot]}
+                    update["$max"] = {"reg.in_max_ms": self.max[slot]}
+            if update:
+                operations.append(UpdateOne({"_id": slot}, update, upsert=True))
+        return operations
+
+    def documents(self) -> List[Dict[str, Any]]:
+        docs = []
+        for slot in self._slots():
+            ev = {key.split(".")[1]: value for key, value in self.inc.get(slot, {}).items() if key.startswith("ev.")}
+            docs.append({"_id": slot, "reg": self.registered(slot), "ev": ev})
+        return docs
+
+
+def _meta(overflow_locations: List[str]) -> Dict[str, Any]:
+    return {
+        "_id": "meta",
+        "version": ROLLUP_VERSION,
+        "overflow_locations": sorted(overflow_locations),
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+def _is_current(meta: Optional[Dict[str, Any]], overflow_locations: List[str]) -> bool:
+    return (
+        meta is not None
+        and meta.get("version") == ROLLUP_VERSION
+        and meta.get("overflow_locations") == sorted(overflow_locations)
+    )
+
+
+def available(db: Database, date: str, overflow_locations: List[str]) -> bool:
+    """True when a rollup for `date` exists, is of the current layout and matches the configured overflow locations."""
+    name = rollup_name(date)
+    if not catalog.exists(db, name):
+        return False
+    return _is_current(db[name].find_one({"_id": "meta"}, {"version": 1, "overflow_locations": 1}), overflow_locations)
+
+
+async def available_async(db: AsyncDatabase, date: str, overflow_locations: List[str]) -> bool:
+    name = rollup_name(date)
+    if not await catalog.exists_async(db, name):
+        return False
+    return _is_current(await db[name].find_one({"_id": "meta"}, {"version": 1, "overflow_locations": 1}), overflow_locations)
+
+
+def apply_writes(db: Database, date: str, old_docs: Dict[Any, Dict[str, Any]],
+                 new_docs: Iterable[Dict[str, Any]], overflow_locations: List[str]):
+    """Incrementally fold written parcels (minus their previous versions) into the rollup.
+
+    Counters are adjusted in place; the "reg" of a slot a previous version is
+    retracted from is recounted from the (already written) parcels, since its
+    distinct hosts and IN min/max cannot be taken back by a delta.
+    """
+    rollup = SlotRollup(overflow_locations)
+    for doc in new_docs:
+        previous = old_docs.get(doc.get("_id"))
+        if previous is not None:
+            rollup.add_parcel(previous, sign=-1)
+        rollup.add_parcel(doc)
+
+    collection = db[rollup_name(date)]
+    operations = rollup.updates() + _recount(db, date, rollup.retracted, overflow_locations)
+    operations.append(UpdateOne({"_id": "meta"}, {"$set": _meta(overflow_locations)}, upsert=True))
+    collection.bulk_write(operations, ordered=False)
+    catalog.add(collection.name)
+
+
+def _slot_query(slot: int) -> Dict[str, Any]:
+    minute_ms = slot // 2 * MS_PER_MINUTE
+    if slot % 2 == 0:
+        return {"registerTS_ms": minute_ms}
+    return {"registerTS_ms": {"$gt": minute_ms, "$lt": minute_ms + MS_PER_MINUTE}}
+
+
+def _recount(db: Database, date: str, slots: Set[int], overflow_locations: List[str]) -> List[UpdateOne]:
+    """Updates replacing the "reg" of `slots` with a recount of the parcels registered in them."""
+    if not slots:
+        return []
+    rollup = SlotRollup(overflow_locations)
+    # Parcels not normalized yet are only placed once normalized
+    query = {"$or": [_slot_query(slot) for slot in sorted(slots)] + [{"registerTS_ms": {"$exists": False}}]}
+    for doc in normalized_parcels(db[date], query, PARCEL_PROJECTION):
+        facts = rollup.engine.facts(doc)
+        if facts.register_ms is not None and ms_slot(facts.register_ms) in slots:
+            rollup.add_facts(facts)
+    return [UpdateOne({"_id": slot}, {"$set": {"reg": rollup.registered(slot)}}, upsert=True) for slot in sorted(slots)]
+
+
+def rebuild(db: Database, date: str, overflow_locations: List[str], batch_size: int = 5000) -> int:
+    """Recompute the rollup of one day from its parcels; returns the number of parcels read."""
+    rollup = SlotRollup(overflow_locations)
+    count = 0
+    for doc in normalized_parcels(db[date], {}, PARCEL_PROJECTION, batch_size):
+        rollup.add_parcel(doc)
+        count += 1
+
+    # Build aside and swap in, so readers never see a half-built rollup
+    staging = db[f"{rollup_name(date)}_staging"]
+    staging.drop()
+    staging.insert_many(rollup.documents() + [_meta(overflow_locations)])
+    staging.rename(rollup_name(date), dropTarget=True)
+    catalog.add(rollup_name(date))
+    return count
+
+
+def _window(db: AsyncDatabase, date: str, start_ms: int, end_ms: int, group: str):
+    # The slots of [start_ms, end_ms], the window of the pipelines
+    slots = window_slots(start_ms, end_ms)
+    return db[rollup_name(date)].find({"_id": {"$gte": slots.start, "$lt": slots.stop}}, {group: 1})
+
+
+async def summary_row(db: AsyncDatabase, date: str, start_ms: int, end_ms: int) -> Dict[str, Any]:
+    """Summary counters of the parcels registered in [start_ms, end_ms], in the shape of the summary pipeline row."""
+    row: Dict[str, Any] = {name: 0 for name in SUMMARY_COUNTERS}
+    row["in_min_ms"] = None
+    row["in_max_ms"] = None
+    hosts = set()
+    async for doc in _window(db, date, start_ms, end_ms, "reg"):
+        reg = doc.get("reg", {})
+        for name in REGISTERED_COUNTERS:
+            row[name] += reg.get(name, 0)
+        hosts.update(reg.get("hosts", ()))
+        if reg.get("in_min_ms") is not None:
+            if row["in_min_ms"] is None:
+                row["in_min_ms"], row["in_max_ms"] = reg["in_min_ms"], reg["in_max_ms"]
+            else:
+                row["in_min_ms"] = min(row["in_min_ms"], reg["in_min_ms"])
+                row["in_max_ms"] = max(row["in_max_ms"], reg["in_max_ms"])
+    row["total_parcels"] = len(hosts)
+    return row
+
+
+async def throughput_bins(db: AsyncDatabase, date: str, start_ms: int, end_ms: int, bin_size: int) -> Dict[str, Any]:
+    """Totals and per-bin IN/OUT counts for [start_ms, end_ms], like throughput_pipeline.compute_throughput."""
+    totals = {name: 0 for name in THROUGHPUT_COUNTERS}
+    bins: Dict[str, Dict[int, int]] = {"in": {}, "out": {}}
+    start_minute = start_ms // MS_PER_MINUTE
+    async for doc in _window(db, date, start_ms, end_ms, "ev"):
+        ev = doc.get("ev", {})
+        index = (doc["_id"] // 2 - start_minute) // bin_size
+        for name in THROUGHPUT_COUNTERS:
+            totals[name] += ev.get(name, 0)
+        for name in bins:
+            if ev.get(name):
+                bins[name][index] = bins[name].get(index, 0) + ev[name]
+    return {"totals": totals, "bins": bins}
+
+
+def previous_versions(db: Database, date: str, docs: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Stored versions of the parcels about to be rewritten, keyed by _id."""
+    ids = [doc["_id"] for doc in docs if "_id" in doc]
+    if not ids:
+        return {}
+    return {doc["_id"]: doc for doc in normalized_parcels(db[date], {"_id": {"$in": ids}}, PARCEL_PROJECTION)}
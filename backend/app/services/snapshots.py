@@ -0,0 +1,292 @@
+# app/services/snapshots.py
+"""Columnar snapshots of closed days.
+
+``python manage.py snapshot`` exports a day that no longer changes into two
+Arrow IPC files under ``SNAPSHOT_DIR/<date>/``:
+
+- ``parcels.arrow``: one row per parcel - registerTS_ms, the volume dimensions
+  and the parcel's `KpiEngine` facts, its hostId among them
+- ``events.arrow``: one row per event - its parcel's row, msg_id, ts_ms and
+  the raw fields parsed at ingest
+
+Timestamps are int64 milliseconds since midnight, -1 when missing. The files
+are memory-mapped, so /summary, /throughput and /volume answer for the day
+with NumPy scans and leave MongoDB alone. Like a rollup, a snapshot records
+the overflow locations it was built with and is ignored once they change;
+ingesting into the day deletes it.
+"""
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from pymongo.database import Database
+
+from app import config as settings
+from app.services.kpi_engine import KpiEngine
+from app.services.normalization import normalized_parcels
+from app.services.rollups import PARCEL_PROJECTION, THROUGHPUT_COUNTERS
+from app.services.volume_stats import as_number
+from app.utils.time_utils import bin_counts
+
+SNAPSHOT_VERSION = 3
+
+# The rollup's fields plus what /volume reads
+SNAPSHOT_PROJECTION = {
+    **PARCEL_PROJECTION,
+    "volume_data.height": 1,
+    "volume_data.width": 1,
+    "volume_data.length": 1,
+}
+
+VOLUME_DIMENSIONS = ["height", "width", "length"]
+
+# Summary counter -> boolean parcel column it counts (total_parcels counts distinct hosts)
+_SUMMARY_FLAGS = {
+    "sorted": "sorted",
+    "in_system": "in_system",
+    "overflow": "overflow",
+    "barcode_read": "barcode_read",
+    "volume_valid": "volume_valid",
+    "tracking_ok": "tracking_ok",
+}
+
+_EVENT_FIELDS = ["msg_id", "sort_code", "verified_sort_status", "dereg_reason", "exit_location"]
+
+
+def snapshot_dir(date: str) -> str:
+    return os.path.join(settings.SNAPSHOT_DIR, date)
+
+
+def _ms(value: Optional[int]) -> int:
+    return -1 if value is None else value
+
+
+def export(db: Database, date: str, overflow_locations: List[str], batch_size: int = 5000) -> int:
+    """Write the snapshot of one day from its parcels; returns the number of parcels read."""
+    engine = KpiEngine(overflow_locations)
+    parcels: Dict[str, list] = {name: [] for name in (
+        "register_ms", "host", *VOLUME_DIMENSIONS, *_SUMMARY_FLAGS.values(),
+        "first_in_ms", "out_ms", "overflow_ms",
+    )}
+    events: Dict[str, list] = {name: [] for name in ("parcel", "ts_ms", *_EVENT_FIELDS)}
+
+    row = 0
+    for row, doc in enumerate(normalized_parcels(db[date], {}, SNAPSHOT_PROJECTION, batch_size), start=1):
+        facts = engine.facts(doc)
+        volume = doc.get("volume_data") or {}
+        parcels["register_ms"].append(_ms(facts.register_ms))
+        for name in VOLUME_DIMENSIONS:
+            parcels[name].append(as_number(volume.get(name)))
+        parcels["host"].append(None if facts.host_id is None else str(facts.host_id))
+        parcels["sorted"].append(facts.sorted)
+        parcels["in_system"].append(facts.in_system)
+        parcels["overflow"].append(facts.overflow_case is not None)
+        parcels["barcode_read"].append(facts.barcode_read)
+        parcels["volume_valid"].append(facts.volume_valid)
+        parcels["tracking_ok"].append(facts.tracking_ok)
+        parcels["first_in_ms"].append(_ms(facts.first_in_ms))
+        parcels["out_ms"].append(_ms(facts.out_ms))
+        parcels["overflow_ms"].append(_ms(facts.overflow_ms))
+
+        for event in doc.get("events") or []:
+            events["parcel"].append(row - 1)
+            events["ts_ms"].append(_ms(event.get("ts_ms")))
+            for name in _EVENT_FIELDS:
+                value = event.get(name)
+                events[name].append(None if value is None else str(value))
+
+    metadata = {
+        "version": str(SNAPSHOT_VERSION),
+        "date": date,
+        "overflow_locations": json.dumps(sorted(overflow_locations)),
+    }
+    parcels_table = pa.table({
+        "register_ms": pa.array(parcels["register_ms"], pa.int64()),
+        "host": pa.array(parcels["host"], pa.string()).dictionary_encode(),
+        **{name: pa.array(parcels[name], pa.float64()) for name in VOLUME_DIMENSIONS},
+        **{name: pa.array(parcels[name], pa.bool_()) for name in _SUMMARY_FLAGS.values()},
+        **{name: pa.array(parcels[name], pa.int64()) for name in ("first_in_ms", "out_ms", "overflow_ms")},
+    }).replace_schema_metadata(metadata)
+    events_table = pa.table({
+        "parcel": pa.array(events["parcel"], pa.int32()),
+        "ts_ms": pa.array(events["ts_ms"], pa.int64()),
+        **{name: pa.array(events[name], pa.string()).dictionary_encode() for name in _EVENT_FIELDS},
+    }).replace_schema_metadata(metadata)
+
+    # Written aside and swapped in, so readers never map a half-written file
+    target = snapshot_dir(date)
+    staging = f"{target}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, table in (("parcels", parcels_table), ("events", events_table)):
+        with pa.OSFile(os.path.join(staging, f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    invalidate(date)
+    os.rename(staging, target)
+    return row
+
+
+class DaySnapshot:
+    """Memory-mapped tables of one day, with their columns as NumPy arrays."""
+
+    def __init__(self, parcels: pa.Table, events: pa.Table, stamp: Optional[tuple] = None):
+        self.parcels = parcels
+        self.events = events
+        # The files' identity when read, see _stamp
+        self.stamp = stamp
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @property
+    def overflow_locations(self) -> List[str]:
+        return json.loads(self.parcels.schema.metadata[b"overflow_locations"])
+
+    @property
+    def version(self) -> int:
+        return int(self.parcels.schema.metadata[b"version"])
+
+    def column(self, name: str) -> np.ndarray:
+        """A parcels column; nulls of the float columns come back as NaN."""
+        if name not in self._arrays:
+            self._arrays[name] = self.parcels.column(name).to_numpy()
+        return self._arrays[name]
+
+    def host_codes(self) -> np.ndarray:
+        """A code per parcel, equal for equal hostIds; -1 for none."""
+        if "host_codes" not in self._arrays:
+            hosts = self.parcels.column("host").combine_chunks()
+            self._arrays["host_codes"] = hosts.indices.fill_null(-1).to_numpy()
+        return self._arrays["host_codes"]
+
+    def in_ms(self) -> np.ndarray:
+        """ts_ms of every IN (msg_id 2) event."""
+        if "in_ms" not in self._arrays:
+            msg_ids = self.events.column("msg_id").combine_chunks()
+            codes = msg_ids.indices.to_numpy(zero_copy_only=False)
+            dictionary = msg_ids.dictionary.to_pylist()
+            is_in = codes == dictionary.index("2") if "2" in dictionary else np.zeros(len(codes), dtype=bool)
+            self._arrays["in_ms"] = self.events.column("ts_ms").to_numpy()[is_in]
+        return self._arrays["in_ms"]
+
+
+_loaded: "OrderedDict[str, DaySnapshot]" = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def _read(path: str) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _stamp(directory: str) -> Optional[tuple]:
+    """Inode and mtime of the day's files; None when there is no snapshot.
+
+    `export` swaps a new directory in and `invalidate` deletes it, maybe from
+    another process (manage.py, another worker), so a snapshot held in
+    `_loaded` is only used while its files are still the ones on disk.
+    """
+    try:
+        return tuple(
+            (stat.st_ino, stat.st_mtime_ns)
+            for stat in (os.stat(os.path.join(directory, f"{name}.arrow")) for name in ("parcels", "events"))
+        )
+    except FileNotFoundError:
+        return None
+
+
+def load(date: str, overflow_locations: List[str]) -> Optional[DaySnapshot]:
+    """The day's snapshot if there is a current one, else None."""
+    directory = snapshot_dir(date)
+    stamp = _stamp(directory)
+    with _loaded_lock:
+        snapshot = _loaded.get(date)
+        if snapshot is not None and snapshot.stamp != stamp:
+            del _loaded[date]
+            snapshot = None
+        elif snapshot is not None:
+            _loaded.move_to_end(date)
+
+    if snapshot is None:
+        if stamp is None:
+            return None
+        try:
+            snapshot = DaySnapshot(
+                _read(os.path.join(directory, "parcels.arrow")),
+                _read(os.path.join(directory, "events.arrow")),
+                stamp,
+            )
+        except FileNotFoundError:
+            # Deleted while being read
+            return None
+        if _stamp(directory) != stamp:
+            # Replaced while being read: the two tables may be of different exports
+            return None
+        with _loaded_lock:
+            _loaded[date] = snapshot
+            while len(_loaded) > settings.SNAPSHOT_OPEN_DAYS:
+                _loaded.popitem(last=False)
+
+    if snapshot.version != SNAPSHOT_VERSION or snapshot.overflow_locations != sorted(overflow_locations):
+        return None
+    return snapshot
+
+
+def invalidate(date: str):
+    """Forget and delete the snapshot of a day that has changed."""
+    with _loaded_lock:
+        _loaded.pop(date, None)
+    shutil.rmtree(snapshot_dir(date), ignore_errors=True)
+
+
+def _registered(snapshot: DaySnapshot, start_ms: int, end_ms: int) -> np.ndarray:
+    register_ms = snapshot.column("register_ms")
+    return (register_ms >= start_ms) & (register_ms <= end_ms)
+
+
+def summary_row(snapshot: DaySnapshot, start_ms: int, end_ms: int) -> Dict[str, Any]:
+    """Summary counters of the parcels registered in [start_ms, end_ms], like rollups.summary_row."""
+    window = _registered(snapshot, start_ms, end_ms)
+    row: Dict[str, Any] = {
+        name: int(np.count_nonzero(snapshot.column(flag)[window]))
+        for name, flag in _SUMMARY_FLAGS.items()
+    }
+    hosts = snapshot.host_codes()[window]
+    row["total_parcels"] = int(np.unique(hosts[hosts >= 0]).size)
+
+    first_in_ms = snapshot.column("first_in_ms")[window]
+    first_in_ms = first_in_ms[first_in_ms >= 0]
+    row["in_count"] = int(first_in_ms.size)
+    row["in_min_ms"] = int(first_in_ms.min()) if first_in_ms.size else None
+    row["in_max_ms"] = int(first_in_ms.max()) if first_in_ms.size else None
+    return row
+
+
+def throughput_bins(snapshot: DaySnapshot, start_ms: int, end_ms: int, bin_size: int) -> Dict[str, Any]:
+    """Totals and per-bin IN/OUT counts for [start_ms, end_ms], like rollups.throughput_bins."""
+    # An event at end_ms itself counts, in a bin of its own when end_ms starts one
+    counts = {
+        "in": bin_counts(snapshot.in_ms(), start_ms, end_ms + 1, bin_size),
+        "out": bin_counts(snapshot.column("out_ms"), start_ms, end_ms + 1, bin_size),
+        "overflow": bin_counts(snapshot.column("overflow_ms"), start_ms, end_ms + 1, bin_size),
+    }
+    return {
+        "totals": {name: int(counts[name].sum()) for name in THROUGHPUT_COUNTERS},
+        "bins": {
+            name: {index: int(count) for index, count in enumerate(counts[name]) if count}
+            for name in ("in", "out")
+        },
+    }
+
+
+def registered_dimensions(snapshot: DaySnapshot, start_ms: int, end_ms: int) -> Dict[str, np.ndarray]:
+    """Non-null height/width/length of the parcels registered in [start_ms, end_ms]."""
+    window = _registered(snapshot, start_ms, end_ms)
+    result = {}
+    for name in VOLUME_DIMENSIONS:
+        values = snapshot.column(name)[window]
+        result[name] = values[~np.isnan(values)]
+    return result
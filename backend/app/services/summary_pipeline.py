@@ -0,0 +1,164 @@
+# app/services/summary_pipeline.py
+"""Aggregation pipeline computing every /summary KPI inside MongoDB."""
+from typing import Any, Dict, Iterable, List
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.services.normalization import normalize_missing
+
+SUMMARY_COUNTERS = [
+    "total_parcels", "sorted", "in_system", "overflow",
+    "barcode_read", "volume_valid", "tracking_ok", "in_count",
+]
+
+
+def _any_event(condition: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$anyElementTrue": [{"$map": {"input": {"$ifNull": ["$events", []]}, "as": "e", "in": condition}}]}
+
+
+def _flag(condition: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$cond": [condition, 1, 0]}
+
+
+def build_summary_pipeline(start_ms: int, end_ms: int, overflow_locations: List[str],
+                           normalized: bool = False) -> List[Dict[str, Any]]:
+    """The single-row summary pipeline; `normalized` skips deriving fields the day is known to carry."""
+    window = {"$gte": start_ms, "$lte": end_ms}
+    msg_ids = {"$ifNull": ["$msg_ids", []]}
+    has_msg_2 = {"$in": ["2", msg_ids]}
+
+    verified_sort_999 = _any_event({"$and": [
+        {"$eq": ["$$e.msg_id", "6"]},
+        {"$eq": ["$$e.verified_sort_status", "999"]},
+    ]})
+    dereg_in_overflow_location = _any_event({"$and": [
+        {"$eq": ["$$e.msg_id", "7"]},
+        {"$in": ["$$e.exit_location", overflow_locations]},
+    ]})
+
+    # Time window filter on the precomputed (indexed) registration time;
+    # parcels the sorter wrote without it are normalized and filtered again
+    stages = [{"$match": {"registerTS_ms": window}}]
+    if not normalized:
+        stages = [
+            {"$match": {"$or": [{"registerTS_ms": window}, {"registerTS_ms": {"$exists": False}}]}},
+            normalize_missing(),
+            *stages,
+        ]
+
+    return [
+        *stages,
+        # One row of 0/1 facts per parcel
+        {"$project": {
+            "hostId": 1,
+            "sorted": _flag({"$and": [{"$eq": ["$status", "sorted"]}, {"$eq": ["$sort_strategy", "1"]}]}),
+            "in_system": _flag({"$and": [
+                has_msg_2,
+                {"$not": [{"$in": ["6", msg_ids]}]},
+                {"$not": [{"$in": ["7", msg_ids]}]},
+            ]}),
+            "overflow": _flag({"$or": [
+                {"$and": [verified_sort_999, has_msg_2]},
+                dereg_in_overflow_location,
+            ]}),
+            "barcode_read": _flag({"$eq": ["$barcode_error", False]}),
+            "volume_valid": _flag({"$and": [
+                {"$isNumber": "$volume_data.real_volume"},
+                {"$gt": ["$volume_data.real_volume", 0]},
+            ]}),
+            "tracking_ok": _flag({"$setIsSubset": [["2", "3", "6"], msg_ids]}),
+            # First parseable IN (msg_id 2) timestamp
+            "first_in_ms": {"$arrayElemAt": [
+                {"$filter": {
+                    "input": {"$map": {
+                        "input": {"$filter": {
+                            "input": {"$ifNull": ["$events", []]},
+                            "as": "e",
+                            "cond": {"$eq": ["$$e.msg_id", "2"]},
+                        }},
+                        "as": "e",
+                        "in": "$$e.ts_ms",
+                    }},
+                    "as": "ms",
+                    "cond": {"$ne": [{"$ifNull": ["$$ms", None]}, None]},
+                }},
+                0,
+            ]},
+        }},
+        # Collapse per hostId first so total_parcels counts unique hosts
+        {"$group": {
+            "_id": "$hostId",
+            "sorted": {"$sum": "$sorted"},
+            "in_system": {"$sum": "$in_system"},
+            "overflow": {"$sum": "$overflow"},
+            "barcode_read": {"$sum": "$barcode_read"},
+            "volume_valid": {"$sum": "$volume_valid"},
+            "tracking_ok": {"$sum": "$tracking_ok"},
+            "in_count": {"$sum": _flag({"$ne": [{"$ifNull": ["$first_in_ms", None]}, None]})},
+            "in_min_ms": {"$min": "$first_in_ms"},
+            "in_max_ms": {"$max": "$first_in_ms"},
+        }},
+        {"$group": {
+            "_id": None,
+            "total_parcels": {"$sum": _flag({"$and": [{"$ne": ["$_id", None]}, {"$ne": ["$_id", ""]}]})},
+            "sorted": {"$sum": "$sorted"},
+            "in_system": {"$sum": "$in_system"},
+            "overflow": {"$sum": "$overflow"},
+            "barcode_read": {"$sum": "$barcode_read"},
+            "volume_valid": {"$sum": "$volume_valid"},
+            "tracking_ok": {"$sum": "$tracking_ok"},
+            "in_count": {"$sum": "$in_count"},
+            "in_min_ms": {"$min": "$in_min_ms"},
+            "in_max_ms": {"$max": "$in_max_ms"},
+        }},
+    ]
+
+
+def _percent(part: int, total: int) -> float:
+    return round((part / total) * 100, 2) if total else 0.0
+
+
+def shape_summary(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a pipeline/rollup row (or a merge of several) into the /summary KPI fields."""
+    total_parcels = row.get("total_parcels", 0)
+
+    throughput_per_hour = 0.0
+    if row.get("in_count"):
+        active_ms = row.get("in_active_ms")
+        if active_ms is None:
+            active_ms = row["in_max_ms"] - row["in_min_ms"]
+        duration_hours = active_ms / 3_600_000
+        throughput_per_hour = round(row["in_count"] / duration_hours, 2) if duration_hours > 0 else 0.0
+
+    return {
+        "total_parcels": total_parcels,
+        "total_in_system": row.get("in_system", 0),
+        "sorted_parcels": row.get("sorted", 0),
+        "overflow": row.get("overflow", 0),
+        "barcode_read_ratio_percent": _percent(row.get("barcode_read", 0), total_parcels),
+        "volume_rate_percent": _percent(row.get("volume_valid", 0), total_parcels),
+        "throughput_avg_per_hour": throughput_per_hour,
+        "tracking_performance_percent": _percent(row.get("tracking_ok", 0), total_parcels),
+    }
+
+
+def merge_summary_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the rows of several days: counters add up, and the IN spans of
+    the days add up to the active time the hourly throughput is averaged over."""
+    merged: Dict[str, Any] = {name: 0 for name in SUMMARY_COUNTERS}
+    merged["in_active_ms"] = 0
+    for row in rows:
+        for name in SUMMARY_COUNTERS:
+            merged[name] += row.get(name, 0)
+        if row.get("in_count"):
+            merged["in_active_ms"] += row["in_max_ms"] - row["in_min_ms"]
+    return merged
+
+
+async def summary_row(collection: AsyncCollection, start_ms: int, end_ms: int,
+                      overflow_locations: List[str], normalized: bool = False) -> Dict[str, Any]:
+    """Run the pipeline; returns its single row, or {} when no parcel registered inside the window."""
+    pipeline = build_summary_pipeline(start_ms, end_ms, overflow_locations, normalized)
+    cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+    rows = await cursor.to_list()
+    return rows[0] if rows else {}
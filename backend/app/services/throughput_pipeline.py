@@ -0,0 +1,132 @@
+# app/services/throughput_pipeline.py
+"""Aggregation pipeline binning IN/OUT/overflow events for /throughput inside MongoDB.
+
+IN/OUT/overflow follow the per-parcel definitions of ``app.services.kpi_engine``.
+"""
+from typing import Any, Dict, List
+
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.services.normalization import normalize_missing
+from app.utils.time_utils import MS_PER_MINUTE
+
+
+def _where(items: Any, condition: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$filter": {"input": items, "as": "e", "cond": condition}}
+
+
+def _is_msg(msg_id: str) -> Dict[str, Any]:
+    return {"$eq": ["$$e.msg_id", msg_id]}
+
+
+def _marks(items: Any, kind: str) -> Dict[str, Any]:
+    return {"$map": {"input": items, "as": "e", "in": {"k": kind, "ms": "$$e.ts_ms"}}}
+
+
+def _first(items: Any, condition: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$arrayElemAt": [_where(items, condition), 0]}
+
+
+def _mark_if(first: Dict[str, Any], condition: Dict[str, Any], kind: str) -> Dict[str, Any]:
+    # [{k, ms}] when the parcel's `first` event exists, satisfies `condition`
+    # and lies inside the window; [] otherwise
+    return {"$let": {
+        "vars": {"first": first},
+        "in": {"$cond": [
+            {"$and": [
+                {"$ne": [{"$ifNull": ["$$first", None]}, None]},
+                condition,
+                {"$gte": ["$$first.ts_ms", "$$start_ms"]},
+                {"$lte": ["$$first.ts_ms", "$$end_ms"]},
+            ]},
+            [{"k": kind, "ms": "$$first.ts_ms"}],
+            [],
+        ]},
+    }}
+
+
+def build_throughput_pipeline(start_ms: int, end_ms: int, bin_size: int,
+                              overflow_locations: List[str], normalized: bool = False) -> List[Dict[str, Any]]:
+    # First verified sort report (msg_id 6) of the parcel that is either a
+    # regular sort (sort_code "1") or a failed sort (status "999")
+    out_candidate = _first("$events", {"$and": [
+        _is_msg("6"),
+        {"$ne": [{"$ifNull": ["$$e.verified_sort_status", None]}, None]},
+        {"$or": [{"$eq": ["$$e.sort_code", "1"]}, {"$eq": ["$$e.verified_sort_status", "999"]}]},
+    ]})
+    # First overflow event of the parcel: failed sort (999) of an inducted
+    # parcel (case 1) or deregistration at an overflow location (case 2)
+    overflow_candidate = _first("$events", {"$or": [
+        {"$and": [_is_msg("6"), "$has_msg_2", {"$eq": ["$$e.verified_sort_status", "999"]}]},
+        {"$and": [_is_msg("7"), {"$in": ["$$e.exit_location", overflow_locations]}]},
+    ]})
+
+    in_window = {"events": {"$elemMatch": {
+        "msg_id": {"$in": ["2", "6", "7"]},
+        "ts_ms": {"$gte": start_ms, "$lte": end_ms},
+    }}}
+    # Events the sorter appended without ts_ms are normalized, then filtered again
+    unnormalized = {"events": {"$elemMatch": {
+        "msg_id": {"$in": ["2", "6", "7"]},
+        "ts_ms": {"$exists": False},
+    }}}
+
+    stages = [{"$match": in_window}]
+    if not normalized:
+        stages = [{"$match": {"$or": [in_window, unnormalized]}}, normalize_missing(), *stages]
+
+    return [
+        *stages,
+        {"$project": {
+            "_id": 0,
+            "has_msg_2": {"$in": ["2", {"$ifNull": ["$msg_ids", []]}]},
+            # Deregistration (msg_id 7) with reason "2" turns a 999 sort into an OUT
+            "deregistered": {"$anyElementTrue": [{"$map": {
+                "input": "$events", "as": "e",
+                "in": {"$and": [_is_msg("7"), {"$eq": ["$$e.dereg_reason", "2"]}]},
+            }}]},
+            "events": 1,
+            "windowed_in": _where("$events", {"$and": [
+                _is_msg("2"),
+                {"$gte": ["$$e.ts_ms", start_ms]},
+                {"$lte": ["$$e.ts_ms", end_ms]},
+            ]}),
+        }},
+        {"$project": {"marks": {"$let": {
+            "vars": {"start_ms": start_ms, "end_ms": end_ms},
+            "in": {"$concatArrays": [
+                _marks("$windowed_in", "in"),
+                _mark_if(out_candidate, {"$or": [{"$eq": ["$$first.sort_code", "1"]}, "$deregistered"]}, "out"),
+                _mark_if(overflow_candidate, True, "overflow"),
+            ]},
+        }}}},
+        {"$unwind": "$marks"},
+        {"$group": {
+            "_id": {
+                "k": "$marks.k",
+                "bin": {"$floor": {"$divide": [
+                    {"$subtract": ["$marks.ms", start_ms]}, bin_size * MS_PER_MINUTE,
+                ]}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+async def compute_throughput(collection: AsyncCollection, start_ms: int, end_ms: int, bin_size: int,
+                             overflow_locations: List[str], normalized: bool = False) -> Dict[str, Any]:
+    """Return totals per kind ("in", "out", "overflow") and per-bin counts for IN/OUT.
+
+    `normalized`: the day is known to carry the normalized fields (see day_close).
+    """
+    pipeline = build_throughput_pipeline(start_ms, end_ms, bin_size, overflow_locations, normalized)
+    totals = {"in": 0, "out": 0, "overflow": 0}
+    bins: Dict[str, Dict[int, int]] = {"in": {}, "out": {}}
+
+    async for row in await collection.aggregate(pipeline, allowDiskUse=True):
+        kind, index = row["_id"]["k"], int(row["_id"]["bin"])
+        totals[kind] += row["count"]
+        if kind in bins:
+            bins[kind][index] = bins[kind].get(index, 0) + row["count"]
+
+    return {"totals": totals, "bins": bins}
@@ -0,0 +1,139 @@
+# app/services/volume_stats.py
+"""Mergeable summaries of the parcel dimensions behind /volume.
+
+One dimension of one day reduces, in a single NumPy pass, to a sketch:
+count, sum, sum of squares, min, max and the counts on a fixed grid of
+VOLUME_SKETCH_RESOLUTION_MM buckets. Sketches of several days merge by
+adding them up, and histograms of any bin width or count, and percentiles,
+are read back from the grid, so neither the cached partials nor the
+response grow with the number of distinct values.
+"""
+import math
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from app import config as settings
+
+PERCENTILES = [5, 50, 95]
+
+
+def as_number(value: Any) -> Optional[float]:
+    """A dimension as a float; None for missing or non-numeric values."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def sketch(values: Iterable[float]) -> Dict[str, Any]:
+    values = np.asarray(values, dtype=float)
+    if not values.size:
+        return {"count": 0}
+    buckets, counts = np.unique(
+        np.floor(values / settings.VOLUME_SKETCH_RESOLUTION_MM).astype(np.int64), return_counts=True
+    )
+    return {
+        "count": int(values.size),
+        "sum": float(values.sum()),
+        "sum_sq": float(np.square(values).sum()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "grid": dict(zip(buckets.tolist(), counts.tolist())),
+    }
+
+
+def merge(sketches: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {"count": 0}
+    for part in sketches:
+        if not part["count"]:
+            continue
+        if not merged["count"]:
+            merged = {**part, "grid": dict(part["grid"])}
+            continue
+        merged["count"] += part["count"]
+        merged["sum"] += part["sum"]
+        merged["sum_sq"] += part["sum_sq"]
+        merged["min"] = min(merged["min"], part["min"])
+        merged["max"] = max(merged["max"], part["max"])
+        for bucket, count in part["grid"].items():
+            merged["grid"][bucket] = merged["grid"].get(bucket, 0) + count
+    return merged
+
+
+def _grid_arrays(part: Dict[str, Any]):
+    buckets = np.array(sorted(part["grid"]), dtype=np.int64)
+    counts = np.array([part["grid"][bucket] for bucket in buckets.tolist()], dtype=np.int64)
+    return buckets * settings.VOLUME_SKETCH_RESOLUTION_MM, counts
+
+
+def _ranked(part: Dict[str, Any], edges: np.ndarray, cumulative: np.ndarray, rank: int) -> float:
+    """The rank-th smallest value (from 0): exact for the min and max, else its bucket's lower edge."""
+    if rank == 0:
+        return part["min"]
+    if rank == part["count"] - 1:
+        return part["max"]
+    index = int(np.searchsorted(cumulative, rank, side="right"))
+    return float(np.clip(edges[index], part["min"], part["max"]))
+
+
+def stats(part: Dict[str, Any]) -> Dict[str, Any]:
+    """count/min/max/mean/std_dev (exact) and p5/p50/p95 (to one grid bucket).
+
+    Percentiles interpolate between the two nearest ranks like NumPy's
+    default ("linear") method, so p95 of [1, 2, 3] is 2.9.
+    """
+    if not part["count"]:
+        return {"count": 0, "min": None, "max": None, "mean": 0, "std_dev": 0,
+                **{f"p{q}": None for q in PERCENTILES}}
+
+    count = part["count"]
+    mean = part["sum"] / count
+    result = {
+        "count": count,
+        "min": part["min"],
+        "max": part["max"],
+        "mean": round(mean, 2),
+        "std_dev": round(math.sqrt(max(part["sum_sq"] / count - mean * mean, 0.0)), 2),
+    }
+
+    edges, counts = _grid_arrays(part)
+    cumulative = np.cumsum(counts)
+    for q in PERCENTILES:
+        position = q / 100 * (count - 1)
+        low = math.floor(position)
+        below = _ranked(part, edges, cumulative, low)
+        above = _ranked(part, edges, cumulative, min(low + 1, count - 1))
+        result[f"p{q}"] = round(below + (position - low) * (above - below), 2)
+    return result
+
+
+def histogram(part: Dict[str, Any], bin_width: Optional[float] = None,
+              bin_count: Optional[int] = None) -> Dict[str, Any]:
+    """Fixed-width histogram {"start", "bin_width", "counts"} of at most VOLUME_MAX_BINS bins.
+
+    `bin_width` wins over `bin_count`; widths are rounded up to whole grid
+    buckets and widened when they would need more than VOLUME_MAX_BINS bins.
+    """
+    resolution = settings.VOLUME_SKETCH_RESOLUTION_MM
+    if not part["count"]:
+        return {"start": 0, "bin_width": bin_width or resolution, "counts": []}
+
+    span = part["max"] - part["min"]
+    if bin_width is None:
+        bin_width = span / min(bin_count or settings.VOLUME_DEFAULT_BINS, settings.VOLUME_MAX_BINS)
+    bin_width = max(bin_width, span / settings.VOLUME_MAX_BINS, resolution)
+    bin_width = math.ceil(round(bin_width / resolution, 9)) * resolution
+
+    start = math.floor(part["min"] / bin_width) * bin_width
+    # Aligning the start to the width can push the last value one bin further
+    while int((part["max"] - start) // bin_width) + 1 > settings.VOLUME_MAX_BINS:
+        bin_width += resolution
+        start = math.floor(part["min"] / bin_width) * bin_width
+    bins = int((part["max"] - start) // bin_width) + 1
+    edges, counts = _grid_arrays(part)
+    index = np.clip(np.floor_divide(edges - start, bin_width).astype(np.int64), 0, bins - 1)
+    return {
+        "start": round(start, 6),
+        "bin_width": round(bin_width, 6),
+        "counts": np.bincount(index, weights=counts, minlength=bins).astype(np.int64).tolist(),
+    }
@@ -0,0 +1,61 @@
+# app/utils/concurrency.py
+"""Per-endpoint-class concurrency limits for the async routes."""
+import asyncio
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import HTTPException
+
+from app import config as settings
+
+
+class EndpointLimiter:
+    """FastAPI dependency admitting at most `limit` requests of one class at a time.
+
+    Requests over the limit wait up to `queue_timeout` seconds for a slot and
+    then get a 503, so a burst of heavy scans cannot take the slots (and pool
+    connections) that cheap lookups need.
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        """Take a slot, or raise a 503 once `queue_timeout` has passed."""
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail=f"Too many concurrent {self.name} requests, retry shortly")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __call__(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected_total": self.rejected,
+        }
+
+
+kpi_limiter = EndpointLimiter("KPI", settings.KPI_MAX_CONCURRENCY, settings.CONCURRENCY_QUEUE_TIMEOUT_SECONDS)
+lookup_limiter = EndpointLimiter("lookup", settings.LOOKUP_MAX_CONCURRENCY, settings.CONCURRENCY_QUEUE_TIMEOUT_SECONDS)
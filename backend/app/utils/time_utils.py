@@ -0,0 +1,112 @@
+# app/utils/time_utils.py
+import re
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+MS_PER_MINUTE = 60_000
+
+# "HH:MM:SS,fff" (milliseconds optional), as written by the sorter logs
+_TS_PATTERN = re.compile(r"^\s*(\d{1,2}):(\d{1,2}):(\d{1,2})(?:,(\d{1,6}))?\s*$")
+
+# Layout of the common fixed-width form, for the vectorized parser
+_FIXED_WIDTH = len("HH:MM:SS,fff")
+_FIXED_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+_FIXED_SEPARATORS = {2: ":", 5: ":", 8: ","}
+_FIXED_WEIGHTS = np.array([
+    36_000_000, 3_600_000,  # hours
+    600_000, 60_000,        # minutes
+    10_000, 1_000,          # seconds
+    100, 10, 1,             # milliseconds
+], dtype=np.int64)
+
+
+def hhmm_to_ms(value: datetime) -> int:
+    """Milliseconds since midnight for a parsed "HH:MM" value."""
+    return (value.hour * 60 + value.minute) * MS_PER_MINUTE
+
+
+def ms_slot(ms: int) -> int:
+    """Half-minute slot of a timestamp: 2m is exactly HH:MM:00,000 of minute m, 2m + 1 the rest of that minute.
+
+    The KPI windows run from an HH:MM to an HH:MM inclusive (or to its last
+    millisecond), so per-slot partials add up to any window exactly.
+    """
+    return 2 * (ms // MS_PER_MINUTE) + (1 if ms % MS_PER_MINUTE else 0)
+
+
+def window_slots(start_ms: int, end_ms: int) -> range:
+    """The slots of [start_ms, end_ms], for a start on a minute and an end on a minute or just before one."""
+    return range(ms_slot(start_ms), ms_slot(end_ms) + 1)
+
+
+def parse_ts_ms(ts_str: Optional[str]) -> Optional[int]:
+    """Milliseconds since midnight for an "HH:MM:SS,fff" timestamp, None if unparseable."""
+    match = _TS_PATTERN.match(ts_str) if isinstance(ts_str, str) else None
+    if not match:
+        return None
+    hours, minutes, seconds, fraction = match.groups()
+    millis = int((fraction + "00")[:3]) if fraction else 0
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + millis
+
+
+def parse_ts_ms_array(values: Iterable[Optional[str]]) -> np.ndarray:
+    """Vectorized parse_ts_ms: int64 milliseconds since midnight, -1 where unparseable.
+
+    "HH:MM:SS,fff" values are parsed together as one matrix of code points;
+    the few in any other form accepted by parse_ts_ms fall back to it.
+    """
+    values = [value if isinstance(value, str) else "" for value in values]
+    result = np.full(len(values), -1, dtype=np.int64)
+    if not values:
+        return result
+
+    strings = np.array(values)
+    fixed = np.flatnonzero(np.char.str_len(strings) == _FIXED_WIDTH)
+    chars = strings[fixed].astype(f"U{_FIXED_WIDTH}").view(np.uint32).reshape(-1, _FIXED_WIDTH)
+    digits = chars[:, _FIXED_DIGITS].astype(np.int64) - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    for position, separator in _FIXED_SEPARATORS.items():
+        valid &= chars[:, position] == ord(separator)
+    result[fixed[valid]] = digits[valid] @ _FIXED_WEIGHTS
+
+    parsed = np.zeros(len(values), dtype=bool)
+    parsed[fixed[valid]] = True
+    for index in np.flatnonzero(~parsed):
+        ms = parse_ts_ms(values[index])
+        if ms is not None:
+            result[index] = ms
+    return result
+
+
+def bin_counts(ms: np.ndarray, start_ms: int, end_ms: int, bin_size: int) -> np.ndarray:
+    """Number of timestamps in each `bin_size`-minute bin of [start_ms, end_ms).
+
+    Bin i starts at start_ms + i * bin_size minutes; the last bin may be short.
+    """
+    width = bin_size * MS_PER_MINUTE
+    bins = -(-(end_ms - start_ms) // width)
+    inside = ms[(ms >= start_ms) & (ms < end_ms)]
+    return np.bincount(np.floor_divide(inside - start_ms, width), minlength=bins)
+
+
+def is_closed_day(day: str) -> bool:
+    """True for a "YYYY-MM-DD" day strictly before today; its collection no longer changes."""
+    try:
+        return datetime.strptime(day, "%Y-%m-%d").date() < date.today()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_time_window(start_time: str, end_time: str) -> Tuple[datetime, datetime]:
+    """Parse and validate the HH:MM window sent by the dashboard."""
+    try:
+        start = datetime.strptime(start_time, "%H:%M")
+        end = datetime.strptime(end_time, "%H:%M")
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Time format must be HH:MM")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+    return start, end
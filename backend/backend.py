@@ -1,11 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from app.database import db, indexes
+from app.database.catalog import catalog
+from app.services import day_close
 from app.routes import summary,volume, throughput  # Import your router module
-from app.routes import parcel_journey  
+from app.routes import parcel_journey, admin, live
+from app.services.live import live_feed
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled MongoClient per process for maintenance work, and one
+    # AsyncMongoClient on the event loop for the request path
+    db.connect()
+    db.connect_async()
+    indexes.ensure_all_indexes_in_background(db.get_db())
+    # ...and on each day collection the sorter creates from now on
+    catalog.on_new_dates(lambda names: indexes.ensure_all_indexes_in_background(db.get_db(), names))
+    # The sorter writes the days; closed ones are normalized here
+    stop_closing = day_close.start_in_background(db.get_db())
+    yield
+    stop_closing.set()
+    catalog.on_new_dates(None)
+    await live_feed.close()
+    await db.close_async()
+    db.close()
+
+
 app = FastAPI(
     title="Parcel KPI API",
     description="API to get parcel processing KPIs from MongoDB collections",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS for frontend (e.g., React, Streamlit)
@@ -17,14 +45,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses for clients that accept gzip (never the /live event stream)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
 # ✅ Root route to check if server is running
 @app.get("/")
 def root():
     print("🌐 Root URL '/' accessed")
-    return {"message": "🚀 FastAPI backend is running and ready!"}
+    return {
+        "message": "🚀 FastAPI backend is running and ready!",
+        "mongodb": db.health()
+    }
 
 # Register KPI summary route
 app.include_router(summary.router)
 app.include_router(volume.router)
 app.include_router(parcel_journey.router)
 app.include_router(throughput.router)
+app.include_router(live.router)
+app.include_router(admin.router)
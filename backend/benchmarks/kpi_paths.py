@@ -0,0 +1,200 @@
+"""Check that every precomputed KPI path returns the aggregation pipelines' numbers.
+
+Writes synthetic parcels for today into a scratch database - hostIds that
+repeat, registrations and events on exact minutes - then rewrites a third
+through ingest. For a set of windows it compares summary_pipeline /
+throughput_pipeline, the reference, with the per-slot rollup (kept by
+ingest, then rebuilt), the snapshot, a LiveDay and the incremental
+partials, which are read before the rest is written and follow it through
+the change stream (skipped without a replica set). The day is written
+twice: once by ingest alone, and once with half of the parcels written raw
+the way the sorter does. Exits non-zero on a mismatch.
+
+    python -m benchmarks.kpi_paths
+    python -m benchmarks.kpi_paths --parcels 50000 --windows 50
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import date
+
+from app import config as settings
+from app.config import config
+from app.database import db
+from app.services import incremental, ingest, rollups, snapshots, summary_pipeline, throughput_pipeline
+from app.services.live import LiveDay
+from app.services.summary_pipeline import SUMMARY_COUNTERS
+from app.utils.time_utils import MS_PER_MINUTE
+
+LOCATIONS = ["1001.0045.0040.B31", "1001.0043.0000.B71", "X.1"]
+
+
+def _ts(ms: int) -> str:
+    seconds, millis = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def _raw(fields: int, **values) -> str:
+    parts = ["x"] * fields
+    for index, value in values.items():
+        parts[int(index[1:])] = value
+    return "|".join(parts)
+
+
+def make_parcel(rnd: random.Random, parcel_id: int, count: int):
+    base = rnd.randrange(86_000_000)
+    if rnd.random() < 0.3:
+        base -= base % MS_PER_MINUTE
+    parcel = {
+        "_id": parcel_id,
+        "hostId": rnd.choice([f"H{rnd.randrange(count // 4 + 1)}"] * 18 + [None, ""]),
+        "registerTS": _ts(base) if rnd.random() < 0.95 else rnd.choice([None, "n/a"]),
+        "status": rnd.choice(["sorted", "unsorted"]),
+        "sort_strategy": rnd.choice(["1", "2"]),
+        "barcode_error": rnd.choice([True, False]),
+        "volume_data": {"real_volume": rnd.choice([0, 5.5, None])},
+        "events": [],
+    }
+    ts_ms = base
+    for msg_id in rnd.sample(["2", "2", "3", "5", "6", "7"], rnd.randint(0, 6)):
+        ts_ms = min(ts_ms + rnd.choice([MS_PER_MINUTE, rnd.randint(1_000, 300_000)]), 86_399_999)
+        event = {"msg_id": msg_id, "ts": _ts(ts_ms), "raw": _raw(5)}
+        if msg_id == "6":
+            event["sort_code"] = rnd.choice(["1", "2"])
+            event["raw"] = _raw(12, f10=rnd.choice(["999", "1"]))
+        elif msg_id == "7":
+            event["raw"] = _raw(12, f9=rnd.choice(["2", "1"]), f11=rnd.choice(LOCATIONS))
+        parcel["events"].append(event)
+    return parcel
+
+
+def make_windows(rnd: random.Random, count: int):
+    windows = [(0, 23 * 3_600_000 + 59 * MS_PER_MINUTE, 15)]
+    for _ in range(count - 1):
+        start, end = sorted(rnd.sample(range(24 * 60), 2))
+        windows.append((start * MS_PER_MINUTE, end * MS_PER_MINUTE, rnd.choice([1, 7, 15, 60])))
+    return windows
+
+
+def _summary(row):
+    # The pipeline has no row at all for an empty window
+    return {
+        **{name: row.get(name, 0) for name in SUMMARY_COUNTERS},
+        "in_min_ms": row.get("in_min_ms"),
+        "in_max_ms": row.get("in_max_ms"),
+    }
+
+
+async def _settled(partials: LiveDay, parcel_count: int, timeout: float = 30):
+    """Wait for the change stream to deliver the writes: every parcel, then a quiet second."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while partials.parcel_count != parcel_count and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(1)
+
+
+async def check_day(sync_db, async_db, today: str, parcels, rewrites, windows, sorter: bool) -> bool:
+    overflow_locations = config.get("overflow_locations", LOCATIONS)
+    sync_db[today].drop()
+    sync_db[rollups.rollup_name(today)].drop()
+    incremental._days.pop(today, None)
+
+    ingest.ingest_parcels(sync_db, today, parcels[::2])
+    partials = await incremental.day_partials(async_db, today, overflow_locations)
+    if sorter:
+        sync_db[today].insert_many(parcels[1::2])  # not normalized
+        rollups.rebuild(sync_db, today, overflow_locations)
+    else:
+        ingest.ingest_parcels(sync_db, today, parcels[1::2])
+    ingest.ingest_parcels(sync_db, today, rewrites)
+
+    collection = async_db[today]
+    live_day = LiveDay(today, overflow_locations)
+    await live_day.load(async_db)
+    if partials is not None:
+        await _settled(partials, live_day.parcel_count)
+    snapshots.export(sync_db, today, overflow_locations)
+    snapshot = snapshots.load(today, overflow_locations)
+
+    paths = {
+        "rollup (ingest)": (
+            lambda s, e: rollups.summary_row(async_db, today, s, e),
+            lambda s, e, b: rollups.throughput_bins(async_db, today, s, e, b),
+        ),
+        "snapshot": (
+            lambda s, e: snapshots.summary_row(snapshot, s, e),
+            lambda s, e, b: snapshots.throughput_bins(snapshot, s, e, b),
+        ),
+        "live day": (live_day.summary_row, live_day.throughput_bins),
+    }
+    ok = True
+    if partials is None:
+        print(f"{'incremental':<18} skipped: no change streams")
+    else:
+        paths["incremental"] = (partials.summary_row, partials.throughput_bins)
+
+    async def value(result):
+        return await result if asyncio.iscoroutine(result) else result
+
+    for rebuilt in (False, True):
+        if rebuilt:
+            rollups.rebuild(sync_db, today, overflow_locations)
+            paths = {"rollup (rebuilt)": paths["rollup (ingest)"]}
+        mismatches = {path: 0 for path in paths}
+        for start_ms, end_ms, bin_size in windows:
+            summary = _summary(await summary_pipeline.summary_row(collection, start_ms, end_ms, overflow_locations))
+            throughput = await throughput_pipeline.compute_throughput(
+                collection, start_ms, end_ms, bin_size, overflow_locations
+            )
+            for path, (summary_row, throughput_bins) in paths.items():
+                got_summary = _summary(await value(summary_row(start_ms, end_ms)))
+                got_throughput = await value(throughput_bins(start_ms, end_ms, bin_size))
+                if got_summary != summary or got_throughput != throughput:
+                    mismatches[path] += 1
+        for path, mismatched in mismatches.items():
+            ok &= not mismatched
+            print(f"{path:<18} {'OK' if not mismatched else f'{mismatched} of {len(windows)} windows differ'}")
+    snapshots.invalidate(today)
+    return ok
+
+
+async def run(count: int, window_count: int, seed: int) -> bool:
+    rnd = random.Random(seed)
+    today = date.today().isoformat()
+    name = f"{settings.MONGODB_DB}_kpi_paths_check"
+    sync_db = db.connect()[name]
+    async_db = db.connect_async()[name]
+    sync_db.client.drop_database(name)
+
+    parcels = [make_parcel(rnd, parcel_id, count) for parcel_id in range(count)]
+    rewrites = [make_parcel(rnd, parcel["_id"], count) for parcel in rnd.sample(parcels, count // 3)]
+    windows = make_windows(rnd, window_count)
+
+    ok = True
+    for sorter in (False, True):
+        print("Ingest and the sorter:" if sorter else "Ingest only:")
+        ok &= await check_day(sync_db, async_db, today, parcels, rewrites, windows, sorter)
+
+    sync_db.client.drop_database(name)
+    await db.close_async()
+    db.close()
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parcels", type=int, default=10_000)
+    parser.add_argument("--windows", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    ok = asyncio.run(run(args.parcels, args.windows, args.seed))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
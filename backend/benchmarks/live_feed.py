@@ -0,0 +1,167 @@
+"""Check and benchmark the live KPI feed against a local replica set.
+
+Writes synthetic parcels for today into a scratch database in batches
+(new parcels, then rewrites and deletes of earlier ones), follows the day
+with the live feed and, after each batch, checks that its /summary,
+/throughput and /volume sections equal what the routes compute from
+MongoDB. Prints how long the feed took to catch up with each batch and how
+long the routes' full recompute takes. Exits non-zero on a mismatch.
+
+Needs a replica set, e.g. the docker-compose MongoDB:
+    MONGODB_URI="mongodb://localhost:27017/?directConnection=true" python -m benchmarks.live_feed
+    python -m benchmarks.live_feed --batches 20 --batch-size 2000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date
+
+from app import config as settings
+from app.config import config
+from app.database import db
+from app.models.kpi_model import DateRequest
+from app.routes import live, summary, throughput, volume
+from app.services import ingest, rollups
+from app.services.live import live_feed
+from app.services.result_cache import result_cache
+
+WINDOWS = [("00:00", "23:59", 10), ("06:00", "14:30", 1), ("13:07", "13:45", 30)]
+LOCATIONS = ["1001.0045.0040.B31", "1001.0043.0000.B71", "X.1"]
+
+
+def _ts(ms: int) -> str:
+    seconds, millis = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def _raw(fields: int, **values) -> str:
+    parts = ["x"] * fields
+    for index, value in values.items():
+        parts[int(index[1:])] = value
+    return "|".join(parts)
+
+
+def make_parcel(rnd: random.Random, parcel_id: int):
+    base = rnd.randrange(86_000_000)
+    parcel = {
+        "_id": parcel_id,
+        "hostId": f"H{parcel_id // 3}" if rnd.random() < 0.95 else None,
+        "registerTS": _ts(base) if rnd.random() < 0.95 else None,
+        "status": rnd.choice(["sorted", "unsorted"]),
+        "sort_strategy": rnd.choice(["1", "2"]),
+        "barcode_error": rnd.choice([True, False]),
+        "volume_data": {
+            "real_volume": rnd.choice([0, 5.5, None]),
+            "height": rnd.randint(50, 900),
+            "width": rnd.randint(100, 700),
+            "length": rnd.randint(100, 1200),
+        },
+        "events": [],
+    }
+    ts_ms = base
+    for msg_id in rnd.sample(["2", "3", "5", "6", "7"], rnd.randint(0, 5)):
+        ts_ms = min(ts_ms + rnd.randint(1_000, 300_000), 86_399_999)
+        event = {"msg_id": msg_id, "ts": _ts(ts_ms), "raw": _raw(5)}
+        if msg_id == "6":
+            event["sort_code"] = rnd.choice(["1", "2"])
+            event["raw"] = _raw(12, f10=rnd.choice(["999", "1"]))
+        elif msg_id == "7":
+            event["raw"] = _raw(12, f9=rnd.choice(["2", "1"]), f11=rnd.choice(LOCATIONS))
+        parcel["events"].append(event)
+    return parcel
+
+
+async def _routes(async_db, payload):
+    result_cache.clear()
+    collection = async_db[payload.date]
+    return {
+        "summary": await summary._compute_summary(payload, collection),
+        "throughput": await throughput._compute_throughput(payload, collection),
+        "volume": volume._volume_response(await volume._compute_volume(payload, collection), payload),
+    }
+
+
+async def _caught_up(subscriber, timeout: float = 30):
+    """Wait until the feed has gone quiet after a batch."""
+    await asyncio.wait_for(subscriber.changed.wait(), timeout)
+    while True:
+        subscriber.take()
+        try:
+            await asyncio.wait_for(subscriber.changed.wait(), 0.5)
+        except asyncio.TimeoutError:
+            return
+
+
+async def run(batches: int, batch_size: int, seed: int) -> bool:
+    rnd = random.Random(seed)
+    today = date.today().isoformat()
+    name = f"{settings.MONGODB_DB}_live_check"
+    sync_db = db.connect()[name]
+    async_db = db.connect_async()[name]
+    sync_db.client.drop_database(name)
+    overflow_locations = config.get("overflow_locations", [])
+
+    payloads = [
+        DateRequest(date=today, start_time=start, end_time=end, bin_size=bin_size)
+        for start, end, bin_size in WINDOWS
+    ]
+    subscribers = [await live_feed.subscribe(async_db, today, overflow_locations) for _ in payloads]
+
+    ok = True
+    written = []
+    for batch in range(batches):
+        parcels = [make_parcel(rnd, len(written) + i) for i in range(batch_size)]
+        # From the second batch on, rewrite and delete a few earlier parcels too
+        rewrites = [make_parcel(rnd, parcel["_id"]) for parcel in rnd.sample(written, min(len(written), batch_size // 10))]
+        deleted = {parcel["_id"] for parcel in rnd.sample(written, min(len(written), batch_size // 50))}
+
+        began = time.perf_counter()
+        ingest.ingest_parcels(sync_db, today, parcels + rewrites)
+        if deleted:
+            sync_db[today].delete_many({"_id": {"$in": list(deleted)}})
+        written = [parcel for parcel in written if parcel["_id"] not in deleted] + parcels
+        await _caught_up(subscribers[0])
+        live_s = time.perf_counter() - began
+
+        # Deletes bypass the ingest path, so the rollup the routes read is rebuilt
+        rollups.rebuild(sync_db, today, overflow_locations)
+        for payload, subscriber in zip(payloads, subscribers):
+            window = live.parse_time_window(payload.start_time, payload.end_time)
+            pushed = live._live_sections(subscriber.day, payload, window, live.LIVE_SECTIONS)
+            started = time.perf_counter()
+            expected = await _routes(async_db, payload)
+            routes_s = time.perf_counter() - started
+            matches = pushed == expected
+            ok &= matches
+            print(
+                f"batch {batch + 1} {payload.start_time}-{payload.end_time}/{payload.bin_size}: "
+                f"{'OK' if matches else 'MISMATCH'}  feed caught up in {live_s * 1000:.0f} ms "
+                f"(incl. ingest), routes recompute {routes_s * 1000:.0f} ms"
+            )
+
+    for subscriber in subscribers:
+        live_feed.unsubscribe(subscriber)
+    await live_feed.close()
+    sync_db.client.drop_database(name)
+    await db.close_async()
+    db.close()
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    ok = asyncio.run(run(args.batches, args.batch_size, args.seed))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
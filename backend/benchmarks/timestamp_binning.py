@@ -0,0 +1,114 @@
+"""Benchmark: per-event timestamp parsing and binning vs the vectorized batch path.
+
+Compares, on the same synthetic "HH:MM:SS,fff" event timestamps:
+
+- ``strptime loop``: the original /throughput code (``datetime.strptime`` +
+  ``.replace(year=...)`` + ``strftime("%H:%M")`` label lookup per event)
+- ``regex loop``: ``parse_ts_ms`` per event with integer binning
+- ``vectorized``: ``parse_ts_ms_array`` + ``bin_counts``
+
+Run from the backend directory:
+    python -m benchmarks.timestamp_binning
+    python -m benchmarks.timestamp_binning --events 200000 --bin-size 10
+"""
+import argparse
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from app.utils.time_utils import MS_PER_MINUTE, bin_counts, hhmm_to_ms, parse_ts_ms, parse_ts_ms_array
+
+
+def make_timestamps(count: int, seed: int = 0):
+    rnd = random.Random(seed)
+    stamps = []
+    for _ in range(count):
+        ms = rnd.randrange(24 * 3600 * 1000)
+        seconds, millis = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        stamps.append(f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}")
+    # A sprinkle of the messy values real logs contain
+    for index in rnd.sample(range(count), count // 1000):
+        stamps[index] = rnd.choice([None, "", "n/a", "9:05:01"])
+    return stamps
+
+
+def labels(start: datetime, end: datetime, bin_size: int):
+    result = []
+    current = start
+    while current < end:
+        result.append(current.strftime("%H:%M"))
+        current += timedelta(minutes=bin_size)
+    return result
+
+
+def strptime_loop(stamps, start: datetime, end: datetime, bin_size: int):
+    bins = OrderedDict((label, 0) for label in labels(start, end, bin_size))
+    for ts_str in stamps:
+        try:
+            ts = datetime.strptime(ts_str, "%H:%M:%S,%f").replace(
+                year=start.year, month=start.month, day=start.day
+            )
+        except (TypeError, ValueError):
+            continue
+        if start <= ts < end:
+            minutes_since_start = int((ts - start).total_seconds() // 60)
+            floored_minutes = (minutes_since_start // bin_size) * bin_size
+            bin_label = (start + timedelta(minutes=floored_minutes)).strftime("%H:%M")
+            if bin_label in bins:
+                bins[bin_label] += 1
+    return list(bins.values())
+
+
+def regex_loop(stamps, start_ms: int, end_ms: int, bin_size: int):
+    width = bin_size * MS_PER_MINUTE
+    counts = [0] * -(-(end_ms - start_ms) // width)
+    for ts_str in stamps:
+        ms = parse_ts_ms(ts_str)
+        if ms is not None and start_ms <= ms < end_ms:
+            counts[(ms - start_ms) // width] += 1
+    return counts
+
+
+def vectorized(stamps, start_ms: int, end_ms: int, bin_size: int):
+    return bin_counts(parse_ts_ms_array(stamps), start_ms, end_ms, bin_size).tolist()
+
+
+def timed(name: str, func, *args):
+    began = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - began
+    print(f"{name:<16} {elapsed:8.3f} s")
+    return result, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--bin-size", type=int, default=1, help="Bin width in minutes")
+    parser.add_argument("--start", default="00:00")
+    parser.add_argument("--end", default="23:59")
+    args = parser.parse_args(argv)
+
+    start = datetime.strptime(args.start, "%H:%M")
+    end = datetime.strptime(args.end, "%H:%M")
+    start_ms, end_ms = hhmm_to_ms(start), hhmm_to_ms(end)
+
+    stamps = make_timestamps(args.events)
+    print(f"{args.events:,} events, {args.bin_size}-minute bins, {args.start}-{args.end}")
+
+    baseline, baseline_s = timed("strptime loop", strptime_loop, stamps, start, end, args.bin_size)
+    by_regex, _ = timed("regex loop", regex_loop, stamps, start_ms, end_ms, args.bin_size)
+    by_numpy, numpy_s = timed("vectorized", vectorized, stamps, start_ms, end_ms, args.bin_size)
+
+    # strptime rejects the "9:05:01" form that parse_ts_ms accepts, so only
+    # the regex loop is expected to match exactly
+    assert by_numpy == by_regex, "vectorized bins differ from the per-event loop"
+    print(f"binned {sum(by_numpy):,} events (strptime loop: {sum(baseline):,})")
+    print(f"speed-up over the strptime loop: {baseline_s / numpy_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
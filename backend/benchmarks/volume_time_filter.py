@@ -0,0 +1,137 @@
+"""Regression check and benchmark for the /volume time-window filter.
+
+Runs, against a day collection of the configured MongoDB, for a few windows:
+
+- ``legacy``: the previous full ``find({})`` with the ``HH:MM`` string
+  comparison in Python (missing registerTS counted as "00:00")
+- ``reference``: the same full scan, keeping parcels whose parsed
+  ``registerTS`` falls in the window - the intended behaviour
+- ``route``: the current /volume computation (``registerTS_ms`` $match)
+
+and checks that the route's per-dimension count/min/max/mean/std match
+the reference, printing how many parcels the legacy filter got wrong and
+the latency of each. Exits non-zero on a mismatch.
+
+Run from the backend directory:
+    python -m benchmarks.volume_time_filter 2025-01-01
+    python -m benchmarks.volume_time_filter 2025-01-01 --window 00:00-23:59 --window 06:00-06:30
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.database import db
+from app.models.kpi_model import DateRequest
+from app.routes.volume import VOLUME_FIELDS, _compute_volume
+from app.services import volume_stats
+from app.services.snapshots import VOLUME_DIMENSIONS
+from app.utils.time_utils import MS_PER_MINUTE, hhmm_to_ms, parse_time_window, parse_ts_ms
+
+DEFAULT_WINDOWS = ["00:00-23:59", "00:00-06:00", "08:00-12:30", "13:07-13:08"]
+SCAN_FIELDS = {**VOLUME_FIELDS, "registerTS": 1}
+
+
+def _dimensions(parcels, keep):
+    values = {name: [] for name in VOLUME_DIMENSIONS}
+    for parcel in parcels:
+        if not keep(parcel):
+            continue
+        volume = parcel.get("volume_data", {})
+        for name in VOLUME_DIMENSIONS:
+            if (value := volume_stats.as_number(volume.get(name))) is not None:
+                values[name].append(value)
+    return {name: volume_stats.sketch(dimension) for name, dimension in values.items()}
+
+
+def legacy(collection, start_time: str, end_time: str):
+    def extract_hhmm(ts_str):
+        try:
+            return ts_str.split(",")[0][:5]
+        except Exception:
+            return "00:00"
+
+    parcels = collection.find({}, SCAN_FIELDS)
+    return _dimensions(parcels, lambda p: start_time <= extract_hhmm(p.get("registerTS", "00:00")) <= end_time)
+
+
+def reference(collection, start_time: str, end_time: str):
+    start, end = parse_time_window(start_time, end_time)
+    start_ms, end_ms = hhmm_to_ms(start), hhmm_to_ms(end) + MS_PER_MINUTE
+
+    def keep(parcel):
+        ms = parse_ts_ms(parcel.get("registerTS"))
+        return ms is not None and start_ms <= ms < end_ms
+
+    return _dimensions(collection.find({}, SCAN_FIELDS), keep)
+
+
+def _summary(partial):
+    return {name: volume_stats.stats(partial[name]) for name in VOLUME_DIMENSIONS}
+
+
+def _timed(func, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+async def run(date: str, windows, repeat: int) -> bool:
+    db.connect()
+    db.connect_async()
+    collection = db.get_db()[date]
+    async_collection = db.get_async_db()[date]
+    loop = asyncio.get_running_loop()
+    ok = True
+
+    for window in windows:
+        start_time, end_time = window.split("-")
+        old, old_s = _timed(lambda: legacy(collection, start_time, end_time), repeat)
+        expected, _ = _timed(lambda: reference(collection, start_time, end_time), 1)
+
+        payload = DateRequest(date=date, start_time=start_time, end_time=end_time)
+        new_s = None
+        for _ in range(repeat):
+            began = loop.time()
+            new = await _compute_volume(payload, async_collection)
+            elapsed = loop.time() - began
+            new_s = elapsed if new_s is None else min(new_s, elapsed)
+
+        if "message" in new:
+            print(f"{window}: {new['message']}")
+            continue
+        matches = _summary(new) == _summary(expected)
+        ok &= matches
+        wrongly_counted = old["length"]["count"] - expected["length"]["count"]
+        print(
+            f"{window}: {'OK' if matches else 'MISMATCH'}  "
+            f"parcels with a length: {expected['length']['count']} "
+            f"(legacy filter: {old['length']['count']}, off by {wrongly_counted})  "
+            f"legacy {old_s * 1000:.1f} ms, route {new_s * 1000:.1f} ms"
+        )
+        if not matches:
+            print(f"  route:     {_summary(new)}")
+            print(f"  reference: {_summary(expected)}")
+
+    await db.close_async()
+    db.close()
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("date", help="Date collection (YYYY-MM-DD)")
+    parser.add_argument("--window", action="append", help="HH:MM-HH:MM, repeatable")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timing (best is shown)")
+    args = parser.parse_args(argv)
+
+    ok = asyncio.run(run(args.date, args.window or DEFAULT_WINDOWS, args.repeat))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Maintenance commands for the parcel KPI backend.
+
+Examples:
+    python manage.py backfill --all
+    python manage.py backfill 2025-01-01 2025-01-02
+    python manage.py ensure-indexes --all
+    python manage.py rebuild-rollups 2025-01-01
+    python manage.py rebuild-lookup --all
+    python manage.py snapshot --all
+    python manage.py close-days
+"""
+import argparse
+
+from app.config import config
+from app.database import db, indexes
+from app.services import day_close, ingest, parcel_lookup, rollups, snapshots
+from app.utils.time_utils import is_closed_day
+
+
+def _add_date_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("dates", nargs="*", help="Date collections (YYYY-MM-DD)")
+    parser.add_argument("--all", action="store_true", help="Run for every date collection")
+
+
+def _selected_dates(args, database):
+    if args.all:
+        return db.date_collection_names(database)
+    if not args.dates:
+        raise SystemExit("Give one or more dates or --all")
+    return args.dates
+
+
+def cmd_backfill(args):
+    database = db.get_db()
+    for date in _selected_dates(args, database):
+        modified = ingest.backfill_collection(database[date])
+        print(f"{date}: normalized {modified} parcels")
+
+
+def cmd_ensure_indexes(args):
+    database = db.get_db()
+    for date in _selected_dates(args, database):
+        created = indexes.ensure_indexes(database[date])
+        print(f"{date}: indexes ready ({', '.join(created) or 'nothing new'})")
+    created = parcel_lookup.ensure_lookup_indexes(database)
+    print(f"{parcel_lookup.LOOKUP_COLLECTION}: indexes ready ({', '.join(created) or 'nothing new'})")
+
+
+def cmd_rebuild_rollups(args):
+    database = db.get_db()
+    overflow_locations = config.get("overflow_locations", [])
+    for date in _selected_dates(args, database):
+        count = rollups.rebuild(database, date, overflow_locations)
+        print(f"{date}: rolled up {count} parcels")
+
+
+def cmd_rebuild_lookup(args):
+    database = db.get_db()
+    for date in _selected_dates(args, database):
+        count = parcel_lookup.rebuild(database, date)
+        print(f"{date}: indexed {count} parcels for cross-day search")
+
+
+def cmd_snapshot(args):
+    database = db.get_db()
+    overflow_locations = config.get("overflow_locations", [])
+    for date in _selected_dates(args, database):
+        if not is_closed_day(date):
+            print(f"{date}: skipped, only closed days are snapshotted")
+            continue
+        count = snapshots.export(database, date, overflow_locations)
+        print(f"{date}: wrote a snapshot of {count} parcels")
+
+
+def cmd_close_days(args):
+    database = db.get_db()
+    dates = args.dates or day_close.pending_days(database)
+    for date in dates:
+        if not day_close.is_due(date):
+            print(f"{date}: skipped, the day has not closed yet")
+            continue
+        ran = day_close.close_day(database, date)
+        print(f"{date}: {', '.join(ran) or 'nothing to do (or closing in another process)'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parcel KPI backend maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill", help="Write normalized fields onto existing parcels")
+    _add_date_arguments(backfill)
+    backfill.set_defaults(func=cmd_backfill)
+
+    ensure = commands.add_parser("ensure-indexes", help="Create the lookup and time-window indexes")
+    _add_date_arguments(ensure)
+    ensure.set_defaults(func=cmd_ensure_indexes)
+
+    rebuild = commands.add_parser("rebuild-rollups", help="Recompute the per-minute KPI rollups")
+    _add_date_arguments(rebuild)
+    rebuild.set_defaults(func=cmd_rebuild_rollups)
+
+    lookup = commands.add_parser("rebuild-lookup", help="Recompute the cross-day parcel lookup entries")
+    _add_date_arguments(lookup)
+    lookup.set_defaults(func=cmd_rebuild_lookup)
+
+    snapshot = commands.add_parser("snapshot", help="Export closed days to memory-mapped columnar files")
+    _add_date_arguments(snapshot)
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    close = commands.add_parser("close-days", help="Run the day-close steps on closed days (default: all pending)")
+    close.add_argument("dates", nargs="*", help="Date collections (YYYY-MM-DD)")
+    close.set_defaults(func=cmd_close_days)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Fixtures shared by the backend tests.
+
+MongoDB is stood in for by mongomock; `AsyncDatabase` wraps the same
+in-memory database in the subset of the pymongo async API the services use.
+"""
+import functools
+
+import mongomock
+import pytest
+from mongomock.collection import BulkOperationBuilder
+
+from app import config as settings
+from app.database.catalog import catalog
+
+
+def _without_sort(add):
+    # pymongo 4.11+ passes a `sort` to bulk replace/update operations that mongomock does not take
+    @functools.wraps(add)
+    def wrapper(self, *args, sort=None, **kwargs):
+        return add(self, *args, **kwargs)
+    return wrapper
+
+
+BulkOperationBuilder.add_replace = _without_sort(BulkOperationBuilder.add_replace)
+BulkOperationBuilder.add_update = _without_sort(BulkOperationBuilder.add_update)
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._iterator = None
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+    async def close(self):
+        self._cursor.close()
+
+    def __aiter__(self):
+        self._iterator = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    def __init__(self, collection, database):
+        self._collection = collection
+        self.database = database
+        self.name = collection.name
+
+    def find(self, *args, batch_size=None, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return self._collection.distinct(*args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return self._collection.count_documents(*args, **kwargs)
+
+    async def estimated_document_count(self):
+        return self._collection.estimated_document_count()
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self.sync = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.sync[name], self)
+
+    async def list_collection_names(self, *args, **kwargs):
+        return self.sync.list_collection_names()
+
+
+@pytest.fixture
+def db():
+    catalog.invalidate()  # the names of another test's database
+    return mongomock.MongoClient()["test"]
+
+
+@pytest.fixture
+def async_db(db):
+    return AsyncDatabase(db)
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "snapshots"
+    monkeypatch.setattr(settings, "SNAPSHOT_DIR", str(directory))
+    return directory
@@ -0,0 +1,68 @@
+"""Synthetic parcels in the shape the sorter writes them (raw fields only)."""
+import random
+from typing import Any, Dict, List
+
+OVERFLOW_LOCATIONS = ["1001.0045.0040.B31", "1001.0043.0000.B71"]
+_EXIT_LOCATIONS = OVERFLOW_LOCATIONS + ["1001.0001.0000.A01"]
+
+
+def ts(ms: int) -> str:
+    """"HH:MM:SS,fff" for milliseconds since midnight."""
+    hours, rest = divmod(ms, 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def raw(length: int, **fields: str) -> str:
+    """A pipe separated raw message of `length` fields, e.g. raw(12, f9="2")."""
+    parts = ["x"] * length
+    for name, value in fields.items():
+        if int(name[1:]) < length:
+            parts[int(name[1:])] = value
+    return "|".join(parts)
+
+
+def make_parcels(count: int = 400, seed: int = 1) -> List[Dict[str, Any]]:
+    """Raw parcels exercising the edge cases of the KPI definitions.
+
+    hostIds repeat (and are sometimes missing or empty), timestamps often fall
+    on an exact minute, some registerTS are missing or malformed, and
+    verified sort reports come with short raw messages.
+    """
+    rnd = random.Random(seed)
+    parcels = []
+    for parcel_id in range(count):
+        register_ms = rnd.randint(0, 86_000_000)
+        if rnd.random() < 0.3:
+            register_ms -= register_ms % 60_000
+        register_ts = rnd.choices([ts(register_ms), None, "garbage", ts(register_ms)[:5]], [90, 4, 3, 3])[0]
+        parcel = {
+            "_id": parcel_id,
+            "hostId": rnd.choices([f"H{rnd.randint(0, count // 4)}", None, ""], [90, 5, 5])[0],
+            "registerTS": register_ts,
+            "status": rnd.choice(["sorted", "unknown"]),
+            "sort_strategy": rnd.choice(["1", "2"]),
+            "barcode_error": rnd.choice([True, False, None]),
+            "volume_data": {
+                "real_volume": rnd.choice([0, 5, 3.2, None, "n/a"]),
+                "height": rnd.choice([rnd.randint(50, 90), None, "n/a"]),
+                "width": rnd.randint(100, 700),
+                "length": rnd.randint(100, 900),
+            },
+            "events": [],
+        }
+        event_ms = register_ms
+        for msg_id in rnd.sample(["2", "2", "3", "5", "6", "7"], rnd.randint(0, 6)):
+            event_ms = min(event_ms + rnd.choice([60_000, rnd.randint(1000, 300_000)]), 86_399_999)
+            event = {"msg_id": msg_id, "ts": ts(event_ms) if rnd.random() < 0.97 else None}
+            if msg_id == "6":
+                event["sort_code"] = rnd.choice(["1", "2"])
+                event["raw"] = raw(rnd.choice([9, 12]), f10=rnd.choice(["999", "1"]))
+            elif msg_id == "7":
+                event["raw"] = raw(12, f9=rnd.choice(["2", "1"]), f11=rnd.choice(_EXIT_LOCATIONS))
+            else:
+                event["raw"] = raw(5)
+            parcel["events"].append(event)
+        parcels.append(parcel)
+    return parcels
@@ -0,0 +1,71 @@
+"""Change streams for the tests: what a replica set's watch() would yield, put there by the test."""
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class FakeStream:
+    """A change stream yielding what the test puts in `changes` (an exception ends it)."""
+
+    def __init__(self):
+        self.changes = asyncio.Queue()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        change = await self.changes.get()
+        if isinstance(change, Exception):
+            raise change
+        return change
+
+
+class FakeAdmin:
+    def __init__(self, hello):
+        self.hello = hello
+
+    async def command(self, name):
+        return self.hello
+
+
+class FakeClient:
+    def __init__(self, hello):
+        self.admin = FakeAdmin(hello)
+
+
+class WatchedDb:
+    """The async test database plus watch(), which yields to the loop like a server round trip."""
+
+    def __init__(self, async_db, hello=None):
+        self.async_db = async_db
+        self.client = FakeClient(hello if hello is not None else {"setName": "rs0"})
+        self.streams = []
+
+    def __getitem__(self, name):
+        return self.async_db[name]
+
+    async def watch(self, pipeline, **kwargs):
+        for _ in range(3):
+            await asyncio.sleep(0)
+        self.streams.append(FakeStream())
+        return self.streams[-1]
+
+
+def change(date: str, doc: Optional[Dict[str, Any]], parcel_id: Any = None) -> Dict[str, Any]:
+    """The change event of `doc` written to `date` (deleted if None, then give its `parcel_id`)."""
+    if doc is None:
+        return {"operationType": "delete", "ns": {"coll": date}, "documentKey": {"_id": parcel_id}}
+    return {"operationType": "replace", "ns": {"coll": date}, "documentKey": {"_id": doc["_id"]}, "fullDocument": doc}
+
+
+async def until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("timed out")
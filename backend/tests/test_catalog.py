@@ -0,0 +1,17 @@
+"""Unknown dates are checked against the server before being refused."""
+import asyncio
+
+from app.database.catalog import CollectionCatalog
+
+DATE = "2024-01-02"
+
+
+def test_a_day_created_after_the_last_load_is_found(db, async_db):
+    catalog = CollectionCatalog(ttl_seconds=3600)
+    assert not catalog.exists(db, DATE)
+
+    db[DATE].insert_one({"_id": 1})
+    assert catalog.exists(db, DATE)
+    db["2024-01-03"].insert_one({"_id": 1})
+    assert asyncio.run(catalog.exists_async(async_db, "2024-01-03"))
+    assert not asyncio.run(catalog.exists_async(async_db, "2024-01-04"))
@@ -0,0 +1,110 @@
+"""Closing the days the sorter wrote: each step once per day, by one process."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from parcels import OVERFLOW_LOCATIONS, make_parcels
+
+from app import config as settings
+from app.services import day_close, rollups
+
+DATE = "2024-01-02"
+
+
+class _Ran(list):
+    failing: set
+
+
+@pytest.fixture
+def ran(monkeypatch):
+    """Steps recording the days they ran on (the real ones need a MongoDB server)."""
+    ran = _Ran()
+    failing = set()
+
+    def step(name):
+        def run(db, date):
+            if name in failing:
+                raise RuntimeError(f"{name} failed")
+            ran.append((name, date))
+        return name, run
+
+    monkeypatch.setattr(day_close, "STEPS", [step("normalize-1"), step("rollup-1")])
+    monkeypatch.setattr(day_close, "_done", set())
+    ran.failing = failing
+    return ran
+
+
+@pytest.fixture
+def days(db):
+    db[DATE].insert_one({"_id": 1})
+    db[datetime.now().strftime("%Y-%m-%d")].insert_one({"_id": 1})
+    return db
+
+
+def test_due_once_the_delay_has_passed(monkeypatch):
+    monkeypatch.setattr(day_close.settings, "DAY_CLOSE_DELAY_SECONDS", 3600)
+    assert not day_close.is_due(DATE, datetime(2024, 1, 3, 0, 59))
+    assert day_close.is_due(DATE, datetime(2024, 1, 3, 1, 0))
+    assert not day_close.is_due("parcel_lookup")
+
+
+def test_each_step_runs_once_per_closed_day(days, ran):
+    assert day_close.pending_days(days) == [DATE]
+    assert day_close.close_pending(days) == [DATE]
+    assert ran == [("normalize-1", DATE), ("rollup-1", DATE)]
+
+    record = days[day_close.CLOSED_DAYS_COLLECTION].find_one({"_id": DATE})
+    assert record["steps"] == ["normalize-1", "rollup-1"] and "leased_until" not in record
+    assert day_close.pending_days(days) == []
+    assert day_close.close_day(days, DATE) == []
+
+
+def test_a_failed_step_is_retried_alone(days, ran):
+    ran.failing.add("rollup-1")
+    assert day_close.close_pending(days) == []
+    assert day_close.pending_days(days) == [DATE]
+
+    ran.failing.clear()
+    assert day_close.close_pending(days) == [DATE]
+    assert ran == [("normalize-1", DATE), ("rollup-1", DATE)]
+
+
+def test_a_new_step_runs_on_days_already_closed(days, ran, monkeypatch):
+    day_close.close_pending(days)
+    extra = ("extra-1", lambda db, date: ran.append(("extra-1", date)))
+    monkeypatch.setattr(day_close, "STEPS", day_close.STEPS + [extra])
+    assert day_close.close_pending(days) == [DATE]
+    assert ran[-1] == ("extra-1", DATE)
+
+
+def test_a_day_leased_to_another_process_is_left_alone(days, ran):
+    leased_until = datetime.now(timezone.utc) + timedelta(minutes=5)
+    days[day_close.CLOSED_DAYS_COLLECTION].insert_one({"_id": DATE, "leased_until": leased_until})
+    assert day_close.close_day(days, DATE) == []
+
+    days[day_close.CLOSED_DAYS_COLLECTION].update_one(
+        {"_id": DATE}, {"$set": {"leased_until": datetime.now(timezone.utc) - timedelta(minutes=1)}}
+    )
+    assert day_close.close_day(days, DATE) == ["normalize-1", "rollup-1"]
+
+
+def test_requests_see_the_steps_done(days, async_db, ran):
+    assert not asyncio.run(day_close.has_step_async(async_db, DATE, "normalize-1"))
+
+    day_close.close_day(days, DATE)
+    assert asyncio.run(day_close.has_step_async(async_db, DATE, "normalize-1"))
+    days[day_close.CLOSED_DAYS_COLLECTION].drop()
+    # Closed days stay closed: no round trip once known
+    assert asyncio.run(day_close.has_step_async(async_db, DATE, "normalize-1"))
+
+
+def test_closed_days_are_rolled_up(db, monkeypatch):
+    # The normalize step is an update pipeline mongomock cannot run; the rollup reads raw fields too
+    monkeypatch.setattr(day_close, "STEPS", [step for step in day_close.STEPS if step[0] == day_close.ROLLUP_STEP])
+    monkeypatch.setitem(settings.config, "overflow_locations", OVERFLOW_LOCATIONS)
+    db[DATE].insert_many(make_parcels(200))
+    assert not rollups.available(db, DATE, OVERFLOW_LOCATIONS)
+
+    assert day_close.close_pending(db) == [DATE]
+    assert rollups.available(db, DATE, OVERFLOW_LOCATIONS)
+    assert db[rollups.rollup_name(DATE)].count_documents({"_id": {"$ne": "meta"}}) > 0
@@ -0,0 +1,116 @@
+"""Today's incremental partials follow the change stream, whoever writes the day."""
+import asyncio
+from datetime import date
+
+import pytest
+from parcels import OVERFLOW_LOCATIONS, make_parcels, ts
+from streams import WatchedDb, change, until
+
+from app import config as settings
+from app.services import incremental
+from app.services.live import LiveDay, LiveFeed
+
+WHOLE_DAY = (0, 86_399_999)
+
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(incremental, "_days", {})
+    return date.today().isoformat()
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = LiveFeed()
+    monkeypatch.setattr(incremental, "live_feed", feed)
+    return feed
+
+
+def _partials(watched, day):
+    return incremental.day_partials(watched, day, OVERFLOW_LOCATIONS)
+
+
+async def _reread(async_db, day):
+    fresh = LiveDay(day, OVERFLOW_LOCATIONS)
+    await fresh.load(async_db)
+    return fresh
+
+
+def test_sorter_writes_are_followed_without_rereading(db, async_db, today, feed):
+    parcels = make_parcels(100)
+    db[today].insert_many(parcels[:60])
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        day = await _partials(watched, today)
+        assert day.parcel_count == 60
+
+        # What the sorter writes: new parcels, an event appended in place, a deleted parcel
+        db[today].insert_many(parcels[60:])
+        event = {"msg_id": "2", "ts": ts(5_000), "raw": "x|x"}
+        db[today].update_one({"_id": parcels[3]["_id"]}, {"$push": {"events": event}})
+        db[today].delete_one({"_id": parcels[0]["_id"]})
+        for parcel in parcels[60:] + [db[today].find_one({"_id": parcels[3]["_id"]})]:
+            watched.streams[0].changes.put_nowait(change(today, parcel))
+        watched.streams[0].changes.put_nowait(change(today, None, parcels[0]["_id"]))
+        await until(lambda: day.parcel_count == 99)
+
+        assert await _partials(watched, today) is day
+        assert day.summary_row(*WHOLE_DAY) == (await _reread(async_db, today)).summary_row(*WHOLE_DAY)
+        assert len(watched.streams) == 1
+
+    asyncio.run(follow())
+
+
+def test_a_failed_stream_is_followed_again(db, async_db, today, feed):
+    db[today].insert_many(make_parcels(20))
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        day = await _partials(watched, today)
+        watched.streams[0].changes.put_nowait(RuntimeError("connection lost"))
+        await until(lambda: not feed.days)
+
+        # Missed writes are read with the day again
+        db[today].insert_one({"_id": "late", "hostId": "H1", "registerTS": ts(1_000), "events": []})
+        again = await _partials(watched, today)
+        assert again is not day and again.parcel_count == 21
+        assert len(watched.streams) == 2
+
+    asyncio.run(follow())
+
+
+def test_without_change_streams_the_pipelines_answer(async_db, today, feed, monkeypatch):
+    watched = WatchedDb(async_db, hello={"isWritablePrimary": True})
+    checks = []
+    check = feed.check
+
+    async def counted(db):
+        checks.append(db)
+        await check(db)
+
+    monkeypatch.setattr(feed, "check", counted)
+    assert asyncio.run(_partials(watched, today)) is None
+    assert asyncio.run(_partials(watched, today)) is None
+    assert len(checks) == 1 and watched.streams == []
+
+    monkeypatch.setattr(settings, "INCREMENTAL_RETRY_SECONDS", 0)
+    incremental._days[today].retry_at = 0
+    assert asyncio.run(_partials(watched, today)) is None
+    assert len(checks) == 2
+
+
+def test_a_closed_day_is_no_longer_followed(db, async_db, today, feed):
+    yesterday = "2024-01-02"
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        # Followed while it was today
+        incremental._days[yesterday] = partials = incremental._DayPartials()
+        partials.subscriber = await feed.subscribe(watched, yesterday, OVERFLOW_LOCATIONS)
+
+        await _partials(watched, today)
+        assert yesterday not in incremental._days
+        assert list(feed.days) == [today]
+
+    asyncio.run(follow())
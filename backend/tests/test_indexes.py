@@ -0,0 +1,60 @@
+"""Day collections get their indexes whenever they appear, and again when the list changes."""
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from app.database import indexes
+from app.database.catalog import CollectionCatalog
+
+DATE = "2024-01-02"
+
+
+@pytest.fixture(autouse=True)
+def status(monkeypatch):
+    monkeypatch.setattr(indexes, "_status", {})
+
+
+def test_indexes_are_built_once_per_spec(db):
+    db[DATE].insert_one({"_id": 1})
+    assert indexes.ensure_indexes(db[DATE])
+    assert indexes.ensure_indexes(db[DATE]) == []
+
+    extended = indexes.DATE_COLLECTION_INDEXES + [IndexModel([("exit_location", ASCENDING)], name="exit_location_1")]
+    assert indexes.ensure_indexes(db[DATE], extended)
+    assert "exit_location_1" in db[DATE].index_information()
+    assert indexes.ensure_indexes(db[DATE], extended) == []
+
+
+def test_a_failed_build_is_tried_again(db, monkeypatch):
+    def fail(self, models):
+        raise RuntimeError("not primary")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(type(db[DATE]), "create_indexes", fail)
+        with pytest.raises(RuntimeError):
+            indexes.ensure_indexes(db[DATE])
+    assert indexes._status[DATE]["state"] == "failed"
+    assert indexes.ensure_indexes(db[DATE])
+
+
+def test_catalog_reports_each_new_day_once(db):
+    catalog = CollectionCatalog(ttl_seconds=0)
+    seen = []
+    catalog.on_new_dates(seen.append)
+    db[DATE].insert_one({"_id": 1})
+    db["parcel_lookup"].insert_one({"_id": 1})
+
+    catalog.names(db)
+    catalog.names(db)
+    db["2024-01-03"].insert_one({"_id": 1})
+    catalog.names(db)
+    assert seen == [[DATE], ["2024-01-03"]]
+
+
+def test_new_day_gets_its_indexes(db):
+    catalog = CollectionCatalog(ttl_seconds=0)
+    catalog.on_new_dates(lambda names: indexes.ensure_all_indexes_in_background(db, names).join())
+    db[DATE].insert_one({"_id": 1})
+
+    catalog.names(db)
+    assert "registerTS_ms_1" in db[DATE].index_information()
+    assert indexes._status[DATE]["state"] == "ready"
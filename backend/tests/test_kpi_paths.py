@@ -0,0 +1,229 @@
+"""Every precomputed KPI path against the semantics of the aggregation pipelines.
+
+The reference below restates what summary_pipeline / throughput_pipeline
+compute: parcels registered in [start_ms, end_ms] inclusive, total_parcels
+as the number of distinct non-empty hostIds, IN/OUT/overflow events in
+[start_ms, end_ms] binned by floor((ms - start_ms) / bin width).
+"""
+import asyncio
+from datetime import date
+import random
+
+import pytest
+from parcels import OVERFLOW_LOCATIONS, make_parcels, ts
+from streams import WatchedDb, change, until
+
+from app.services import incremental, ingest, rollups, snapshots
+from app.services.kpi_engine import KpiEngine
+from app.services.live import LiveDay, LiveFeed
+from app.services.normalization import normalize_parcel
+from app.services.summary_pipeline import SUMMARY_COUNTERS
+from app.utils.time_utils import MS_PER_MINUTE
+
+DATE = "2024-01-02"
+
+
+def reference_summary(parcels, start_ms, end_ms):
+    engine = KpiEngine(OVERFLOW_LOCATIONS)
+    row = {name: 0 for name in SUMMARY_COUNTERS}
+    hosts, first_in = set(), []
+    for parcel in parcels:
+        facts = engine.facts(normalize_parcel(parcel))
+        if facts.register_ms is None or not start_ms <= facts.register_ms <= end_ms:
+            continue
+        if parcel.get("hostId") not in (None, ""):
+            hosts.add(parcel["hostId"])
+        row["sorted"] += facts.sorted
+        row["in_system"] += facts.in_system
+        row["overflow"] += facts.overflow_case is not None
+        row["barcode_read"] += facts.barcode_read
+        row["volume_valid"] += facts.volume_valid
+        row["tracking_ok"] += facts.tracking_ok
+        if facts.first_in_ms is not None:
+            row["in_count"] += 1
+            first_in.append(facts.first_in_ms)
+    row["total_parcels"] = len(hosts)
+    row["in_min_ms"] = min(first_in) if first_in else None
+    row["in_max_ms"] = max(first_in) if first_in else None
+    return row
+
+
+def reference_throughput(parcels, start_ms, end_ms, bin_size):
+    engine = KpiEngine(OVERFLOW_LOCATIONS)
+    totals = {"in": 0, "out": 0, "overflow": 0}
+    bins = {"in": {}, "out": {}}
+
+    def count(kind, ms):
+        if ms is None or not start_ms <= ms <= end_ms:
+            return
+        totals[kind] += 1
+        if kind in bins:
+            index = (ms - start_ms) // (bin_size * MS_PER_MINUTE)
+            bins[kind][index] = bins[kind].get(index, 0) + 1
+
+    for parcel in parcels:
+        facts = engine.facts(normalize_parcel(parcel))
+        for ms in facts.in_ms:
+            count("in", ms)
+        count("out", facts.out_ms)
+        count("overflow", facts.overflow_ms)
+    return {"totals": totals, "bins": bins}
+
+
+def windows(parcels):
+    """Windows starting and ending exactly on the registration or event time of some parcel."""
+    rnd = random.Random(7)
+    registered, events = set(), set()
+    for parcel in map(normalize_parcel, parcels):
+        registered.add(parcel["registerTS_ms"])
+        events.update(e["ts_ms"] for e in parcel["events"] if e["msg_id"] in ("2", "6", "7"))
+    registered = sorted(ms for ms in registered if ms is not None and ms % MS_PER_MINUTE == 0)
+    events = sorted(ms for ms in events if ms is not None and ms % MS_PER_MINUTE == 0)
+
+    result = [(0, 23 * 3_600_000 + 59 * MS_PER_MINUTE, 15)]
+    for exact in (registered, events):
+        for _ in range(10):
+            start_ms, end_ms = sorted(rnd.sample(exact, 2))
+            result.append((start_ms, end_ms, rnd.choice([1, 7, 15, 60])))
+    return result
+
+
+def rewrite(parcels, seed=3):
+    """New versions of a third of the parcels: other hosts, registration times and events."""
+    rnd = random.Random(seed)
+    fresh = make_parcels(len(parcels), seed=seed + 100)
+    rewritten = []
+    for parcel in rnd.sample(parcels, len(parcels) // 3):
+        new = dict(fresh[parcel["_id"]], _id=parcel["_id"])
+        if rnd.random() < 0.5:
+            new["hostId"] = parcel["hostId"]
+        if rnd.random() < 0.3:
+            new["registerTS"] = ts(rnd.randrange(0, 86_400_000, MS_PER_MINUTE))
+        rewritten.append(new)
+    return rewritten
+
+
+def current(parcels, rewritten):
+    by_id = {p["_id"]: p for p in parcels}
+    by_id.update({p["_id"]: p for p in rewritten})
+    return list(by_id.values())
+
+
+def assert_matches(parcels, summary_row, throughput_bins):
+    for start_ms, end_ms, bin_size in windows(parcels):
+        assert summary_row(start_ms, end_ms) == reference_summary(parcels, start_ms, end_ms)
+        assert throughput_bins(start_ms, end_ms, bin_size) == reference_throughput(parcels, start_ms, end_ms, bin_size)
+
+
+def test_windows_cover_the_edge_cases():
+    parcels = make_parcels()
+    hosts = [p["hostId"] for p in parcels if p["hostId"]]
+    assert len(set(hosts)) < len(hosts)
+    # A parcel registered, and an IN counted, exactly on the end of some window
+    ends = {end_ms for _, end_ms, _ in windows(parcels)}
+    normalized = [normalize_parcel(p) for p in parcels]
+    assert any(p["registerTS_ms"] in ends for p in normalized)
+    assert any(e["ts_ms"] in ends for p in normalized for e in p["events"] if e["msg_id"] == "2")
+
+
+def test_rollup_rebuild(db, async_db):
+    parcels = make_parcels()
+    db[DATE].insert_many(parcels)
+    rollups.rebuild(db, DATE, OVERFLOW_LOCATIONS)
+
+    assert_matches(
+        parcels,
+        lambda s, e: asyncio.run(rollups.summary_row(async_db, DATE, s, e)),
+        lambda s, e, b: asyncio.run(rollups.throughput_bins(async_db, DATE, s, e, b)),
+    )
+
+
+def test_rollup_after_rewrites(db, async_db):
+    parcels = make_parcels()
+    ingest.ingest_parcels(db, DATE, parcels)
+    rewritten = rewrite(parcels)
+    ingest.ingest_parcels(db, DATE, rewritten)
+    assert rollups.available(db, DATE, OVERFLOW_LOCATIONS)
+
+    assert_matches(
+        current(parcels, rewritten),
+        lambda s, e: asyncio.run(rollups.summary_row(async_db, DATE, s, e)),
+        lambda s, e, b: asyncio.run(rollups.throughput_bins(async_db, DATE, s, e, b)),
+    )
+
+
+def test_rollup_of_an_older_layout_is_ignored(db):
+    db[DATE].insert_many(make_parcels(20))
+    rollups.rebuild(db, DATE, OVERFLOW_LOCATIONS)
+    db[rollups.rollup_name(DATE)].update_one({"_id": "meta"}, {"$unset": {"version": ""}})
+    assert not rollups.available(db, DATE, OVERFLOW_LOCATIONS)
+
+
+def test_snapshot(db):
+    parcels = make_parcels()
+    db[DATE].insert_many(parcels)
+    snapshots.export(db, DATE, OVERFLOW_LOCATIONS)
+    snapshot = snapshots.load(DATE, OVERFLOW_LOCATIONS)
+
+    assert_matches(
+        parcels,
+        lambda s, e: snapshots.summary_row(snapshot, s, e),
+        lambda s, e, b: snapshots.throughput_bins(snapshot, s, e, b),
+    )
+
+
+def test_live_day_applies_and_retracts(db, async_db):
+    parcels = make_parcels()
+    db[DATE].insert_many(parcels)
+    day = LiveDay(DATE, OVERFLOW_LOCATIONS)
+    asyncio.run(day.load(async_db))
+
+    rewritten = rewrite(parcels)
+    for parcel in rewritten:
+        day.change(parcel["_id"], parcel)
+    deleted = {parcel["_id"] for parcel in random.Random(5).sample(parcels, 40)}
+    for parcel_id in deleted:
+        day.change(parcel_id, None)
+
+    remaining = [p for p in current(parcels, rewritten) if p["_id"] not in deleted]
+    assert day.parcel_count == len(remaining)
+    assert_matches(remaining, day.summary_row, day.throughput_bins)
+
+
+def test_live_day_drop(db, async_db):
+    db[DATE].insert_many(make_parcels(50))
+    day = LiveDay(DATE, OVERFLOW_LOCATIONS)
+    asyncio.run(day.load(async_db))
+
+    reg_slots, ev_slots = day.drop()
+    assert reg_slots and ev_slots
+    assert day.parcel_count == 0
+    assert day.summary_row(0, 86_399_999) == reference_summary([], 0, 86_399_999)
+    assert day.throughput_bins(0, 86_399_999, 15) == reference_throughput([], 0, 86_399_999, 15)
+    assert all(v.size == 0 for v in day.registered_dimensions(0, 86_399_999).values())
+
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(incremental, "_days", {})
+    monkeypatch.setattr(incremental, "live_feed", LiveFeed())
+    return date.today().isoformat()
+
+
+def test_incremental_partials(db, async_db, today):
+    parcels = make_parcels()
+    db[today].insert_many(parcels)
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        day = await incremental.day_partials(watched, today, OVERFLOW_LOCATIONS)
+        rewritten = rewrite(parcels)
+        for parcel in rewritten:
+            db[today].replace_one({"_id": parcel["_id"]}, parcel)
+            watched.streams[0].changes.put_nowait(change(today, parcel))
+        await until(lambda: watched.streams[0].changes.empty())
+        assert await incremental.day_partials(watched, today, OVERFLOW_LOCATIONS) is day
+        return day, rewritten
+
+    day, rewritten = asyncio.run(follow())
+    assert_matches(current(parcels, rewritten), day.summary_row, day.throughput_bins)
@@ -0,0 +1,168 @@
+"""The live feed: one change stream however many clients arrive at once, and
+subscribers that live exactly as long as their response body is read."""
+import asyncio
+import logging
+from datetime import date
+
+import pytest
+from parcels import OVERFLOW_LOCATIONS, make_parcels
+from streams import WatchedDb, until
+
+from app.routes import live as live_route
+from app.services import live
+from app.services.live import LiveDay, LiveFeed
+from app.services.normalization import normalize_parcel
+
+DATE = "2024-01-02"
+WHOLE_DAY = (0, 86_399_999)
+
+
+def _applied(parcels):
+    """A LiveDay holding `parcels`, without reading them from a database."""
+    day = LiveDay(DATE, OVERFLOW_LOCATIONS)
+    day._buffer = None
+    for parcel in parcels:
+        day.change(parcel["_id"], parcel)
+    return day
+
+
+def test_concurrent_first_subscribers_open_one_stream(db, async_db):
+    db[DATE].insert_many(make_parcels(50))
+    feed, watched = LiveFeed(), WatchedDb(async_db)
+
+    async def follow():
+        subscribers = await asyncio.gather(*(
+            feed.subscribe(watched, DATE, OVERFLOW_LOCATIONS) for _ in range(4)
+        ))
+        assert len(watched.streams) == 1
+        assert len({subscriber.day for subscriber in subscribers}) == 1
+        assert subscribers[0].day.parcel_count == 50
+
+        for subscriber in subscribers:
+            feed.unsubscribe(subscriber)
+        assert feed.days == {} and feed._task is None
+
+    asyncio.run(follow())
+
+
+def test_changes_reach_subscribers(db, async_db):
+    parcels = [normalize_parcel(parcel) for parcel in make_parcels(30)]
+    db[DATE].insert_many(parcels[:20])
+    feed, watched = LiveFeed(), WatchedDb(async_db)
+
+    async def follow():
+        subscriber = await feed.subscribe(watched, DATE, OVERFLOW_LOCATIONS)
+        day, stream = subscriber.day, watched.streams[0]
+        expected = _applied(parcels[:20])
+
+        for parcel in parcels[20:]:
+            stream.changes.put_nowait({
+                "operationType": "insert", "ns": {"coll": DATE},
+                "documentKey": {"_id": parcel["_id"]}, "fullDocument": parcel,
+            })
+        stream.changes.put_nowait({
+            "operationType": "delete", "ns": {"coll": DATE}, "documentKey": {"_id": parcels[0]["_id"]},
+        })
+        # Another day's writes are not followed
+        stream.changes.put_nowait({
+            "operationType": "drop", "ns": {"coll": "2024-01-03"}, "documentKey": {},
+        })
+        await until(lambda: stream.changes.empty() and day.parcel_count == 29)
+        assert subscriber.changed.is_set()
+        reg_slots, ev_slots = subscriber.take()
+        assert reg_slots and not subscriber.changed.is_set()
+
+        for parcel in parcels[20:]:
+            expected.change(parcel["_id"], parcel)
+        expected.change(parcels[0]["_id"], None)
+        assert day.summary_row(*WHOLE_DAY) == expected.summary_row(*WHOLE_DAY)
+        assert day.throughput_bins(*WHOLE_DAY, 15) == expected.throughput_bins(*WHOLE_DAY, 15)
+
+        stream.changes.put_nowait({"operationType": "drop", "ns": {"coll": DATE}, "documentKey": {}})
+        await until(lambda: day.parcel_count == 0)
+        feed.unsubscribe(subscriber)
+
+    asyncio.run(follow())
+
+
+def test_changes_during_the_load_are_replayed(db, async_db):
+    parcels = [normalize_parcel(parcel) for parcel in make_parcels(20)]
+    db[DATE].insert_many(parcels)
+    day = LiveDay(DATE, OVERFLOW_LOCATIONS)
+
+    # Streamed before the read finishes: buffered, then applied in order
+    assert day.change(parcels[0]["_id"], None) == (set(), set())
+    assert day.drop() == (set(), set())
+    day.change(parcels[1]["_id"], parcels[1])
+    asyncio.run(day.load(async_db))
+
+    assert day.parcel_count == 1
+    assert day.summary_row(*WHOLE_DAY) == _applied(parcels[1:2]).summary_row(*WHOLE_DAY)
+
+
+def test_a_failed_stream_is_logged_and_ends_the_subscribers(db, async_db, caplog):
+    feed, watched = LiveFeed(), WatchedDb(async_db)
+
+    async def follow():
+        subscriber = await feed.subscribe(watched, DATE, OVERFLOW_LOCATIONS)
+        watched.streams[0].changes.put_nowait(RuntimeError("connection lost"))
+        await asyncio.wait_for(subscriber.changed.wait(), 1)
+        assert subscriber.error == "connection lost"
+        assert feed.days == {}
+
+    with caplog.at_level(logging.ERROR, logger=live.__name__):
+        asyncio.run(follow())
+    assert "Live change stream stopped" in caplog.text
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = LiveFeed()
+    monkeypatch.setattr(live_route, "live_feed", feed)
+    return feed
+
+
+def _stream(watched, **params):
+    return live_route.stream_live_kpis(date=date.today().isoformat(), bin_size=10, db=watched, **params)
+
+
+def test_the_route_subscribes_once_its_body_is_read(db, async_db, feed):
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        response = await _stream(watched)
+        # Never read, e.g. the client left before the first byte: nothing to clean up
+        assert feed.days == {} and watched.streams == []
+
+        body = response.body_iterator
+        assert (await body.__anext__()).startswith("event: snapshot")
+        assert list(feed.days) == [date.today().isoformat()]
+
+        await body.aclose()
+        assert feed.days == {} and feed._task is None
+
+    asyncio.run(follow())
+
+
+def test_a_failed_stream_ends_the_response_with_a_failure(db, async_db, feed):
+    watched = WatchedDb(async_db)
+
+    async def follow():
+        body = (await _stream(watched)).body_iterator
+        assert (await body.__anext__()).startswith("event: snapshot")
+        watched.streams[0].changes.put_nowait(RuntimeError("connection lost"))
+
+        events = [event async for event in body]
+        assert events == ['event: failure\ndata: {"detail": "connection lost"}\n\n']
+        assert feed.days == {}
+
+    asyncio.run(follow())
+
+
+def test_the_route_needs_change_streams(async_db, feed):
+    watched = WatchedDb(async_db, hello={"isWritablePrimary": True})
+
+    with pytest.raises(live_route.HTTPException) as error:
+        asyncio.run(_stream(watched))
+    assert error.value.status_code == 503
+    assert watched.streams == []
@@ -0,0 +1,88 @@
+import asyncio
+
+from parcels import OVERFLOW_LOCATIONS, make_parcels
+
+from app.routes import volume
+from app.models.kpi_model import DateRequest
+from app.services import rollups
+from app.services.kpi_engine import KpiEngine
+from app.services.live import LiveDay
+from app.services.normalization import as_normalized, is_normalized, normalize_event, normalize_parcel
+
+DATE = "2024-01-02"
+
+
+def _facts(doc):
+    facts = KpiEngine(OVERFLOW_LOCATIONS).facts(doc)
+    return {name: getattr(facts, name) for name in facts.__slots__}
+
+
+def _store(db, parcels):
+    db[DATE].insert_many(parcels)
+
+
+def test_facts_of_raw_parcels_match_normalized_ones():
+    for parcel in make_parcels():
+        assert not is_normalized(parcel)
+        assert _facts(parcel) == _facts(normalize_parcel(parcel))
+
+
+def test_events_appended_in_place_are_normalized():
+    parcel = next(p for p in make_parcels() if len(p["events"]) > 2)
+    partly = normalize_parcel({**parcel, "events": parcel["events"][:1]})
+    partly["events"] += parcel["events"][1:]
+
+    normalized = as_normalized(partly)
+    assert normalized["events"] == [normalize_event(e) for e in parcel["events"]]
+    assert normalized["msg_ids"] == normalize_parcel(parcel)["msg_ids"]
+    assert _facts(partly) == _facts(normalize_parcel(parcel))
+
+
+def _rollup(db):
+    rollups.rebuild(db, DATE, OVERFLOW_LOCATIONS, batch_size=64)
+    return list(db[rollups.rollup_name(DATE)].find({"_id": {"$ne": "meta"}}))
+
+
+def test_rollup_of_raw_parcels(db):
+    parcels = make_parcels()
+    _store(db, [normalize_parcel(p) for p in parcels])
+    expected = _rollup(db)
+
+    db[DATE].drop()
+    # Half written by the sorter, half ingested
+    _store(db, [p if p["_id"] % 2 else normalize_parcel(p) for p in parcels])
+    assert _rollup(db) == expected
+
+
+def _live_day(async_db):
+    day = LiveDay(DATE, OVERFLOW_LOCATIONS)
+    asyncio.run(day.load(async_db))
+    return day
+
+
+def test_live_day_of_raw_parcels(db, async_db):
+    parcels = make_parcels()
+    _store(db, [normalize_parcel(p) for p in parcels])
+    expected = _live_day(async_db)
+
+    db[DATE].drop()
+    _store(db, parcels)
+    day = _live_day(async_db)
+    assert day.summary_row(0, 86_400_000) == expected.summary_row(0, 86_400_000)
+    assert day.throughput_bins(0, 86_400_000, 15) == expected.throughput_bins(0, 86_400_000, 15)
+
+
+def _volume(async_db, start_time, end_time):
+    payload = DateRequest(date=DATE, start_time=start_time, end_time=end_time)
+    return asyncio.run(volume._compute_volume(payload, async_db[DATE]))
+
+
+def test_volume_of_raw_parcels(db, async_db):
+    parcels = make_parcels()
+    _store(db, [normalize_parcel(p) for p in parcels])
+    expected = _volume(async_db, "06:00", "17:59")
+
+    db[DATE].drop()
+    _store(db, [p if p["_id"] % 2 else normalize_parcel(p) for p in parcels])
+    assert _volume(async_db, "06:00", "17:59") == expected
+    assert expected["length_bands"]["from_600_mm"] > 0
@@ -0,0 +1,62 @@
+"""Searches of one day read that day's collection, barcode wildcards included."""
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.parcel_journey_model import ParcelJourneyRequest
+from app.routes import parcel_journey
+from app.services import parcel_lookup
+
+DATE = "2024-01-02"
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    db[DATE].insert_many([
+        {"_id": 1, "hostId": "H1", "barcode_data": {"barcodes": ["ABC123", "Z9"]}},
+        {"_id": 2, "hostId": "H2", "barcode_data": {"barcodes": ["XABC12"]}},
+        {"_id": 3, "hostId": "H3", "barcode_data": {"barcodes": ["ABD123"]}},
+        {"_id": 4, "hostId": "H4", "barcode_data": {"barcodes": ["A.C123"]}},
+    ])
+
+    async def no_lookup(*args, **kwargs):
+        raise AssertionError("a search with a date went through the lookup")
+
+    monkeypatch.setattr(parcel_lookup, "find_entries", no_lookup)
+    return db
+
+
+def _hosts(async_db, value):
+    payload = ParcelJourneyRequest(date=DATE, search_by="barcode", search_value=value)
+    return [row["host_id"] for row in asyncio.run(parcel_journey.get_parcel_journey(payload, async_db))]
+
+
+@pytest.mark.parametrize("value, hosts", [
+    ("ABC123", ["H1"]),
+    ("ABC*", ["H1"]),
+    ("A.C*", ["H4"]),
+    ("*123", ["H1", "H3", "H4"]),
+    ("*C12", ["H2"]),
+])
+def test_wildcards_with_a_date_scan_the_day(async_db, value, hosts):
+    assert _hosts(async_db, value) == hosts
+
+
+def test_stream_pages_a_wildcard_of_one_day(async_db):
+    async def read(cursor=None):
+        payload = ParcelJourneyRequest(date=DATE, search_by="barcode", search_value="*123", limit=2, cursor=cursor)
+        response = await parcel_journey.stream_parcel_journey(payload, async_db)
+        return [json.loads(line) async for line in response.body_iterator]
+
+    first = asyncio.run(read())
+    assert [row["host_id"] for row in first[:-1]] == ["H1", "H3"]
+    second = asyncio.run(read(first[-1]["next_cursor"]))
+    assert [row["host_id"] for row in second[:-1]] == ["H4"] and second[-1]["next_cursor"] is None
+
+
+def test_bad_wildcards_are_refused(async_db):
+    with pytest.raises(HTTPException) as refused:
+        _hosts(async_db, "A*C")
+    assert refused.value.status_code == 400
@@ -0,0 +1,90 @@
+"""Searches without a date find the days the lookup does not cover yet, in the same order."""
+import asyncio
+
+import pytest
+
+from app.services import parcel_lookup
+
+DAYS = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+SEARCHES = [
+    ("host_id", "H3"),
+    ("alibi_id", "A1"),
+    ("barcode", "BC1001"),
+    ("barcode", "BC1*"),
+    ("barcode", "*01"),
+]
+
+
+def _parcels(day_index):
+    parcels = []
+    for parcel_id in range(40):
+        barcodes = [f"BC{parcel_id % 3}{(parcel_id + day_index) % 5:02d}{parcel_id % 2}"]
+        if parcel_id % 4 == 0:
+            barcodes.append(f"XY{parcel_id:02d}01")
+        parcels.append({
+            "_id": parcel_id,
+            "hostId": f"H{parcel_id % 8}",
+            "alibi_id": f"A{parcel_id % 5}",
+            "barcode_data": {"barcodes": barcodes},
+        })
+    return parcels
+
+
+@pytest.fixture
+def db(db):
+    for day_index, day in enumerate(DAYS):
+        db[day].insert_many(_parcels(day_index))
+    return db
+
+
+def _pages(async_db, search_by, value, limit, date=None):
+    """Every match, read `limit` at a time as the stream route pages through them."""
+    matches, after = [], None
+    while True:
+        page = asyncio.run(parcel_lookup.find_entries(async_db, search_by, value, limit, after, date))
+        matches.extend(page)
+        if len(page) < limit:
+            return matches
+        after = page[-1]
+
+
+def _keys(matches):
+    return [(match["date"], match["pid"]) for match in matches]
+
+
+@pytest.mark.parametrize("search_by, value", SEARCHES)
+def test_uncovered_days_are_searched_in_place(db, async_db, search_by, value):
+    for day in DAYS:
+        parcel_lookup.rebuild(db, day)
+    expected = _pages(async_db, search_by, value, 1000)
+    assert expected
+
+    # Today is written by the sorter alone, and yesterday's entries are half rebuilt
+    db[parcel_lookup.LOOKUP_DAYS_COLLECTION].delete_many({"_id": {"$in": DAYS[1:]}})
+    db[parcel_lookup.LOOKUP_COLLECTION].delete_many({"date": DAYS[2]})
+    db[parcel_lookup.LOOKUP_COLLECTION].delete_many({"date": DAYS[1], "pid": {"$gte": 20}})
+
+    for limit in (1000, 3):
+        assert _keys(_pages(async_db, search_by, value, limit)) == _keys(expected)
+
+
+def test_nothing_built_yet(db, async_db):
+    matches = _pages(async_db, "host_id", "H3", 2)
+    assert _keys(matches) == [(day, pid) for day in reversed(DAYS) for pid in range(3, 40, 8)]
+    assert _keys(_pages(async_db, "host_id", "H3", 2, DAYS[0])) == [(DAYS[0], pid) for pid in range(3, 40, 8)]
+
+
+@pytest.mark.parametrize("value, matches", [
+    ("BC1*", lambda code: code.startswith("BC1")),
+    ("*01", lambda code: code.endswith("01")),
+    ("BC.*", lambda code: code.startswith("BC.")),
+])
+def test_day_query_anchors_wildcards(db, value, matches):
+    db[DAYS[0]].insert_one({"_id": "dot", "barcode_data": {"barcodes": ["01BC1", "BCX01X"]}})
+    expected = sorted((
+        doc["_id"] for doc in db[DAYS[0]].find({}, {"_id": 1, "barcode_data": 1})
+        if any(matches(code) for code in doc["barcode_data"]["barcodes"])
+    ), key=str)
+    found = [doc["_id"] for doc in db[DAYS[0]].find(parcel_lookup.day_query("barcode", value), {"_id": 1})]
+    assert sorted(found, key=str) == expected
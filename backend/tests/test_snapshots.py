@@ -0,0 +1,39 @@
+"""The open-snapshot cache follows the files on disk, whoever changes them."""
+import shutil
+
+from parcels import OVERFLOW_LOCATIONS, make_parcels
+
+from app.services import snapshots
+
+DATE = "2024-01-02"
+
+
+def _from_another_process(export):
+    # What a worker that did not run the export still holds
+    held = dict(snapshots._loaded)
+    export()
+    snapshots._loaded.update(held)
+
+
+def test_deleted_snapshot_is_not_served(db):
+    db[DATE].insert_many(make_parcels(50))
+    snapshots.export(db, DATE, OVERFLOW_LOCATIONS)
+    assert snapshots.load(DATE, OVERFLOW_LOCATIONS) is not None
+
+    shutil.rmtree(snapshots.snapshot_dir(DATE))
+    assert snapshots.load(DATE, OVERFLOW_LOCATIONS) is None
+    assert DATE not in snapshots._loaded
+
+
+def test_replaced_snapshot_is_read_again(db):
+    db[DATE].insert_many(make_parcels(50))
+    snapshots.export(db, DATE, OVERFLOW_LOCATIONS)
+    old = snapshots.load(DATE, OVERFLOW_LOCATIONS)
+
+    db[DATE].insert_many([{**parcel, "_id": parcel["_id"] + 1000} for parcel in make_parcels(30, seed=2)])
+    _from_another_process(lambda: snapshots.export(db, DATE, OVERFLOW_LOCATIONS))
+
+    new = snapshots.load(DATE, OVERFLOW_LOCATIONS)
+    assert new is not old
+    assert new.parcels.num_rows == 80
+    assert snapshots.load(DATE, OVERFLOW_LOCATIONS) is new
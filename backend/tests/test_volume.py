@@ -0,0 +1,95 @@
+"""The /volume time window from midnight, with missing and malformed registerTS, read in batches."""
+import asyncio
+
+import pytest
+from parcels import OVERFLOW_LOCATIONS, make_parcels
+
+from app import config as settings
+from app.models.kpi_model import DateRequest
+from app.routes import volume
+from app.services import snapshots
+from app.services.normalization import normalize_parcel
+
+DATE = "2024-01-02"
+
+# registerTS -> its time in ms, None when the parcel is in no window
+REGISTRATIONS = [
+    ("00:00:00,000", 0),
+    ("00:00:00", 0),
+    ("0:00:30", 30_000),
+    ("00:01:59,999", 119_999),
+    ("00:02:00,000", 120_000),
+    ("23:59:59,999", 86_399_999),
+    (None, None),
+    ("", None),
+    ("garbage", None),
+    ("00:00", None),
+    ("-1:00:00,000", None),
+    (0, None),
+    ("missing", None),
+]
+
+# Windows from midnight: end time -> last ms included
+WINDOWS = [("00:01", 119_999), ("23:59", 86_399_999)]
+
+
+def _parcels():
+    parcels = []
+    for parcel_id, (register_ts, _) in enumerate(REGISTRATIONS):
+        parcel = {
+            "_id": parcel_id,
+            "hostId": f"H{parcel_id}",
+            "events": [],
+            # The length tells which parcels were counted
+            "volume_data": {"length": 100.0 + parcel_id, "height": 10.0, "width": 20.0},
+        }
+        if register_ts != "missing":
+            parcel["registerTS"] = register_ts
+        parcels.append(parcel)
+    return parcels
+
+
+def _lengths(result):
+    return (result["length"]["count"], result["length"].get("min"), result["length"].get("max"))
+
+
+def _expected(end_ms):
+    lengths = [100.0 + parcel_id for parcel_id, (_, ms) in enumerate(REGISTRATIONS)
+               if ms is not None and ms <= end_ms]
+    return len(lengths), min(lengths), max(lengths)
+
+
+def _volume(async_db, end_time):
+    payload = DateRequest(date=DATE, start_time="00:00", end_time=end_time)
+    return asyncio.run(volume._compute_volume(payload, async_db[DATE]))
+
+
+@pytest.mark.parametrize("written_by", ["ingest", "sorter", "both"])
+@pytest.mark.parametrize("end_time, end_ms", WINDOWS)
+def test_database_path(db, async_db, written_by, end_time, end_ms):
+    parcels = _parcels()
+    if written_by != "sorter":
+        parcels = [p if written_by == "both" and p["_id"] % 2 else normalize_parcel(p) for p in parcels]
+    db[DATE].insert_many(parcels)
+
+    assert _lengths(_volume(async_db, end_time)) == _expected(end_ms)
+
+
+@pytest.mark.parametrize("end_time, end_ms", WINDOWS)
+def test_snapshot_path(db, async_db, end_time, end_ms):
+    db[DATE].insert_many(_parcels())
+    snapshots.export(db, DATE, OVERFLOW_LOCATIONS)
+    # Served from the snapshot alone
+    db[DATE].delete_many({})
+
+    assert _lengths(_volume(async_db, end_time)) == _expected(end_ms)
+
+
+def test_batches_merge_into_the_whole_day(db, async_db, monkeypatch):
+    db[DATE].insert_many(make_parcels(500))
+    monkeypatch.setattr(settings, "MONGODB_CURSOR_BATCH_SIZE", 10_000)
+    whole = _volume(async_db, "23:59")
+
+    monkeypatch.setattr(settings, "MONGODB_CURSOR_BATCH_SIZE", 7)
+    assert _volume(async_db, "23:59") == whole
+    assert whole["length"]["count"] > 0
@@ -0,0 +1,46 @@
+"""/volume stats read back from the mergeable sketches against NumPy."""
+import random
+
+import numpy as np
+import pytest
+
+from app import config as settings
+from app.services import volume_stats
+
+
+def _stats(*days):
+    return volume_stats.stats(volume_stats.merge(volume_stats.sketch(day) for day in days))
+
+
+def _assert_percentiles(values, stats, tolerance):
+    for q in volume_stats.PERCENTILES:
+        assert stats[f"p{q}"] == pytest.approx(np.percentile(values, q), abs=tolerance), q
+
+
+@pytest.mark.parametrize("values", [
+    [1, 2, 3],
+    [0.5, 1e6],
+    [7],
+    [4, 4, 4, 4],
+    [0, 0, 1000],
+])
+def test_percentiles_interpolate_like_numpy(values):
+    _assert_percentiles(values, _stats(values), 0.01)
+
+
+def test_p95_of_three_values():
+    assert _stats([1, 2, 3])["p95"] == 2.9
+    assert _stats([0.5, 1e6])["p95"] == pytest.approx(950000.025, abs=0.01)
+
+
+def test_percentiles_of_merged_days():
+    rnd = random.Random(4)
+    days = [[rnd.randint(50, 900) for _ in range(rnd.randint(1, 300))] for _ in range(5)]
+    days.append([rnd.uniform(50, 900) for _ in range(200)])
+    values = [value for day in days for value in day]
+
+    stats = _stats(*days)
+    assert stats["count"] == len(values)
+    assert stats["min"] == min(values) and stats["max"] == max(values)
+    # Values between two grid lines are known to one bucket
+    _assert_percentiles(values, stats, settings.VOLUME_SKETCH_RESOLUTION_MM)
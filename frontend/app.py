@@ -1,6 +1,7 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
+from flask import jsonify
 
 # Importing layouts
 from layouts.summary import summary_layout
@@ -11,6 +12,7 @@ from layouts.identification import identification_layout
 from layouts.recirculation import recirculation_layout
 
 from components.navbar import navbar  # import navbar
+from utils import api_client
 
 # Importing callbacks
 import callbacks.volume_callbacks
@@ -23,6 +25,12 @@ app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_
 app.title = "📦 Parcel Dashboard"
 server = app.server  # ✅ Expose the Flask server for Gunicorn
 
+
+# Backend call latency of this worker, per endpoint
+@server.route("/api-latency")
+def api_latency():
+    return jsonify(api_client.latency_stats())
+
 # App layout
 app.layout = html.Div([
     dcc.Location(id='url'),
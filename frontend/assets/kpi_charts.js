@@ -0,0 +1,193 @@
+// Chart rendering of the /volume and /throughput pages, run in the browser
+// from the API results the page keeps in a dcc.Store (ClientsideFunction
+// namespaces "volume" and "throughput").
+window.dash_clientside = Object.assign({}, window.dash_clientside, (function () {
+    const STATS_KEYS = ["min", "max", "mean", "p5", "p50", "p95"];
+    const DIMENSIONS = [
+        ["height", "Height"],
+        ["width", "Width"],
+        ["length", "Length"]
+    ];
+    const HIDDEN = {display: "none"};
+    const SHOWN = {};
+
+    function emptyFigure(text, height) {
+        return {
+            data: [],
+            layout: {
+                height: height,
+                margin: {l: 20, r: 20, t: 40, b: 20},
+                xaxis: {visible: false},
+                yaxis: {visible: false},
+                annotations: [{
+                    text: text, showarrow: false, xref: "paper", yref: "paper", x: 0.5, y: 0.5,
+                    font: {color: "#6c757d"}
+                }]
+            }
+        };
+    }
+
+    // Bars centred on their bins, as wide as the bins
+    function barFigure(histogram, title, xaxisTitle) {
+        if (!histogram || !histogram.counts || !histogram.counts.length) {
+            return emptyFigure("No data available", 300);
+        }
+        const width = histogram.bin_width;
+        const x = histogram.counts.map(function (_, i) {
+            return histogram.start + (i + 0.5) * width;
+        });
+        return {
+            data: [{type: "bar", x: x, y: histogram.counts, width: width, marker: {color: "#4e79a7"}}],
+            layout: {
+                title: {text: title},
+                xaxis: {title: {text: xaxisTitle}},
+                yaxis: {title: {text: "Count"}},
+                margin: {l: 20, r: 20, t: 40, b: 20},
+                height: 300
+            }
+        };
+    }
+
+    // Gaussian curve from the mean and standard deviation, over +/- 4 sigma
+    function normalFigure(stats, title, xaxisTitle) {
+        const mean = (stats && stats.mean) || 0;
+        const stdDev = (stats && stats.std_dev) || 0;
+        if (stdDev <= 0) {
+            return emptyFigure("No data for normal distribution", 300);
+        }
+        const x = [];
+        const y = [];
+        for (let i = 0; i < 200; i++) {
+            const value = mean - 4 * stdDev + (8 * stdDev * i) / 199;
+            const z = (value - mean) / stdDev;
+            x.push(value);
+            y.push(Math.exp(-0.5 * z * z) / (stdDev * Math.sqrt(2 * Math.PI)));
+        }
+        return {
+            data: [{type: "scatter", mode: "lines", x: x, y: y, line: {color: "#59a14f"}}],
+            layout: {
+                title: {text: title},
+                xaxis: {title: {text: xaxisTitle}},
+                yaxis: {title: {text: "Probability Density"}},
+                margin: {l: 20, r: 20, t: 40, b: 20},
+                height: 300
+            }
+        };
+    }
+
+    function areaFigure(series, title, color) {
+        const labels = Object.keys(series || {});
+        if (!labels.length) {
+            return emptyFigure("No data available for " + title, 350);
+        }
+        return {
+            data: [{
+                type: "scatter", mode: "lines", fill: "tozeroy", name: title,
+                x: labels, y: labels.map(function (label) { return series[label]; }),
+                line: {color: color}
+            }],
+            layout: {
+                title: {text: title},
+                xaxis: {title: {text: "Time"}},
+                yaxis: {title: {text: "Number of Parcels"}},
+                plot_bgcolor: "white",
+                paper_bgcolor: "white",
+                margin: {l: 20, r: 20, t: 50, b: 30},
+                height: 350,
+                autosize: false
+            }
+        };
+    }
+
+    function percent(count, total) {
+        return (total ? Math.round((count / total) * 10000) / 100 : 0).toFixed(2) + " %";
+    }
+
+    function average(values) {
+        if (!values.length) {
+            return 0;
+        }
+        const sum = values.reduce(function (a, b) { return a + b; }, 0);
+        return Math.round((sum / values.length) * 100) / 100;
+    }
+
+    return {
+        volume: {
+            // -> message, its class, content style, 3 charts, the stats cells, 2 x (count, percent)
+            render: function (fetched, live, graphType) {
+                const cells = DIMENSIONS.length * STATS_KEYS.length;
+                // The live push is for the current date and window (reset when they change), and newer
+                const data = live && live.volume ? live.volume : fetched;
+                if (!data) {
+                    return ["", "mt-4", HIDDEN].concat(Array(3 + cells + 4).fill(window.dash_clientside.no_update));
+                }
+                if (data.error) {
+                    return [data.error, "mt-4 text-danger", HIDDEN].concat(Array(3 + cells + 4).fill(window.dash_clientside.no_update));
+                }
+
+                const histograms = data.histograms || {};
+                const normal = data.normal_distribution || {};
+                const charts = DIMENSIONS.map(function (dimension) {
+                    const axis = dimension[1] + " (mm)";
+                    return graphType === "hist"
+                        ? barFigure(histograms[dimension[0]], dimension[1] + " Distribution", axis)
+                        : normalFigure(normal[dimension[0]], dimension[1] + " Normal Distribution", axis);
+                });
+
+                const stats = data.stats || {};
+                const statsCells = [];
+                DIMENSIONS.forEach(function (dimension) {
+                    const dimensionStats = stats[dimension[0]];
+                    STATS_KEYS.forEach(function (key) {
+                        statsCells.push(dimensionStats && dimensionStats.count ? dimensionStats[key] : "-");
+                    });
+                });
+
+                // Length band counts from the backend
+                const lengthKpis = data.length_kpis || {};
+                const total = lengthKpis.total || 0;
+                const under400 = lengthKpis.up_to_400_mm || 0;
+                const above600 = lengthKpis.from_600_mm || 0;
+
+                return ["", "mt-4", SHOWN].concat(charts, statsCells, [
+                    under400, percent(under400, total), above600, percent(above600, total)
+                ]);
+            }
+        },
+        throughput: {
+            // -> message, its class, KPI and chart styles, 5 x (title, value), 2 charts
+            render: function (data) {
+                const noUpdate = Array(10 + 2).fill(window.dash_clientside.no_update);
+                if (!data) {
+                    return ["", "", HIDDEN, HIDDEN].concat(noUpdate);
+                }
+                if (data.warning) {
+                    return [data.warning, "text-warning", HIDDEN, HIDDEN].concat(noUpdate);
+                }
+                if (!Object.keys(data).length) {
+                    return ["No data received from server.", "text-danger", HIDDEN, HIDDEN].concat(noUpdate);
+                }
+
+                const inData = data.parcels_in_time || {};
+                const outData = data.parcels_out_time || {};
+                const inValues = Object.values(inData);
+                const outValues = Object.values(outData);
+                const nonZero = function (value) { return value; };
+                if (!inValues.some(nonZero) && !outValues.some(nonZero)) {
+                    return ["No data available for the selected date.", "text-danger", HIDDEN, HIDDEN].concat(noUpdate);
+                }
+
+                const binSize = data.bin_size_minutes;
+                return ["", "", SHOWN, SHOWN,
+                    "Total Parcels IN", data.total_in || 0,
+                    "Total Parcels OUT", data.total_out || 0,
+                    "Overflow", data.overflow || 0,
+                    "Avg Parcels IN / " + binSize + " min", average(inValues),
+                    "Avg Parcels OUT / " + binSize + " min", average(outValues),
+                    areaFigure(inData, "Parcels IN Every " + binSize + " Minutes", "#198754"),
+                    areaFigure(outData, "Parcels OUT Every " + binSize + " Minutes", "#dc3545")
+                ];
+            }
+        }
+    };
+})());
@@ -0,0 +1,67 @@
+// Live KPIs: follows the backend's GET /live Server-Sent Events for today and
+// keeps the merged result in a dcc.Store, which the page callbacks render from.
+window.liveKpis = (function () {
+    const sources = {};
+
+    function setProps(id, props) {
+        window.dash_clientside.set_props(id, props);
+    }
+
+    function merge(state, delta) {
+        const next = Object.assign({}, state);
+        Object.keys(delta).forEach(function (section) {
+            const update = delta[section];
+            if (section === "throughput" && next.throughput) {
+                // Deltas only carry the bins that changed
+                update.parcels_in_time = Object.assign({}, next.throughput.parcels_in_time, update.parcels_in_time);
+                update.parcels_out_time = Object.assign({}, next.throughput.parcels_out_time, update.parcels_out_time);
+            }
+            next[section] = update;
+        });
+        return next;
+    }
+
+    function stop(storeId) {
+        if (sources[storeId]) {
+            sources[storeId].close();
+            delete sources[storeId];
+        }
+    }
+
+    // Follow /live with `params` (none: stop) into the store `storeId`,
+    // reporting the connection state in the element `statusId`
+    function follow(storeId, statusId, url, params) {
+        stop(storeId);
+        setProps(storeId, {data: null});
+        if (!params) {
+            return;
+        }
+
+        const source = new EventSource(url + "?" + new URLSearchParams(params).toString());
+        let state = null;
+        source.addEventListener("open", function () {
+            setProps(statusId, {children: "Live"});
+        });
+        source.addEventListener("snapshot", function (event) {
+            state = JSON.parse(event.data);
+            setProps(storeId, {data: state});
+        });
+        source.addEventListener("delta", function (event) {
+            state = merge(state || {}, JSON.parse(event.data));
+            setProps(storeId, {data: state});
+        });
+        source.addEventListener("failure", function (event) {
+            // The server gave up (e.g. its change stream stopped): reconnecting would not help
+            stop(storeId);
+            setProps(statusId, {children: "Live updates unavailable: " + JSON.parse(event.data).detail});
+        });
+        source.addEventListener("error", function () {
+            // A dropped connection: the browser reconnects by itself, and gets a fresh snapshot
+            const closed = source.readyState === EventSource.CLOSED;
+            setProps(statusId, {children: closed ? "Live updates unavailable" : "Reconnecting..."});
+        });
+        sources[storeId] = source;
+    }
+
+    return {follow: follow, stop: stop};
+})();
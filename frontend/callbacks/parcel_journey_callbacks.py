@@ -1,102 +1,154 @@
-from dash import Input, Output, State, no_update, html, dash_table
+from dash import Input, Output, State, ctx, no_update, html, dash_table
 import pandas as pd
 import requests
 import json
+from utils import api_client
+
+PAGE_SIZE = 500
+
+
+def fetch_journey_page(payload):
+    """Read one page of the NDJSON stream; returns (rows, next_cursor)."""
+    rows, next_cursor = [], None
+    with api_client.post("/parcel-journey/stream", {**payload, "limit": PAGE_SIZE}, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            item = json.loads(line)
+            if "error" in item:
+                raise RuntimeError(item["error"])
+            if "next_cursor" in item:
+                next_cursor = item["next_cursor"]
+            else:
+                rows.append(item)
+    return rows, next_cursor
+
+
+def render_journey(data):
+    # Convert barcode list to string
+    for entry in data:
+        if isinstance(entry.get("barcode"), list):
+            entry["barcode"] = ", ".join(entry["barcode"])
+        # DataTable exposes the "id" of the clicked row as active_cell["row_id"];
+        # rows of an all-days search carry their date, as parcel ids repeat across days
+        entry["id"] = entry.pop("parcel_id", None)
+        if entry.get("date"):
+            entry["id"] = f'{entry["date"]}|{entry["id"]}'
+
+    df = pd.DataFrame(data)
+
+    # Rename columns for display
+    df.rename(columns={
+        "host_id": "HOST ID",
+        "status": "Status",
+        "barcodes": "Barcode(s)",
+        "alibi_id": "Alibi ID",
+        "register_on_and_at": "Register Time & Location",
+        "identification_on_and_at":"identification Time & Location",
+        "exit_on_and_at":"exit Time & Location",
+        "destination": "Destination",
+        "volume Data": "Volume",  # This is the only change you need for column name
+    }, inplace=True)
+
+    return html.Div([
+        dash_table.DataTable(
+            id='journey-table',
+            columns=[{"name": col, "id": col} for col in df.columns if col != "id"],
+            data=df.to_dict("records"),
+            page_size=10,
+            style_table={"overflowX": "auto", "border": "1px solid #dee2e6", "borderRadius": "6px"},
+            style_cell={
+                "textAlign": "left",
+                "padding": "6px",
+                "borderBottom": "1px solid #dee2e6",
+            },
+            style_header={
+                "backgroundColor": "#f8f9fa",
+                "fontWeight": "bold",
+                "borderBottom": "2px solid #dee2e6",
+            },
+            style_data={"backgroundColor": "#ffffff"}
+        ),
+        html.Small("Click a row to show its RAW logs.", className="text-muted"),
+    ])
+
+
+def fetch_raw_logs(date, parcel_id):
+    response = api_client.get("/parcel-journey/raw", {"date": date, "parcel_id": parcel_id})
+    response.raise_for_status()
+    return response.json()
+
 
 def register_parcel_journey_callbacks(app):
     @app.callback(
         Output('parcel-journey-output', 'children'),
+        Output('journey-results', 'data'),
+        Output('load-more-btn', 'style'),
+        Output('journey-raw', 'children', allow_duplicate=True),
         Input('get-details-btn', 'n_clicks'),
+        Input('load-more-btn', 'n_clicks'),
         State('date-picker', 'date'),
         State('search-based-on', 'value'),
         State('search-input', 'value'),
+        State('journey-results', 'data'),
         prevent_initial_call=True
     )
-    def get_details(n_clicks, date, search_by, input_value):
-        if not input_value:
-            return html.Div("Please enter a value to search.", className="text-danger")
+    def get_details(n_clicks, more_clicks, date, search_by, input_value, results):
+        hidden = {"display": "none"}
+        load_more = ctx.triggered_id == 'load-more-btn' and results and results.get("cursor")
+
+        if not load_more and not input_value:
+            return html.Div("Please enter a value to search.", className="text-danger"), None, hidden, None
 
         try:
-            payload = {
-                "date": date,
-                "search_by": search_by,
-                "search_value": input_value,
-            }
-
-            API_URL = "http://127.0.0.1:8000/parcel-journey"
-            response = requests.post(API_URL, json=payload)
-            response.raise_for_status()
-            data = response.json()
-
-            if not data:
-                return html.Div("No parcel journey data found.", className="text-warning")
-
-            # Convert barcode list to string
-            for entry in data:
-                if isinstance(entry.get("barcode"), list):
-                    entry["barcode"] = ", ".join(entry["barcode"])
-
-            df = pd.DataFrame(data)
-
-            # Rename columns for display
-            df.rename(columns={
-                "host_id": "HOST ID",
-                "status": "Status",
-                "barcodes": "Barcode(s)",
-                "alibi_id": "Alibi ID",
-                "register_on_and_at": "Register Time & Location",
-                "identification_on_and_at":"identification Time & Location",
-                "exit_on_and_at":"exit Time & Location",
-                "destination": "Destination",
-                "volume Data": "Volume",  # This is the only change you need for column name
-            }, inplace=True)
-
-            # Extract and display RAW logs
-            raw_logs = []
-            for idx, entry in enumerate(data):
-                raw_content = entry.get("RAW", {})
-                if isinstance(raw_content, dict):
-                    raw_text = "\n".join([f"{k}: {v}" for k, v in raw_content.items()])
-                elif isinstance(raw_content, str):
-                    try:
-                        parsed = json.loads(raw_content)
-                        raw_text = "\n".join([f"{k}: {v}" for k, v in parsed.items()])
-                    except json.JSONDecodeError:
-                        raw_text = raw_content
-                else:
-                    raw_text = str(raw_content)
-
-                raw_logs.append(html.Details([
-                    html.Summary(f"RAW Logs for Parcel #{idx + 1}"),
-                    html.Pre(raw_text, style={"whiteSpace": "pre-wrap"})
-                ]))
-
-            if "RAW" in df.columns:
-                df = df.drop(columns=["RAW"])
-
-            return html.Div([
-                dash_table.DataTable(
-                    columns=[{"name": col, "id": col} for col in df.columns],
-                    data=df.to_dict("records"),
-                    page_size=10,
-                    style_table={"overflowX": "auto", "border": "1px solid #dee2e6", "borderRadius": "6px"},
-                    style_cell={
-                        "textAlign": "left",
-                        "padding": "6px",
-                        "borderBottom": "1px solid #dee2e6",
-                    },
-                    style_header={
-                        "backgroundColor": "#f8f9fa",
-                        "fontWeight": "bold",
-                        "borderBottom": "2px solid #dee2e6",
-                    },
-                    style_data={"backgroundColor": "#ffffff"}
-                ),
-                html.Hr(),
-                html.Div(raw_logs)
-            ])
+            if load_more:
+                # Next page of the previous search
+                payload = {**results["query"], "cursor": results["cursor"]}
+                rows = results["rows"]
+            else:
+                payload = {
+                    "date": date,
+                    "search_by": search_by,
+                    "search_value": input_value,
+                }
+                rows = []
+
+            page, next_cursor = fetch_journey_page(payload)
+            rows = rows + page
+
+            if not rows:
+                return html.Div("No parcel journey data found.", className="text-warning"), None, hidden, None
+
+            query = {k: v for k, v in payload.items() if k != "cursor"}
+            store = {"query": query, "rows": rows, "cursor": next_cursor}
+            button_style = {"display": "inline-block"} if next_cursor else hidden
+            return render_journey([dict(row) for row in rows]), store, button_style, None
 
         except requests.exceptions.RequestException as e:
-            return html.Div(f"Error connecting to the API: {str(e)}", className="text-danger")
+            return html.Div(f"Error connecting to the API: {str(e)}", className="text-danger"), no_update, no_update, no_update
         except Exception as e:
-            return html.Div(f"Error fetching data: {str(e)}", className="text-danger")
+            return html.Div(f"Error fetching data: {str(e)}", className="text-danger"), no_update, no_update, no_update
+
+    @app.callback(
+        Output('journey-raw', 'children'),
+        Input('journey-table', 'active_cell'),
+        State('journey-results', 'data'),
+        prevent_initial_call=True
+    )
+    def show_raw_logs(active_cell, results):
+        # RAW logs are only fetched for the row the user opens
+        if not active_cell or not active_cell.get("row_id") or not results:
+            return no_update
+
+        date, _, parcel_id = active_cell["row_id"].rpartition("|")
+        try:
+            data = fetch_raw_logs(date or results["query"]["date"], parcel_id)
+        except requests.exceptions.RequestException as e:
+            return html.Div(f"Error fetching RAW logs: {str(e)}", className="text-danger")
+
+        raw_text = "\n".join([f"{k}: {v}" for k, v in data.get("RAW", {}).items()])
+        return html.Details([
+            html.Summary(f"RAW Logs for Parcel {data.get('host_id') or ''}"),
+            html.Pre(raw_text, style={"whiteSpace": "pre-wrap"})
+        ], open=True)
@@ -1,87 +1,61 @@
-import requests
-from dash import Output, Input, State, callback, html
-import dash_bootstrap_components as dbc
-from utils.volume_utils import (
-    generate_bar_chart,
-    generate_normal_chart,
-    generate_stats_table,
-    generate_kpi_card
+import json
+from dash import Output, Input, ClientsideFunction, callback, clientside_callback
+from utils.volume_utils import KPI_CARDS, STATS_COLUMNS, VOLUME_DIMENSIONS, graph_id, stat_cell_id
+from utils import api_client
+
+LIVE_URL = api_client.public_url("/live")  # Server-Sent Events, opened by the browser
+
+
+# "Live" on for today: the browser follows /live and keeps the pushed
+# result in volume-live-data; anything else closes the stream
+clientside_callback(
+    """
+    function(live, date, start_time, end_time) {
+        const today = new Date().toLocaleDateString("en-CA");  // YYYY-MM-DD
+        const follow = live && date === today && start_time && end_time;
+        window.liveKpis.follow("volume-live-data", "volume-live-status", %s,
+            follow ? {date: date, start_time: start_time, end_time: end_time, kpis: "volume"} : null);
+        return live && !follow ? "Live updates are only available for today" : "";
+    }
+    """ % json.dumps(LIVE_URL),
+    Output("volume-live-status", "children"),
+    Input("volume-live", "value"),
+    Input("volume-date-picker", "date"),
+    Input("volume-start-time", "value"),
+    Input("volume-end-time", "value"),
 )
 
-# API_URL = "https://backend-vanderlande-3jss.onrender.com/volume"  # Change to your backend URL
-API_URL = "http://127.0.0.1:8000/volume" # Local development URL
-
 
 @callback(
-    Output("volume-graphs-output", "children"),
+    Output("volume-data", "data"),
     Input("volume-date-picker", "date"),
     Input("volume-start-time", "value"),
     Input("volume-end-time", "value"),
-    Input("volume-graph-type", "value"),
     prevent_initial_call=False
 )
-def update_volume_dashboard(date, start_time, end_time, graph_type):
-    """Fetch data from backend and update graphs, table, and KPIs."""
+def fetch_volume_data(date, start_time, end_time):
+    """Fetch the /volume result of the selected date and window."""
     try:
         payload = {
             "date": date,
             "start_time": start_time,
             "end_time": end_time
         }
-        response = requests.post(API_URL, json=payload, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        return api_client.cached_post("/volume", payload)
     except Exception as e:
-        return html.Div(f"Error fetching data: {e}", className="text-danger")
-
-    # Extract data
-    height_data = data.get("height_distribution", {})
-    width_data = data.get("width_distribution", {})
-    length_data = data.get("length_distribution", {})
-    normal_stats = data.get("normal_distribution", {})
-
-    # Row 2 - Graphs
-    if graph_type == "hist":
-        h_chart = generate_bar_chart(height_data, "Height Distribution", "Height (mm)")
-        w_chart = generate_bar_chart(width_data, "Width Distribution", "Width (mm)")
-        l_chart = generate_bar_chart(length_data, "Length Distribution", "Length (mm)")
-    else:
-        h_chart = generate_normal_chart(normal_stats.get("height", {}), "Height Normal Distribution", "Height (mm)")
-        w_chart = generate_normal_chart(normal_stats.get("width", {}), "Width Normal Distribution", "Width (mm)")
-        l_chart = generate_normal_chart(normal_stats.get("length", {}), "Length Normal Distribution", "Length (mm)")
-
-    # Row 3 - Stats table
-    stats_table = generate_stats_table(height_data, width_data, length_data)
-
-    # Row 4 - KPIs (from frontend calculations)
-    total_parcels = sum(length_data.values()) if length_data else 0
-    under_400_count = sum(count for length, count in length_data.items() if 0 < float(length) <= 400)
-    above_600_count = sum(count for length, count in length_data.items() if float(length) >= 600)
-
-    under_400_pct = round((under_400_count / total_parcels) * 100, 2) if total_parcels else 0
-    above_600_pct = round((above_600_count / total_parcels) * 100, 2) if total_parcels else 0
-
-    kpi_row = html.Div([
-        dbc.Col(generate_kpi_card(
-            "Allocated Length ≤ 400 mm",
-            under_400_count,
-            under_400_pct,
-            color="#28a745"  # green
-        ), width=6),
-        dbc.Col(generate_kpi_card(
-            "Allocated Length ≥ 600 mm",
-            above_600_count,
-            above_600_pct,
-            color="#dc3545"  # red
-        ), width=6)
-    ], className="row mb-4")
-
-    return html.Div([
-        html.Div(className="row", children=[
-            html.Div(h_chart, className="col-md-4"),
-            html.Div(w_chart, className="col-md-4"),
-            html.Div(l_chart, className="col-md-4"),
-        ]),
-        html.Div(className="mt-4", children=stats_table),
-        kpi_row
-    ])
+        return {"error": f"Error fetching data: {e}"}
+
+
+# Purely presentational, so the graph type and the live push re-render in the browser
+clientside_callback(
+    ClientsideFunction(namespace="volume", function_name="render"),
+    Output("volume-message", "children"),
+    Output("volume-message", "className"),
+    Output("volume-graphs-output", "style"),
+    *[Output(graph_id(dimension), "figure") for dimension, _ in VOLUME_DIMENSIONS],
+    *[Output(stat_cell_id(dimension, key), "children") for dimension, _ in VOLUME_DIMENSIONS for key, _ in STATS_COLUMNS],
+    *[Output(f"{card_id}-{part}", "children") for card_id, _, _ in KPI_CARDS for part in ("count", "pct")],
+    Input("volume-data", "data"),
+    Input("volume-live-data", "data"),
+    Input("volume-graph-type", "value"),
+)
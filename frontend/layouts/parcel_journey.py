@@ -13,6 +13,8 @@ parcel_journey_layout = html.Div([
                 id='date-picker',
                 date=datetime.date.today(),
                 display_format='YYYY-MM-DD',
+                clearable=True,  # no date searches every day
+                placeholder="All days",
                 className="w-100"
             )
         ], width=2),
@@ -36,7 +38,7 @@ parcel_journey_layout = html.Div([
             html.Small(id='input-label', children="Enter Barcode"),
             dbc.Input(
                 id='search-input',
-                placeholder="*",
+                placeholder="Exact value, or barcode ABC* / *123",
                 type="text",
                 className="w-100"
             )
@@ -86,6 +88,13 @@ parcel_journey_layout = html.Div([
     ], className="gy-2"),
 
     # 🔽 Table Output Appears Here
-    html.Div(id='parcel-journey-output', className="mt-4")
+    html.Div(id='parcel-journey-output', className="mt-4"),
+
+    # Rows fetched so far and the continuation cursor of the streamed search
+    dcc.Store(id='journey-results'),
+    dbc.Button("Load more", id="load-more-btn", color="secondary", className="mt-2", style={"display": "none"}),
+
+    # RAW logs of the clicked row, loaded on demand
+    html.Div(id='journey-raw', className="mt-3")
 
 ], className="parcel-journey-tab")
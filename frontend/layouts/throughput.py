@@ -1,6 +1,7 @@
 import datetime
 from dash import html, dcc
 import dash_bootstrap_components as dbc
+from utils.throughput_utils import THROUGHPUT_CHARTS, THROUGHPUT_KPI_CARDS, create_area_chart, generate_kpi_card
 
 throughput_layout = dbc.Container([
     html.H2("Parcel Throughput", className="throughput-title"),
@@ -49,10 +50,21 @@ throughput_layout = dbc.Container([
         ),
     ], className="mb-4"),
 
-    # KPI Section
-    html.Div(id="throughput-kpi-section", className="throughput-kpi-row"),
+    html.Div(id="throughput-message"),
+
+    # KPI Section (rendered in the browser from throughput-data)
+    html.Div(
+        [generate_kpi_card(card_id, card_class) for card_id, card_class in THROUGHPUT_KPI_CARDS],
+        id="throughput-kpi-section", className="throughput-kpi-row", style={"display": "none"}
+    ),
 
     # Charts Section
-    html.Div(id="throughput-chart-section", className="throughput-charts-row")
+    html.Div(
+        [create_area_chart(chart_id) for chart_id in THROUGHPUT_CHARTS],
+        id="throughput-chart-section", className="throughput-charts-row", style={"display": "none"}
+    ),
+
+    # /throughput result for the selected date, bin size and window
+    dcc.Store(id="throughput-data")
 
 ], fluid=True)
@@ -1,6 +1,7 @@
 import datetime
 from dash import dcc, html
 import dash_bootstrap_components as dbc
+from utils.volume_utils import KPI_CARDS, VOLUME_DIMENSIONS, generate_graph, generate_kpi_card, generate_stats_table
 
 volume_layout = dbc.Container([
     html.H2("Parcel Statistics at Volume Scanner", className="volume-title mb-4"),
@@ -44,16 +45,29 @@ volume_layout = dbc.Container([
                 clearable=False
             ),
             width=3
-        )
+        ),
+        dbc.Col([
+            dbc.Switch(id="volume-live", label="Live", value=False),
+            html.Small(id="volume-live-status", className="text-muted")
+        ], width=2)
     ], className="mt-3", align="center"),
 
-    # Graphs output container
-    html.Div(id='volume-graphs-output', className='mt-4'),
+    html.Div(id='volume-message', className='mt-4'),
+
+    # Graphs, stats table and KPIs, rendered in the browser from volume-data
+    html.Div(id='volume-graphs-output', className='mt-4', style={'display': 'none'}, children=[
+        html.Div(className="row", children=[
+            html.Div(generate_graph(dimension), className="col-md-4") for dimension, _ in VOLUME_DIMENSIONS
+        ]),
+        html.Div(className="mt-4", children=generate_stats_table()),
+        html.Div([
+            dbc.Col(generate_kpi_card(card_id, title, color=color), width=6) for card_id, title, color in KPI_CARDS
+        ], className="row mb-4")
+    ]),
+
+    # /volume result for the selected date and window, rendered by graph type
+    dcc.Store(id='volume-data'),
 
-    # Auto-refresh interval
-    dcc.Interval(
-        id='volume-interval',
-        interval=30 * 1000,  # 30 seconds
-        n_intervals=0
-    )
+    # Latest result pushed by the backend while "Live" is on (assets/live_kpis.js)
+    dcc.Store(id='volume-live-data')
 ], fluid=True)
@@ -0,0 +1,210 @@
+"""One client for every call the dashboard makes to the backend.
+
+- one pooled keep-alive ``requests.Session`` per worker thread, instead of a
+  new TCP connection per callback
+- a (connect, read) timeout on every call, per endpoint, so a stuck
+  backend cannot hang a gunicorn worker
+- gzip-compressed responses (the backend compresses anything over 1 KB)
+- latency per endpoint, served by the Dash server at ``/api-latency``
+- a TTL + LRU cache of KPI responses keyed by the request payload, shared by
+  the worker's threads; concurrent identical calls wait for one backend call
+
+The backend is at BACKEND_URL (e.g. https://backend-vanderlande-3jss.onrender.com);
+PUBLIC_BACKEND_URL is where the browser reaches it, for the live stream,
+when that differs (e.g. inside docker-compose).
+"""
+import os
+import threading
+import json
+import time
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000").rstrip("/")
+PUBLIC_BACKEND_URL = os.getenv("PUBLIC_BACKEND_URL", BACKEND_URL).rstrip("/")
+
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("BACKEND_CONNECT_TIMEOUT_SECONDS", "3"))
+DEFAULT_READ_TIMEOUT_SECONDS = float(os.getenv("BACKEND_READ_TIMEOUT_SECONDS", "30"))
+# KPI scans may first queue behind the backend's concurrency limit (30 s)
+READ_TIMEOUT_SECONDS = {
+    "/summary": 45,
+    "/throughput": 45,
+    "/volume": 45,
+    "/parcel-journey/stream": 60,
+    "/parcel-journey/raw": 10,
+}
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "10"))
+# Calls per endpoint the latency percentiles are taken over
+LATENCY_WINDOW = 500
+# Today's KPIs move as parcels arrive; a closed day's no longer change
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "15"))
+CLOSED_DAY_CACHE_TTL_SECONDS = float(os.getenv("CLOSED_DAY_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # Queries only, so a call whose connection could not be made is retried once
+        retries = Retry(total=1, connect=1, read=0, status=0, allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        _local.session = session
+    return session
+
+
+class _Latency:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+
+_latency: Dict[str, _Latency] = {}
+_latency_lock = threading.Lock()
+
+
+def _record(path: str, seconds: float, ok: bool):
+    with _latency_lock:
+        latency = _latency.setdefault(path, _Latency())
+        latency.count += 1
+        latency.errors += 0 if ok else 1
+        latency.total_seconds += seconds
+        latency.max_seconds = max(latency.max_seconds, seconds)
+        latency.recent.append(seconds)
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    """Calls, errors and latency (ms; p50/p95 over the last LATENCY_WINDOW calls) per endpoint."""
+    with _latency_lock:
+        stats = {}
+        for path, latency in _latency.items():
+            recent = sorted(latency.recent)
+            stats[path] = {
+                "count": latency.count,
+                "errors": latency.errors,
+                "avg_ms": round(latency.total_seconds / latency.count * 1000, 1),
+                "p50_ms": round(recent[len(recent) // 2] * 1000, 1),
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 1),
+                "max_ms": round(latency.max_seconds * 1000, 1),
+            }
+        return stats
+
+
+def request(method: str, path: str, **kwargs) -> requests.Response:
+    """Call the backend endpoint `path`; a streamed call is timed to its response headers."""
+    timeout = (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS.get(path, DEFAULT_READ_TIMEOUT_SECONDS))
+    started = time.perf_counter()
+    try:
+        response = _session().request(method, BACKEND_URL + path, timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException:
+        _record(path, time.perf_counter() - started, ok=False)
+        raise
+    _record(path, time.perf_counter() - started, ok=response.ok)
+    return response
+
+
+def post(path: str, payload: Optional[Dict[str, Any]] = None, **kwargs) -> requests.Response:
+    return request("POST", path, json=payload, **kwargs)
+
+
+def get(path: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> requests.Response:
+    return request("GET", path, params=params, **kwargs)
+
+
+class _Call:
+    """A backend call in flight, waited on by the identical calls made meanwhile."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _ResponseCache:
+    """Decoded JSON responses, least recently used evicted first."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], _Call] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], ttl: float, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[1]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+
+        if not leader:
+            # The leader's call is bounded by its timeout
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.data
+
+        try:
+            call.data = fetch()
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, call.data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.data
+
+
+_response_cache = _ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+def _cache_ttl(payload: Dict[str, Any]) -> float:
+    try:
+        closed = date.fromisoformat(payload.get("date") or "") < date.today()
+    except (TypeError, ValueError):
+        closed = False
+    return CLOSED_DAY_CACHE_TTL_SECONDS if closed else RESPONSE_CACHE_TTL_SECONDS
+
+
+def cached_post(path: str, payload: Dict[str, Any]) -> Any:
+    """
+    The decoded JSON of a successful POST, from the response cache when an
+    identical call was made recently. Raises like ``raise_for_status`` on an
+    error response, which is not cached. The result is shared between
+    callers, so it must not be modified.
+    """
+    def fetch():
+        response = post(path, payload)
+        response.raise_for_status()
+        return response.json()
+
+    key = (path, json.dumps(payload, sort_keys=True, default=str))
+    return _response_cache.get(key, _cache_ttl(payload), fetch)
+
+
+def public_url(path: str) -> str:
+    """URL of a backend endpoint as the browser should open it."""
+    return PUBLIC_BACKEND_URL + path
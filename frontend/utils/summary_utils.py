@@ -1,6 +1,7 @@
 import requests
 from dash import dcc
 import plotly.graph_objects as go
+from utils import api_client
 
 # Fetch throughput data
 def fetch_summary_data(selected_date, start_time, end_time):
@@ -12,10 +13,7 @@ def fetch_summary_data(selected_date, start_time, end_time):
         }
         print("Sending to API:", payload)
 
-        response = requests.post("http://127.0.0.1:8000/summary", json=payload)
-        # response = requests.post("https://backend-vanderlande-3jss.onrender.com/summary", json=payload)
-
-        data = response.json()
+        data = api_client.cached_post("/summary", payload)
         print("Received from API:", data)
         return data
 